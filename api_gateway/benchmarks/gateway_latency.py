@@ -0,0 +1,88 @@
+"""
+Задержка, которую добавляет HTTP-клиент шлюза: сессия на каждый запрос (как было) против общего пула.
+
+Поднимает локальную заглушку сервиса авторизации и отправляет в неё запросы так же, как это делают
+ручки шлюза. Запуск (из каталога api_gateway):
+    PYTHONPATH=src python benchmarks/gateway_latency.py --requests 2000 --concurrency 20
+"""
+import asyncio
+import statistics
+from time import perf_counter
+
+import aiohttp
+import typer
+from aiohttp import web
+
+from core.http_client import create_session
+
+app = typer.Typer()
+
+HOST = '127.0.0.1'
+
+
+async def upstream_login(request: web.Request) -> web.Response:
+    response = web.json_response(None)
+    response.set_cookie('access_token_cookie', 'token')
+    return response
+
+
+async def start_upstream(port: int) -> web.AppRunner:
+    upstream = web.Application()
+    upstream.router.add_post('/api/v1/auth/login/', upstream_login)
+    runner = web.AppRunner(upstream, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, port).start()
+    return runner
+
+
+async def call_per_request(url: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json={'login': 'user', 'password': 'password'}) as resp:
+            await resp.json(content_type=None)
+
+
+async def call_pooled(session: aiohttp.ClientSession, url: str) -> None:
+    async with session.post(url, json={'login': 'user', 'password': 'password'}) as resp:
+        await resp.json(content_type=None)
+
+
+async def measure(name: str, call, requests: int, concurrency: int) -> None:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            started = perf_counter()
+            await call()
+            latencies.append(perf_counter() - started)
+
+    started = perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = perf_counter() - started
+    latencies.sort()
+    print(
+        f'{name:<12} rps={requests / elapsed:8.0f}  '
+        f'p50={statistics.median(latencies) * 1000:6.2f}ms  '
+        f'p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:6.2f}ms'
+    )
+
+
+async def run(requests: int, concurrency: int, port: int) -> None:
+    runner = await start_upstream(port)
+    url = f'http://{HOST}:{port}/api/v1/auth/login/'
+    session = create_session()
+    try:
+        await measure('per-request', lambda: call_per_request(url), requests, concurrency)
+        await measure('pooled', lambda: call_pooled(session, url), requests, concurrency)
+    finally:
+        await session.close()
+        await runner.cleanup()
+
+
+@app.command()
+def main(requests: int = 2000, concurrency: int = 20, port: int = 18010):
+    asyncio.run(run(requests, concurrency, port))
+
+
+if __name__ == '__main__':
+    app()
@@ -1,53 +1,85 @@
-from typing import Annotated
-from fastapi import APIRouter, Header, Response, Request
+from http import HTTPStatus
+from typing import Annotated, Any
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, Request
 import aiohttp
+import jwt
 
 from core.config import app_settings
+from core.http_client import get_http_session
+from core.jwks import key_set, UnknownKeyError
 from schemas.entity import UserLogin, UserCreate
 
 router = APIRouter()
 
 
+async def proxy_response(resp: aiohttp.ClientResponse, response: Response) -> Any:
+    '''
+    Переносит в ответ шлюза код ответа, cookies и тело ответа сервиса.
+    '''
+    response.status_code = resp.status
+    for key, morsel in resp.cookies.items():
+        response.set_cookie(key=key, value=morsel.value)
+    return await resp.json(content_type=None)
+
+
 @router.post('/login/')
-async def login(response: Response, data: UserLogin, user_agent: Annotated[str | None, Header()] = None):
+async def login(
+        response: Response, data: UserLogin, user_agent: Annotated[str | None, Header()] = None,
+        session: aiohttp.ClientSession = Depends(get_http_session)
+):
     url = f'{app_settings.auth_url}/api/v1/auth/login/'
     headers = {
         'User-Agent': user_agent,
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=data.dict(), headers=headers) as resp:
-            for cookie in resp.cookies.items():
-                response.set_cookie(key=cookie[0], value=cookie[1])
-            return resp.json()
+    async with session.post(url, json=data.dict(), headers=headers) as resp:
+        return await proxy_response(resp, response)
 
 
 @router.post('/sign_up/')
-async def sign_up(data: UserCreate):
+async def sign_up(
+        response: Response, data: UserCreate,
+        session: aiohttp.ClientSession = Depends(get_http_session)
+):
     url = f'{app_settings.auth_url}/api/v1/auth/sign_up/'
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=data.dict()) as resp:
-            return resp.json()
+    async with session.post(url, json=data.dict()) as resp:
+        return await proxy_response(resp, response)
 
 
 @router.get('/get_user/')
-async def get_user(request: Request, user_agent: Annotated[str | None, Header()] = None):
-    url = f'{app_settings.auth_url}/api/v1/auth/get_user/'
+async def get_user(
+        request: Request, response: Response, user_agent: Annotated[str | None, Header()] = None,
+        session: aiohttp.ClientSession = Depends(get_http_session)
+):
+    token = request.cookies.get(app_settings.access_cookie_key)
+    if app_settings.local_jwt_verification and token:
+        try:
+            claims = await key_set.verify(session, token)
+        except UnknownKeyError:
+            # Токены HMAC и токены с ещё неизвестным ключом проверяет сервис авторизации.
+            pass
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Invalid access token')
+        else:
+            if claims.get('type') != 'access' or claims.get('user_agent') != user_agent:
+                raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Invalid access token')
+            return claims
+
+    url = f'{app_settings.auth_url}/api/v1/auth/user_info/'
     headers = {
         'User-Agent': user_agent,
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers, cookies=request.cookies) as resp:
-            return resp.json()
+    async with session.get(url, headers=headers, cookies=request.cookies) as resp:
+        return await proxy_response(resp, response)
 
 
 @router.post('/refresh/')
-async def refresh(request: Request, response: Response, user_agent: Annotated[str | None, Header()] = None):
+async def refresh(
+        request: Request, response: Response, user_agent: Annotated[str | None, Header()] = None,
+        session: aiohttp.ClientSession = Depends(get_http_session)
+):
     url = f'{app_settings.auth_url}/api/v1/auth/refresh/'
     headers = {
         'User-Agent': user_agent,
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, cookies=request.cookies) as resp:
-            for cookie in resp.cookies.items():
-                response.set_cookie(key=cookie[0], value=cookie[1])
-            return resp.json()
+    async with session.post(url, headers=headers, cookies=request.cookies) as resp:
+        return await proxy_response(resp, response)
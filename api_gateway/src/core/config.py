@@ -1,20 +1,35 @@
-from pydantic import BaseModel, Field
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
-class Settings(BaseModel):
-    project_name: str = Field(..., env='PROJECT_NAME')
-    auth_port: str = Field(..., env='URL_PORT')
-    auth_url: str = Field(..., env='URL_AUTH')
+class Settings(BaseSettings):
+    project_name: str = Field(..., validation_alias='PROJECT_NAME')
+    auth_port: str = Field(..., validation_alias='URL_PORT')
+    auth_url: str = Field(..., validation_alias='URL_AUTH')
+    http_pool_size: int = Field(default=100, validation_alias='HTTP_POOL_SIZE')
+    http_pool_size_per_host: int = Field(default=50, validation_alias='HTTP_POOL_SIZE_PER_HOST')
+    http_keepalive_timeout: float = Field(default=30.0, validation_alias='HTTP_KEEPALIVE_TIMEOUT')
+    http_dns_cache_ttl: int = Field(default=300, validation_alias='HTTP_DNS_CACHE_TTL')
+    http_connect_timeout: float = Field(default=2.0, validation_alias='HTTP_CONNECT_TIMEOUT')
+    http_read_timeout: float = Field(default=10.0, validation_alias='HTTP_READ_TIMEOUT')
+    http_total_timeout: float = Field(default=15.0, validation_alias='HTTP_TOTAL_TIMEOUT')
+    local_jwt_verification: bool = Field(default=False, validation_alias='LOCAL_JWT_VERIFICATION')
+    jwks_max_age: float = Field(default=300.0, validation_alias='JWKS_MAX_AGE')
+    jwks_min_refresh_interval: float = Field(default=30.0, validation_alias='JWKS_MIN_REFRESH_INTERVAL')
+    access_cookie_key: str = Field(default='access_token_cookie', validation_alias='ACCESS_COOKIE_KEY')
 
     def __init__(self, **data):
         super().__init__(**data)
         self.auth_url = f'http://{self.auth_url}:{self.auth_port}'
 
-    class Config:
-        env_file = '.env'
+    @property
+    def jwks_url(self) -> str:
+        return f'{self.auth_url}/api/v1/auth/jwks/'
+
+    model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8')
 
 
 app_settings = Settings()
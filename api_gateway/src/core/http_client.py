@@ -0,0 +1,32 @@
+import aiohttp
+
+from core.config import app_settings
+
+session: aiohttp.ClientSession | None = None
+
+
+def create_session() -> aiohttp.ClientSession:
+    '''
+    Создаёт общий для всего приложения HTTP-клиент к внутренним сервисам.
+
+    Соединения переиспользуются (keep-alive), число одновременных соединений ограничено пулом,
+    результаты DNS кэшируются, поэтому запрос через шлюз не платит за новое TCP-соединение и резолвинг.
+    '''
+    connector = aiohttp.TCPConnector(
+        limit=app_settings.http_pool_size,
+        limit_per_host=app_settings.http_pool_size_per_host,
+        keepalive_timeout=app_settings.http_keepalive_timeout,
+        ttl_dns_cache=app_settings.http_dns_cache_ttl,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=app_settings.http_total_timeout,
+        sock_connect=app_settings.http_connect_timeout,
+        sock_read=app_settings.http_read_timeout,
+    )
+    # Сессия общая для всех пользователей, поэтому cookies ответов в ней не сохраняются:
+    # они передаются клиенту шлюза, а в запросы к сервисам подставляются явно.
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, cookie_jar=aiohttp.DummyCookieJar())
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    return session
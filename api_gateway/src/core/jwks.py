@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+import jwt
+
+from core.config import app_settings
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownKeyError(Exception):
+    '''
+    Токен подписан ключом, которого нет в JWKS сервиса авторизации (или подписан HMAC без kid).
+    '''
+
+
+class KeySet:
+    '''
+    Кэш открытых ключей сервиса авторизации для локальной проверки access token.
+
+    Ключи перечитываются из JWKS, когда кэш старше max_age или пришёл токен с незнакомым kid
+    (например, после ротации ключа). Запросы к JWKS выполняются не чаще раза в min_refresh_interval,
+    поэтому поток токенов с поддельным kid не превращается в поток запросов к сервису авторизации.
+    Если обновление не удалось, используются ранее загруженные ключи.
+    '''
+
+    def __init__(self, url: str, max_age: float, min_refresh_interval: float):
+        self.url = url
+        self.max_age = max_age
+        self.min_refresh_interval = min_refresh_interval
+        self.keys: dict[str, tuple[jwt.PyJWK, str]] = {}
+        self._fetched_at = float('-inf')
+        self._attempted_at = float('-inf')
+        self._lock = asyncio.Lock()
+
+    async def verify(self, session: aiohttp.ClientSession, token: str) -> dict:
+        '''
+        Проверяет подпись и срок действия токена и возвращает его claims.
+
+        :raises UnknownKeyError: Ключ токена неизвестен, проверить токен может только сервис авторизации.
+        :raises jwt.InvalidTokenError: Токен повреждён, подделан или истёк.
+        '''
+        kid = jwt.get_unverified_header(token).get('kid')
+        if kid is None:
+            raise UnknownKeyError()
+        entry = await self.get(session, kid)
+        if entry is None:
+            raise UnknownKeyError()
+        key, algorithm = entry
+        return jwt.decode(token, key.key, algorithms=[algorithm])
+
+    async def get(self, session: aiohttp.ClientSession, kid: str) -> tuple[jwt.PyJWK, str] | None:
+        if kid not in self.keys or time.monotonic() - self._fetched_at >= self.max_age:
+            await self._refresh(session)
+        return self.keys.get(kid)
+
+    async def _refresh(self, session: aiohttp.ClientSession) -> None:
+        async with self._lock:
+            if time.monotonic() - self._attempted_at < self.min_refresh_interval:
+                return
+            self._attempted_at = time.monotonic()
+            try:
+                async with session.get(self.url) as resp:
+                    resp.raise_for_status()
+                    data = await resp.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                logger.warning('Failed to fetch JWKS from %s: %s', self.url, error)
+                return
+            keys = {}
+            for jwk in data.get('keys', []):
+                try:
+                    keys[jwk['kid']] = (jwt.PyJWK(jwk), jwk['alg'])
+                except (KeyError, jwt.PyJWKError) as error:
+                    logger.warning('Skipping unusable JWK %s: %s', jwk.get('kid'), error)
+            self.keys = keys
+            self._fetched_at = time.monotonic()
+
+
+key_set = KeySet(
+    url=app_settings.jwks_url,
+    max_age=app_settings.jwks_max_age,
+    min_refresh_interval=app_settings.jwks_min_refresh_interval,
+)
@@ -2,6 +2,7 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 
+from core import http_client
 from core.config import app_settings as settings
 from api.v1 import gateway
 
@@ -13,6 +14,16 @@ app = FastAPI(
     default_response_class=ORJSONResponse,
 )
 
+
+@app.on_event('startup')
+async def startup():
+    http_client.session = http_client.create_session()
+
+
+@app.on_event('shutdown')
+async def shutdown():
+    await http_client.session.close()
+
 app.include_router(gateway.router, prefix='/api/v1', tags=['login'])
 
 # if __name__ == '__main__':
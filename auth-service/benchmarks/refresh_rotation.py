@@ -0,0 +1,104 @@
+"""
+Ротация refresh token: три отдельных запроса (GET, DEL, SET) по ключу-токену против одного Lua-скрипта
+с короткими ключами сессий.
+
+Запуск (из каталога auth-service, нужен доступный Redis; база --db будет очищена):
+    PYTHONPATH=src python benchmarks/refresh_rotation.py --sessions 20000 --concurrency 50
+"""
+import asyncio
+import secrets
+import uuid
+from time import perf_counter
+
+import typer
+from redis.asyncio import Redis
+
+from core.config import app_settings
+from services.redis_cache import CacheRedis
+from services.sessions import session_key, session_record
+
+app = typer.Typer()
+
+TOKEN_SIZE = 400
+
+
+def fake_token() -> str:
+    return secrets.token_urlsafe(TOKEN_SIZE)[:TOKEN_SIZE]
+
+
+async def rotate_three_calls(cache: CacheRedis, old: str, new: str, ttl: int) -> bool:
+    if not await cache._object_from_cache(old):
+        return False
+    await cache._delete_object_from_cache(old)
+    await cache._put_object_to_cache(new, ttl)
+    return True
+
+
+USER_ID = str(uuid.uuid4())
+RECORD = session_record(USER_ID, 'google', 'header.payload.signature')
+
+
+async def rotate_script(cache: CacheRedis, old: str, new: str, ttl: int) -> bool:
+    rotated = await cache._rotate_session(
+        user_id=USER_ID, old_jti=old, old_token=old, expected_record=RECORD,
+        new_jti=new, new_record=RECORD, user_agent='google', time_cache=ttl
+    )
+    return rotated == 1
+
+
+async def store_token(pipe, token: str, compact: bool, ttl: int) -> None:
+    if compact:
+        pipe.set(session_key(token), RECORD, ttl)
+    else:
+        pipe.set(token, token, ttl)
+
+
+async def bench(redis: Redis, name: str, rotate, sessions: int, concurrency: int, compact: bool) -> None:
+    await redis.flushdb()
+    cache = CacheRedis(redis)
+    ttl = app_settings.authjwt_time_refresh
+    tokens = [fake_token() for _ in range(sessions)]
+    async with redis.pipeline(transaction=False) as pipe:
+        for token in tokens:
+            await store_token(pipe, token, compact, ttl)
+        await pipe.execute()
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(token: str) -> None:
+        async with semaphore:
+            assert await rotate(cache, token, fake_token(), ttl)
+
+    started = perf_counter()
+    await asyncio.gather(*(one(token) for token in tokens))
+    elapsed = perf_counter() - started
+
+    # Повтор: одним и тем же токеном одновременно пытаются обновиться несколько клиентов.
+    replayed = fake_token()
+    async with redis.pipeline(transaction=False) as pipe:
+        await store_token(pipe, replayed, compact, ttl)
+        await pipe.execute()
+    results = await asyncio.gather(*(rotate(cache, replayed, fake_token(), ttl) for _ in range(concurrency)))
+
+    typer.echo(
+        f'{name:>11}: {sessions / elapsed:.0f} refresh/s, '
+        f'{elapsed / sessions * 1e6:.0f} us/refresh, '
+        f'successful replays of one token: {sum(results)} of {concurrency}'
+    )
+
+
+async def run(sessions: int, concurrency: int, db: int) -> None:
+    redis = Redis(host=app_settings.redis_host, port=app_settings.redis_port, db=db)
+    await bench(redis, 'three calls', rotate_three_calls, sessions, concurrency, compact=False)
+    await bench(redis, 'lua script', rotate_script, sessions, concurrency, compact=True)
+    await redis.flushdb()
+    await redis.close()
+
+
+@app.command()
+def main(sessions: int = 20_000, concurrency: int = 50, db: int = 15):
+    asyncio.run(run(sessions, concurrency, db))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,84 @@
+"""
+Сравнение хранилищ отозванных access-токенов: "ключ на токен" и фильтры Блума.
+
+Запуск (из каталога auth-service, нужен доступный Redis; база --db будет очищена):
+    PYTHONPATH=src python benchmarks/revocation_store.py --revoked 100000 --checks 20000
+"""
+import asyncio
+import uuid
+from time import perf_counter, time
+
+import typer
+from redis.asyncio import Redis
+
+from core.config import app_settings
+from services.revocation import BloomRevocationStore, KeyRevocationStore
+
+app = typer.Typer()
+
+BATCH_SIZE = 1000
+
+
+async def bench_store(redis: Redis, name: str, store, revoked: int, checks: int, window: int) -> None:
+    await redis.flushdb()
+    memory_before = (await redis.info('memory'))['used_memory']
+    now = int(time())
+    exp = now + window - 1
+    jtis = [str(uuid.uuid4()) for _ in range(revoked)]
+
+    started = perf_counter()
+    for offset in range(0, revoked, BATCH_SIZE):
+        async with redis.pipeline(transaction=False) as pipe:
+            for jti in jtis[offset:offset + BATCH_SIZE]:
+                store.add(pipe, jti, exp, now)
+            await pipe.execute()
+    write_seconds = perf_counter() - started
+
+    memory = (await redis.info('memory'))['used_memory'] - memory_before
+    keys = await redis.dbsize()
+
+    started = perf_counter()
+    for jti in jtis[:checks]:
+        assert await store.contains(redis, jti, exp)
+    hit_seconds = perf_counter() - started
+
+    started = perf_counter()
+    for _ in range(checks):
+        assert not await store.contains(redis, str(uuid.uuid4()), exp)
+    miss_seconds = perf_counter() - started
+
+    summary = (
+        f'{name:>6}: keys={keys} memory={memory / 1024 / 1024:.2f} MiB ({memory / revoked:.1f} B/token) '
+        f'write={revoked / write_seconds:.0f} ops/s '
+        f'check revoked={hit_seconds / checks * 1e6:.0f} us check valid={miss_seconds / checks * 1e6:.0f} us'
+    )
+    if isinstance(store, BloomRevocationStore):
+        # contains перепроверяет положительный ответ фильтра точно и ложных срабатываний не даёт,
+        # поэтому долю ложных срабатываний считаем по ответу самого фильтра на не отозванные jti.
+        false_positives = 0
+        for _ in range(checks):
+            false_positives += await store.might_contain(redis, str(uuid.uuid4()), exp)
+        summary += (
+            f' bitmap false positives={false_positives} ({false_positives / checks:.4%},'
+            f' target {store.false_positive_rate:.4%})'
+        )
+    typer.echo(summary)
+
+
+async def run(revoked: int, checks: int, fpr: float, db: int) -> None:
+    redis = Redis(host=app_settings.redis_host, port=app_settings.redis_port, db=db)
+    window = app_settings.authjwt_time_access
+    await bench_store(redis, 'keys', KeyRevocationStore(), revoked, checks, window)
+    bloom = BloomRevocationStore(window=window, capacity=revoked, false_positive_rate=fpr)
+    await bench_store(redis, 'bloom', bloom, revoked, checks, window)
+    await redis.flushdb()
+    await redis.close()
+
+
+@app.command()
+def main(revoked: int = 100_000, checks: int = 10_000, fpr: float = 0.001, db: int = 15):
+    asyncio.run(run(revoked, checks, fpr, db))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,71 @@
+"""
+Память Redis на одну сессию: refresh token как ключ и значение против короткого ключа и упакованной записи.
+
+Запуск (из каталога auth-service, нужен доступный Redis; база --db будет очищена):
+    PYTHONPATH=src python benchmarks/session_memory.py --sessions 100000
+"""
+import asyncio
+import uuid
+
+import typer
+from async_fastapi_jwt_auth import AuthJWT
+from redis.asyncio import Redis
+
+from core.config import app_settings
+from services.sessions import session_key, session_record, token_jti
+
+app = typer.Typer()
+
+BATCH_SIZE = 1000
+
+
+async def issue_tokens(count: int) -> list[tuple[str, str, str]]:
+    AuthJWT.load_config(lambda: app_settings)
+    auth = AuthJWT()
+    tokens = []
+    for _ in range(count):
+        user_id = str(uuid.uuid4())
+        claims = {'user_agent': 'Mozilla/5.0 (X11; Linux x86_64)', 'is_admin': False, 'gen': 0}
+        access_token = await auth.create_access_token(subject=user_id, user_claims=claims)
+        claims['uuid_access'] = access_token.split('.')[-1]
+        refresh_token = await auth.create_refresh_token(subject=user_id, user_claims=claims)
+        tokens.append((user_id, access_token, refresh_token))
+    return tokens
+
+
+async def measure(redis: Redis, name: str, tokens: list, store) -> None:
+    await redis.flushdb()
+    memory_before = (await redis.info('memory'))['used_memory']
+    ttl = app_settings.authjwt_time_refresh
+    for offset in range(0, len(tokens), BATCH_SIZE):
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id, access_token, refresh_token in tokens[offset:offset + BATCH_SIZE]:
+                key, value = store(user_id, access_token, refresh_token)
+                pipe.set(key, value, ttl)
+            await pipe.execute()
+    memory = (await redis.info('memory'))['used_memory'] - memory_before
+    key, _ = store(*tokens[0])
+    typer.echo(
+        f'{name:>7}: {memory / len(tokens):.0f} B/session, '
+        f'{memory / 1024 / 1024:.1f} MiB for {len(tokens)} sessions, key length {len(key)}'
+    )
+
+
+async def run(sessions: int, db: int) -> None:
+    tokens = await issue_tokens(sessions)
+    redis = Redis(host=app_settings.redis_host, port=app_settings.redis_port, db=db)
+    await measure(redis, 'token', tokens, lambda user_id, access, refresh: (refresh, refresh))
+    await measure(redis, 'compact', tokens, lambda user_id, access, refresh: (
+        session_key(token_jti(refresh)), session_record(user_id, 'Mozilla/5.0 (X11; Linux x86_64)', access)
+    ))
+    await redis.flushdb()
+    await redis.close()
+
+
+@app.command()
+def main(sessions: int = 100_000, db: int = 15):
+    asyncio.run(run(sessions, db))
+
+
+if __name__ == "__main__":
+    app()
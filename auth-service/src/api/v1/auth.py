@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, Header, Request
+from fastapi import APIRouter, Depends, Header, Request, Response
 from typing import Annotated
 
 from depends import get_repository_user
+from db.redis import get_redis, Redis
 from schemas.entity import UserCreate, UserLogin
 from services.user import BaseAuth
+from services.key_ring import key_ring
 
 router = APIRouter()
 
@@ -79,3 +81,31 @@ async def logout(
     None: Выполняет процесс выхода пользователя из системы. В противном случае выбрасывается исключение.
     """
     await user_manager.logout(request, user_agent)
+
+
+@router.post('/logout_others/')
+async def logout_others(
+        request: Request, user_agent: Annotated[str | None, Header()] = None,
+        user_manager: BaseAuth = Depends(get_repository_user)):
+    """
+    Осуществляет выход из всех остальных устройств: ранее выданные токены перестают действовать,
+    текущая сессия получает новые токены.
+
+    :param request: (Request) Объект запроса, содержащий cookies с refresh token.
+    :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+    :return:
+    None: Выполняет выход из остальных устройств. В противном случае выбрасывается исключение.
+    """
+    await user_manager.logout_others(request, user_agent)
+
+
+@router.get('/jwks/')
+async def key_set(response: Response, redis: Redis = Depends(get_redis)) -> dict:
+    """
+    Возвращает открытые ключи (JWKS) для локальной проверки access token другими сервисами.
+
+    :return:
+    dict: Набор ключей {"keys": [...]}: подготовленные, активный и прежние асимметричные ключи.
+    """
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return await key_ring.jwks(redis)
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, Header, Query
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import Annotated
 
-from services.user import UserManage
-from depends import get_user_manage
-from schemas.entity import UserProfil, ChangeProfil, ChangePassword, HistoryUser, ChangeLevel
-from core.config import PAGE_SIZE
+from services.user import BaseAuth, UserManage
+from depends import get_repository_user, get_user_manage
+from schemas.entity import (
+    UserProfil, ChangeProfil, ChangePassword, HistoryUser, HistoryPage, ChangeLevel, SessionInfo
+)
+from core.config import PAGE_SIZE, FileFormat
 
 
 router = APIRouter()
@@ -76,6 +79,53 @@ async def user_history(
     return user_history
 
 
+@router.get('/user_history/cursor/')
+async def user_history_cursor(
+        cursor: Annotated[str | None, Query(description='Cursor from the previous page')] = None,
+        page_size: Annotated[int, Query(description='Pagination page size', ge=1)] = PAGE_SIZE,
+        user_agent: Annotated[str | None, Header()] = None,
+        user_manager: UserManage = Depends(get_user_manage),
+) -> HistoryPage:
+    """
+    Метод возвращает страницу истории входов пользователя, отсортированную от новых событий к старым.
+
+    :param cursor: (str) Курсор next_cursor из предыдущего ответа, для первой страницы не передаётся.
+    :param page_size: (int) Количество записей на странице
+    :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+    :return:
+    HistoryPage: Записи страницы и курсор следующей страницы (None, если страница последняя).
+    В противном случае выбрасывается исключение.
+    """
+    history_page: HistoryPage = await user_manager.get_history_page(user_agent, cursor, page_size)
+    return history_page
+
+
+EXPORT_MEDIA_TYPES = {FileFormat.NDJSON: 'application/x-ndjson', FileFormat.CSV: 'text/csv'}
+
+
+@router.get('/user_history/export/')
+async def user_history_export(
+        file_format: Annotated[FileFormat, Query(description='Export file format')] = FileFormat.NDJSON,
+        user_agent: Annotated[str | None, Header()] = None,
+        user_manager: UserManage = Depends(get_user_manage),
+) -> StreamingResponse:
+    """
+    Метод отдаёт всю историю входов пользователя файлом, не загружая её в память целиком.
+
+    :param file_format: (FileFormat) Формат файла: ndjson или csv.
+    :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+    :return:
+    StreamingResponse: Файл истории, отсортированный от новых событий к старым.
+    В противном случае выбрасывается исключение.
+    """
+    chunks = await user_manager.export_history(user_agent, file_format)
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[file_format],
+        headers={'Content-Disposition': f'attachment; filename="login_history.{file_format.value}"'}
+    )
+
+
 @router.post('/change-level/')
 async def change_level(
         self_data: ChangeLevel,
@@ -92,3 +142,49 @@ async def change_level(
     """
     await user_manager.change_level(user_agent, self_data.level_up)
     return "level raised" if self_data.level_up else "level decreased"
+
+
+@router.get('/sessions/')
+async def user_sessions(
+        request: Request,
+        user_agent: Annotated[str | None, Header()] = None,
+        user_manager: BaseAuth = Depends(get_repository_user)) -> list[SessionInfo]:
+    """
+    Метод возвращает действующие сессии (устройства) пользователя.
+
+    :param request: (Request) Объект запроса, по refresh token из cookies отмечается текущая сессия.
+    :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+    :return:
+    list[SessionInfo]: Список сессий. В противном случае выбрасывается исключение.
+    """
+    return await user_manager.get_sessions(request, user_agent)
+
+
+@router.delete('/sessions/{session_id}/')
+async def revoke_session(
+        session_id: str,
+        user_agent: Annotated[str | None, Header()] = None,
+        user_manager: BaseAuth = Depends(get_repository_user)) -> str:
+    """
+    Метод отзывает одну сессию пользователя.
+
+    :param session_id: (str) id сессии из списка сессий.
+    :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+    :return: (str) Строка "session revoked". В противном случае выбрасывается исключение.
+    """
+    await user_manager.revoke_session(user_agent, session_id)
+    return "session revoked"
+
+
+@router.delete('/sessions/')
+async def revoke_all_sessions(
+        user_agent: Annotated[str | None, Header()] = None,
+        user_manager: BaseAuth = Depends(get_repository_user)) -> str:
+    """
+    Метод осуществляет выход со всех устройств пользователя, включая текущее.
+
+    :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+    :return: (str) Число отозванных сессий. В противном случае выбрасывается исключение.
+    """
+    revoked = await user_manager.logout_all(user_agent)
+    return f"{revoked} sessions revoked"
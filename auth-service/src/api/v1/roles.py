@@ -1,9 +1,9 @@
 import uuid
-from fastapi import APIRouter, Depends, Header
+from fastapi import APIRouter, Depends, Header, Query
 from typing import Annotated
 
 from depends import get_repository_user, get_admin
-from schemas.entity import RoleCreate, UserRole
+from schemas.entity import RoleCreate, UserRole, BulkRoleAssign, AffectedUsers
 from services.user import BaseAuth
 from services.admin import BaseAdmin
 
@@ -75,22 +75,48 @@ async def assign_role(
         return 'role assigned'
 
 
+@router.post('/assign/bulk/')
+async def assign_role_bulk(
+        data: BulkRoleAssign, user_agent: Annotated[str | None, Header()] = None,
+        manager_auth: BaseAuth = Depends(get_repository_user),
+        admin_manager: BaseAdmin = Depends(get_admin)
+) -> AffectedUsers | None:
+    """
+    С помощью этого метода админ может присвоить роль сразу многим пользователям:
+    по списку id или всем, кто подходит под фильтр (пустой фильтр — все пользователи).
+
+    :param data: (BulkRoleAssign) id роли и либо список id пользователей, либо фильтр.
+    :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+    :return:
+    Union[None | AffectedUsers]: None, если пользователь не является админом,
+    либо количество пользователей, у которых изменилась роль. В противном случае выбрасывается исключение.
+    """
+    result = await manager_auth.get_info_from_access_token(user_agent)
+    if result.get('is_admin'):
+        affected = await admin_manager.assign_role_bulk(data)
+        return AffectedUsers(affected=affected)
+
+
 @router.patch("/delete/{role_id}/")
 async def delete_role(
-        role_id: uuid.UUID, user_agent: Annotated[str | None, Header()] = None,
+        role_id: uuid.UUID,
+        fallback_role_id: Annotated[uuid.UUID | None, Query(description='Role for users of the deleted role')] = None,
+        user_agent: Annotated[str | None, Header()] = None,
         manager_auth: BaseAuth = Depends(get_repository_user),
         admin_manager: BaseAdmin = Depends(get_admin)
-):
+) -> AffectedUsers | None:
     """
-    С помощью этого метода админ может удалить роль.
+    С помощью этого метода админ может удалить роль. Пользователи удаляемой роли переводятся
+    на запасную роль, по умолчанию — на оставшуюся роль с минимальным уровнем.
 
     :param role_id: (UUID) id роли
+    :param fallback_role_id: (UUID) id запасной роли
     :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
     :return:
-    Union[None | str]: None, если пользователь не является админом,
-    либо строку 'role deleted'. В противном случае выбрасывается исключение.
+    Union[None | AffectedUsers]: None, если пользователь не является админом,
+    либо количество пользователей, переведённых на запасную роль. В противном случае выбрасывается исключение.
     """
     result = await manager_auth.get_info_from_access_token(user_agent)
     if result.get('is_admin'):
-        await admin_manager.delete_role(role_id)
-        return "role deleted"
+        affected = await admin_manager.delete_role(role_id, fallback_role_id)
+        return AffectedUsers(affected=affected)
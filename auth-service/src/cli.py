@@ -1,8 +1,20 @@
+import os
 import typer
 import asyncio
+from pathlib import Path
+from typing import Optional
 
+from core.config import app_settings, FileFormat, SigningAlgorithm
 from db.postgres import command_create_role, command_create_user
+from db.history_partitions import command_manage_history_partitions
+from db.history_archive import command_archive_history
+from db.user_import import command_import_users
+from db.key_rotation import (
+    command_stage_signing_key, command_activate_signing_key, command_retire_signing_key, command_list_signing_keys,
+    command_encrypt_signing_keys
+)
 from models.entity import Role, User
+from services.key_encryption import KeyEncryptionError
 from services.repository import BaseRepository
 from logger import logger
 
@@ -45,5 +57,124 @@ def create_superuser(
     logger.info(result)
 
 
+@app.command(name='manage_history_partitions')
+def manage_history_partitions(
+        months_ahead: int = 3,
+        retention_months: int = app_settings.history_retention_months,
+        drop: bool = False
+):
+    '''
+    Создаёт будущие месячные секции login_history и отсоединяет секции старше срока хранения.
+    С --drop отсоединённые секции удаляются. Команду стоит запускать по расписанию (например, раз в сутки).
+    '''
+    actions = asyncio.run(command_manage_history_partitions(months_ahead, retention_months, drop))
+    for action in actions:
+        logger.info(action)
+    logger.info('Done!')
+
+
+@app.command(name='archive_history')
+def archive_history(
+        older_than_days: int = 90,
+        output_dir: Path = Path('archive/login_history'),
+        file_format: FileFormat = FileFormat.NDJSON,
+        batch_size: int = 5000,
+        checkpoint: Path = Path('archive/login_history.checkpoint.json')
+):
+    '''
+    Переносит историю входов старше older_than_days дней в сжатые файлы по дням и удаляет её из базы.
+    Прерванный запуск продолжается с контрольной точки.
+    '''
+    archived = asyncio.run(
+        command_archive_history(older_than_days, output_dir, file_format.value, batch_size, checkpoint)
+    )
+    logger.info(f'Archived {archived} rows')
+
+
+@app.command(name='import_users')
+def import_users(
+        path: Path,
+        file_format: FileFormat = FileFormat.CSV,
+        batch_size: int = 5000,
+        workers: int = os.cpu_count() or 1,
+        role_level: Optional[int] = None,
+        rejected: Optional[Path] = None,
+        checkpoint: Optional[Path] = None
+):
+    '''
+    Загружает пользователей из CSV или NDJSON с полями login, email, first_name, last_name и password
+    (или password_hash — готовый хеш werkzeug). Пароли хешируются в пуле из workers процессов, порции
+    по batch_size строк загружаются через COPY. Прерванный запуск продолжается с контрольной точки,
+    отклонённые записи пишутся в файл <path>.rejected.ndjson. По умолчанию назначается роль
+    с минимальным уровнем.
+    '''
+    rejected = rejected or path.with_name(f'{path.name}.rejected.ndjson')
+    checkpoint = checkpoint or path.with_name(f'{path.name}.checkpoint.json')
+
+    def report(progress: dict) -> None:
+        logger.info(
+            f"{progress['records']} records: {progress['imported']} imported, {progress['rejected']} rejected"
+        )
+
+    try:
+        result = asyncio.run(command_import_users(
+            path, file_format.value, batch_size, workers, role_level, rejected, checkpoint, report
+        ))
+    except ValueError as err:
+        logger.error(err)
+        raise typer.Exit(code=1)
+    logger.info(f"Imported {result['imported']} users, rejected {result['rejected']} (see {rejected})")
+
+
+@app.command(name='stage_signing_key')
+def stage_signing_key(algorithm: SigningAlgorithm = SigningAlgorithm.EDDSA):
+    '''
+    Создаёт новый ключ подписи токенов. Ключ сразу публикуется в JWKS и принимается при проверке,
+    подписывать им токены начнём после activate_signing_key.
+    '''
+    try:
+        kid = asyncio.run(command_stage_signing_key(algorithm.value))
+    except KeyEncryptionError as err:
+        logger.error(err)
+        raise typer.Exit(code=1)
+    logger.info(f'Staged signing key {kid}')
+
+
+@app.command(name='activate_signing_key')
+def activate_signing_key(kid: str, force: bool = False):
+    '''
+    Начинает подписывать токены ключом kid. Прежний ключ остаётся действительным для проверки,
+    поэтому пользователи переходят на новый ключ постепенно, при обновлении токенов.
+    '''
+    logger.info(asyncio.run(command_activate_signing_key(kid, force)))
+
+
+@app.command(name='retire_signing_key')
+def retire_signing_key(kid: str, force: bool = False):
+    '''
+    Выводит ключ kid из оборота: подписанные им токены перестают приниматься.
+    '''
+    logger.info(asyncio.run(command_retire_signing_key(kid, force)))
+
+
+@app.command(name='list_signing_keys')
+def list_signing_keys():
+    for line in asyncio.run(command_list_signing_keys()):
+        logger.info(line)
+
+
+@app.command(name='encrypt_signing_keys')
+def encrypt_signing_keys():
+    '''
+    Шифрует текущим KEK (SIGNING_KEK_ID) ключи подписи, хранящиеся в открытом виде или под прежним KEK.
+    '''
+    try:
+        changed = asyncio.run(command_encrypt_signing_keys())
+    except KeyEncryptionError as err:
+        logger.error(err)
+        raise typer.Exit(code=1)
+    logger.info(f'Re-encrypted {changed} signing keys')
+
+
 if __name__ == "__main__":
     app()
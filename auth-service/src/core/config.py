@@ -1,4 +1,6 @@
-from pydantic import Field, HttpUrl
+from pathlib import Path
+
+from pydantic import Field, HttpUrl, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 from enum import Enum
@@ -6,6 +8,11 @@ from enum import Enum
 load_dotenv()
 
 
+class RevocationMode(str, Enum):
+    KEYS = 'keys'
+    BLOOM = 'bloom'
+
+
 class Settings(BaseSettings):
 
     project_name: str = Field(..., validation_alias='PROJECT_NAME')
@@ -18,18 +25,77 @@ class Settings(BaseSettings):
     pg_user: str = Field(..., validation_alias='POSTGRES_USER')
     pg_password: str = Field(..., validation_alias='POSTGRES_PASSWORD')
     pg_db: str = Field(..., validation_alias='POSTGRES_DB')
+    pg_replica_host: str | None = Field(default=None, validation_alias='POSTGRES_REPLICA_HOST')
+    pg_replica_port: int | None = Field(default=None, validation_alias='POSTGRES_REPLICA_PORT')
+    read_after_write_window: float = Field(default=5.0, validation_alias='READ_AFTER_WRITE_WINDOW')
+    db_echo: bool = Field(default=False, validation_alias='DB_ECHO')
+    db_pool_size: int = Field(default=10, ge=1, validation_alias='DB_POOL_SIZE')
+    db_max_overflow: int = Field(default=5, ge=0, validation_alias='DB_MAX_OVERFLOW')
+    db_pool_timeout: float = Field(default=10.0, gt=0, validation_alias='DB_POOL_TIMEOUT')
+    db_pool_recycle: int = Field(default=1800, validation_alias='DB_POOL_RECYCLE')
+    db_pool_pre_ping: bool = Field(default=True, validation_alias='DB_POOL_PRE_PING')
+    db_statement_cache_size: int = Field(default=100, ge=0, validation_alias='DB_STATEMENT_CACHE_SIZE')
+    db_transaction_pooling: bool = Field(default=False, validation_alias='DB_TRANSACTION_POOLING')
+    server_timing: bool = Field(default=False, validation_alias='SERVER_TIMING')
     authjwt_secret_key: str = Field(..., validation_alias='SECRET_KEY')
-    authjwt_time_access: str = Field(..., validation_alias='TIME_LIFE_ACCESS')
-    authjwt_time_refresh: str = Field(..., validation_alias='TIME_LIFE_REFRESH')
+    authjwt_algorithm: str = Field(default='HS256', validation_alias='JWT_ALGORITHM')
+    authjwt_decode_algorithms: list[str] | None = Field(default=None, validation_alias='JWT_DECODE_ALGORITHMS')
+    authjwt_private_key: str | None = Field(default=None, validation_alias='JWT_PRIVATE_KEY')
+    authjwt_public_key: str | None = Field(default=None, validation_alias='JWT_PUBLIC_KEY')
+    jwt_private_key_file: Path | None = Field(default=None, validation_alias='JWT_PRIVATE_KEY_FILE')
+    jwt_public_key_file: Path | None = Field(default=None, validation_alias='JWT_PUBLIC_KEY_FILE')
+    signing_keks: dict[str, str] = Field(default={}, validation_alias='SIGNING_KEKS')
+    signing_kek_id: str | None = Field(default=None, validation_alias='SIGNING_KEK_ID')
+    signing_keys_check_interval: float = Field(default=5.0, validation_alias='SIGNING_KEYS_CHECK_INTERVAL')
+    authjwt_time_access: int = Field(..., validation_alias='TIME_LIFE_ACCESS')
+    authjwt_time_refresh: int = Field(..., validation_alias='TIME_LIFE_REFRESH')
     authjwt_token_location: set = Field(default={"cookies"})
     authjwt_cookie_csrf_protect: bool = Field(default=False)
     authjwt_access_cookie_key: str = Field(default='access_token_cookie')
     authjwt_refresh_cookie_key: str = Field(default='refresh_token_cookie')
+    hash_pool_size: int = Field(default=2, validation_alias='HASH_POOL_SIZE')
+    hash_queue_size: int = Field(default=64, validation_alias='HASH_QUEUE_SIZE')
+    revocation_reconnect_delay: float = Field(default=1.0, validation_alias='REVOCATION_RECONNECT_DELAY')
+    revocation_health_check_interval: float = Field(
+        default=30.0, gt=0, validation_alias='REVOCATION_HEALTH_CHECK_INTERVAL'
+    )
+    revocation_snapshot: bool = Field(default=False, validation_alias='REVOCATION_SNAPSHOT')
+    revocation_mode: RevocationMode = Field(default=RevocationMode.KEYS, validation_alias='REVOCATION_MODE')
+    revocation_bloom_capacity: int = Field(default=100_000, validation_alias='REVOCATION_BLOOM_CAPACITY')
+    revocation_bloom_fpr: float = Field(default=0.001, gt=0, lt=1, validation_alias='REVOCATION_BLOOM_FPR')
+    history_buffer_size: int = Field(default=10_000, validation_alias='HISTORY_BUFFER_SIZE')
+    history_batch_size: int = Field(default=500, validation_alias='HISTORY_BATCH_SIZE')
+    history_flush_interval: float = Field(default=1.0, validation_alias='HISTORY_FLUSH_INTERVAL')
+    history_retention_months: int = Field(default=12, validation_alias='HISTORY_RETENTION_MONTHS')
+    role_catalog_check_interval: float = Field(default=5.0, validation_alias='ROLE_CATALOG_CHECK_INTERVAL')
+    token_generation_cache_ttl: float = Field(default=5.0, validation_alias='TOKEN_GENERATION_CACHE_TTL')
+    token_generation_cache_size: int = Field(default=100_000, validation_alias='TOKEN_GENERATION_CACHE_SIZE')
+    profile_cache_ttl: int = Field(default=3600, validation_alias='PROFILE_CACHE_TTL')
 
     model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8')
 
-    def database_dsn(self):
-        return f"postgresql+asyncpg://{self.pg_user}:{self.pg_password}@{self.pg_host}:{self.pg_port}/{self.pg_db}"
+    @model_validator(mode='after')
+    def read_key_files(self) -> 'Settings':
+        '''
+        Ключи RS256/EdDSA удобнее хранить файлами PEM: если ключ не задан строкой, он читается из файла.
+        '''
+        if self.authjwt_private_key is None and self.jwt_private_key_file is not None:
+            self.authjwt_private_key = self.jwt_private_key_file.read_text()
+        if self.authjwt_public_key is None and self.jwt_public_key_file is not None:
+            self.authjwt_public_key = self.jwt_public_key_file.read_text()
+        return self
+
+    def database_dsn(self, host: str | None = None, port: int | None = None):
+        host, port = host or self.pg_host, port or self.pg_port
+        return f"postgresql+asyncpg://{self.pg_user}:{self.pg_password}@{host}:{port}/{self.pg_db}"
+
+    def replica_dsn(self) -> str | None:
+        '''
+        DSN реплики для запросов только на чтение или None, если реплика не настроена.
+        '''
+        if self.pg_replica_host is None:
+            return None
+        return self.database_dsn(self.pg_replica_host, self.pg_replica_port)
 
 
 class Token(Enum):
@@ -44,8 +110,23 @@ class Name(Enum):
     LOGIN = 'Login'
     EMAIL = 'Email'
     BOTH = 'user and role'
+    SESSION = 'Session'
+    FALLBACK_ROLE = 'fallback role'
+
+
+class FileFormat(str, Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
+class SigningAlgorithm(str, Enum):
+    HS256 = 'HS256'
+    RS256 = 'RS256'
+    ES256 = 'ES256'
+    EDDSA = 'EdDSA'
 
 
 PAGE_SIZE = 10
+EXPORT_CHUNK_SIZE = 1000
 
 app_settings = Settings()
@@ -46,6 +46,18 @@ class DefaultRoleDoesNotExistException(HTTPException):
         self.detail = 'No default role, can\'t create user'
         self.status_code = HTTPStatus.BAD_REQUEST
 
+
+class HashingOverloadedException(HTTPException):
+    def __init__(self):
+        self.detail = 'Too many password operations in progress, try again later'
+        self.status_code = HTTPStatus.SERVICE_UNAVAILABLE
+
+
+class InvalidCursorException(HTTPException):
+    def __init__(self):
+        self.detail = 'Invalid pagination cursor'
+        self.status_code = HTTPStatus.BAD_REQUEST
+
 # @app.exception_handler(DoesNotExistException)
 # async def does_not_exist_handler(request: Request, exc: DoesNotExistException):
 #     return PlainTextResponse(f'No such {exc.name}', status_code=HTTPStatus.BAD_REQUEST)
@@ -0,0 +1,174 @@
+import inspect
+import os
+from functools import wraps
+from time import perf_counter
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from core.server_timing import add_timing
+
+# Границы для быстрых операций (Redis, запросы к базе, JWT) и для HTTP-запросов и хеширования паролей.
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+SLOW_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'auth_http_request_duration_seconds',
+    'HTTP request latency by route template',
+    ['method', 'route', 'status'],
+    buckets=SLOW_BUCKETS,
+)
+
+REPOSITORY_CALL_SECONDS = Histogram(
+    'auth_repository_call_duration_seconds',
+    'BaseRepository method latency',
+    ['method'],
+    buckets=FAST_BUCKETS,
+)
+
+REDIS_CALL_SECONDS = Histogram(
+    'auth_redis_call_duration_seconds',
+    'Redis command latency of the shared client; a pipeline or transaction counts as one PIPELINE or MULTI',
+    ['operation'],
+    buckets=FAST_BUCKETS,
+)
+
+JWT_SECONDS = Histogram(
+    'auth_jwt_duration_seconds',
+    'JWT issue (access and refresh pair) and verification latency',
+    ['operation'],
+    buckets=FAST_BUCKETS,
+)
+
+PASSWORD_HASH_SECONDS = Histogram(
+    'auth_password_hash_duration_seconds',
+    'Password hashing and verification latency, including the wait for a free pool process',
+    ['operation'],
+    buckets=SLOW_BUCKETS,
+)
+
+PASSWORD_HASH_REJECTED = Counter(
+    'auth_password_hash_rejected_total',
+    'Hashing requests rejected because the hashing pool queue was full',
+)
+
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    'auth_password_hash_queue_depth',
+    'Hashing requests waiting for a free process of the hashing pool',
+    multiprocess_mode='livesum',
+)
+
+AUTH_EVENTS = Counter(
+    'auth_events_total',
+    'Authentication outcomes: login, refresh, unsafe_entry and revoked_token by result',
+    ['event', 'result'],
+)
+
+PROFILE_CACHE_REQUESTS = Counter(
+    'auth_profile_cache_requests_total',
+    'Profile cache lookups: hit, miss (loaded from Postgres) or coalesced (waited for a concurrent load)',
+    ['result'],
+)
+
+HISTORY_EVENTS = Counter(
+    'auth_history_events_total',
+    'Login history events of the buffered sink: written, dropped (buffer full) or failed (write error)',
+    ['result'],
+)
+
+HISTORY_PENDING = Gauge(
+    'auth_history_pending_events',
+    'Login history events buffered by the sink and not yet written',
+    multiprocess_mode='livesum',
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    'auth_db_pool_connections',
+    'Database connections of the pool: open (connected) and checked_out (in use by a request)',
+    ['engine', 'state'],
+    multiprocess_mode='livesum',
+)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'auth_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a pooled connection, including opening a new one',
+    ['engine'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+)
+
+
+def timed(metric, timing: str | None = None):
+    '''
+    Декоратор корутины: время выполнения записывается в metric — гистограмму с уже заданными метками.
+
+    :param timing: (str | None) Категория заголовка Server-Timing, в которую добавляется это время.
+    '''
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                metric.observe(elapsed)
+                if timing is not None:
+                    add_timing(timing, elapsed)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(cls: type, histogram: Histogram, private: bool = False, timing: str | None = None) -> None:
+    '''
+    Оборачивает корутины класса в timed, метка — имя метода.
+
+    :param private: (bool) Замерять и методы с подчёркиванием. По умолчанию только публичные,
+        чтобы вспомогательные методы, вызываемые из публичных, не считались дважды.
+    :param timing: (str | None) Категория заголовка Server-Timing.
+    '''
+    for name, func in list(vars(cls).items()):
+        if inspect.iscoroutinefunction(func) and not name.startswith('__') and (private or not name.startswith('_')):
+            setattr(cls, name, timed(histogram.labels(name), timing)(func))
+
+
+class MetricsMiddleware:
+    '''
+    ASGI middleware, замеряющее время ответа. Метка route — шаблон пути (/api/v1/profile/sessions/{session_id}/),
+    а не сам путь, чтобы число рядов не зависело от id в запросах; запросы мимо маршрутов считаются как unmatched.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            HTTP_REQUEST_SECONDS.labels(
+                scope['method'], route.path if route is not None else 'unmatched', status
+            ).observe(perf_counter() - start)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    '''
+    Метрики в текстовом формате Prometheus и их Content-Type. Если задан PROMETHEUS_MULTIPROC_DIR
+    (gunicorn с несколькими воркерами), отдаются метрики всех воркеров, а не только ответившего.
+    '''
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
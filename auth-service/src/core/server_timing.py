@@ -0,0 +1,76 @@
+from contextvars import ContextVar
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Суммарное время по категориям (db, redis, jwt, hash) в текущем запросе или None, если замер выключен.
+request_timings: ContextVar[dict[str, float] | None] = ContextVar('request_timings', default=None)
+
+
+def add_timing(name: str, seconds: float) -> None:
+    '''
+    Добавляет время операции к сумме её категории, если в текущем запросе идёт замер.
+    '''
+    timings = request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['server_timing_start'] = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('server_timing_start', None)
+    if start is not None:
+        add_timing('db', perf_counter() - start)
+
+
+def instrument_engine(engine: Engine) -> None:
+    '''
+    Учитывает время каждого SQL-запроса движка в категории db.
+
+    :param engine: (Engine) Синхронный движок (AsyncEngine.sync_engine).
+    '''
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def server_timing_header(timings: dict[str, float], total: float) -> bytes:
+    '''
+    Значение заголовка Server-Timing, длительности в миллисекундах.
+    '''
+    metrics = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items()]
+    metrics.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(metrics).encode()
+
+
+class ServerTimingMiddleware:
+    '''
+    ASGI middleware, добавляющее к ответу заголовок Server-Timing с суммарным временем запросов к базе,
+    команд общего клиента Redis, операций JWT и хеширования паролей, например
+    «db;dur=3.1, redis;dur=0.4, hash;dur=80.2, total;dur=85.0». Подключается при SERVER_TIMING=true.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        timings = {}
+        token = request_timings.set(timings)
+        start = perf_counter()
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                header = server_timing_header(timings, perf_counter() - start)
+                message['headers'] = [*message.get('headers', []), (b'server-timing', header)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timings.reset(token)
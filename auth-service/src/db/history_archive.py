@@ -0,0 +1,160 @@
+import csv
+import gzip
+import io
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import orjson
+from sqlalchemy import select, delete, or_, and_, tuple_
+
+from db.postgres import engine
+from models.entity import History
+
+ARCHIVE_COLUMNS = ('id', 'user_id', 'time', 'browser', 'event_type', 'result')
+
+
+class ArchiveWriter:
+    '''
+    Пишет строки истории в сжатые файлы, разбитые по дням: <output_dir>/<YYYY-MM-DD>.<format>.gz.
+
+    Строки приходят отсортированными по времени, поэтому одновременно открыт только один файл.
+    Файлы открываются на дозапись, так что после перезапуска архив продолжается с того же места.
+    Файл, закрываемый при смене дня, сбрасывается на диск вместе с концом gzip-потока,
+    поэтому после sync() на диске лежат все файлы порции, а не только текущий.
+    '''
+
+    def __init__(self, output_dir: Path, file_format: str):
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self._day = None
+        self._raw = None
+        self._file = None
+        self._csv = None
+        self._new_entries = False
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    def _open(self, day: str) -> None:
+        self.close()
+        path = self.output_dir / f'{day}.{self.file_format}.gz'
+        is_new = not path.exists()
+        self._new_entries = self._new_entries or is_new
+        self._raw = open(path, 'ab')
+        self._file = io.TextIOWrapper(gzip.GzipFile(fileobj=self._raw, mode='ab'), encoding='utf-8', newline='')
+        self._day = day
+        if self.file_format == 'csv':
+            self._csv = csv.writer(self._file)
+            if is_new:
+                self._csv.writerow(ARCHIVE_COLUMNS)
+
+    def write(self, row: dict) -> None:
+        day = row['time'].strftime('%Y-%m-%d')
+        if day != self._day:
+            self._open(day)
+        if self.file_format == 'csv':
+            self._csv.writerow([row[column] for column in ARCHIVE_COLUMNS])
+        else:
+            self._file.write(orjson.dumps(row).decode() + '\n')
+
+    def sync(self) -> None:
+        '''
+        Сбрасывает данные на диск. Вызывается перед удалением строк из базы.
+        '''
+        if self._file is not None:
+            self._file.flush()
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+        self._sync_dir()
+
+    def _sync_dir(self) -> None:
+        if not self._new_entries:
+            return
+        fd = os.open(self.output_dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._new_entries = False
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+            self._raw.close()
+            self._file = None
+            self._raw = None
+            self._day = None
+
+
+def load_checkpoint(path: Path) -> dict | None:
+    if path.exists():
+        return json.loads(path.read_text())
+    return None
+
+
+def save_checkpoint(path: Path, checkpoint: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(checkpoint))
+    temporary.replace(path)
+
+
+async def command_archive_history(
+        older_than_days: int, output_dir: Path, file_format: str, batch_size: int, checkpoint_path: Path
+) -> int:
+    '''
+    Переносит строки login_history старше older_than_days дней в сжатые файлы и удаляет их из базы.
+
+    Строки читаются серверным курсором порциями по batch_size, каждая порция записывается на диск,
+    удаляется из базы отдельной транзакцией, после чего сохраняется контрольная точка. Память не зависит
+    от объёма архива. При перезапуске работа продолжается с контрольной точки с тем же порогом времени;
+    порция, записанная, но не удалённая до сбоя, попадёт в архив повторно (at-least-once).
+
+    :return: (int) Количество перенесённых строк.
+    '''
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint is None:
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        checkpoint = {'cutoff': cutoff.isoformat(), 'time': None, 'id': None, 'archived': 0}
+    cutoff = datetime.fromisoformat(checkpoint['cutoff'])
+
+    columns = [getattr(History, column) for column in ARCHIVE_COLUMNS]
+    query = select(*columns).where(History.time < cutoff)
+    if checkpoint['time'] is not None:
+        last_time, last_id = datetime.fromisoformat(checkpoint['time']), uuid.UUID(checkpoint['id'])
+        query = query.where(or_(
+            History.time > last_time,
+            and_(History.time == last_time, History.id > last_id)
+        ))
+    query = query.order_by(History.time, History.id).execution_options(yield_per=batch_size)
+
+    writer = ArchiveWriter(output_dir, file_format)
+    try:
+        async with engine.connect() as read_conn:
+            result = await read_conn.stream(query)
+            async for rows in result.partitions(batch_size):
+                keys = []
+                for row in rows:
+                    data = row._asdict()
+                    data['event_type'] = data['event_type'].value if data['event_type'] else None
+                    writer.write(data)
+                    keys.append((row.id, row.time))
+                writer.sync()
+
+                async with engine.begin() as write_conn:
+                    await write_conn.execute(
+                        delete(History).where(tuple_(History.id, History.time).in_(keys))
+                    )
+
+                checkpoint.update(
+                    time=rows[-1].time.isoformat(), id=str(rows[-1].id), archived=checkpoint['archived'] + len(rows)
+                )
+                save_checkpoint(checkpoint_path, checkpoint)
+    finally:
+        writer.close()
+
+    checkpoint_path.unlink(missing_ok=True)
+    return checkpoint['archived']
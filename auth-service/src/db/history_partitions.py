@@ -0,0 +1,188 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from db.postgres import engine
+from logger import logger
+
+PARTITION_NAME = 'login_history_y{year:04d}m{month:02d}'
+PARTITION_PATTERN = re.compile(r'^login_history_y(\d{4})m(\d{2})$')
+DEFAULT_PARTITION = 'login_history_default'
+DETACH_LOCK_TIMEOUT = '5s'
+
+
+@dataclass
+class PartitionPlan:
+    '''
+    План обслуживания секций: какие создать (имя, начало, конец) и какие отсоединить.
+    '''
+    create: list[tuple[str, datetime, datetime]] = field(default_factory=list)
+    detach: list[str] = field(default_factory=list)
+
+
+def month_start(moment: datetime, offset: int = 0) -> datetime:
+    '''
+    Возвращает начало месяца, сдвинутого на offset месяцев относительно moment.
+    '''
+    month_index = moment.year * 12 + moment.month - 1 + offset
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def retention_start(retention_months: int) -> datetime:
+    '''
+    Нижняя граница хранимой истории: всё, что раньше, лежит в отсоединяемых секциях.
+    Используется в запросах истории, чтобы планировщик отбрасывал старые секции.
+    '''
+    return month_start(datetime.utcnow(), -retention_months)
+
+
+def plan_partitions(existing: set[str], now: datetime, months_ahead: int, retention_months: int) -> PartitionPlan:
+    '''
+    Считает план без обращения к базе.
+
+    :param existing: (set[str]) Имена уже присоединённых секций.
+    :param now: (datetime) Текущий момент.
+    :param months_ahead: (int) На сколько месяцев вперёд нужны секции.
+    :param retention_months: (int) Срок хранения в месяцах.
+    :return: (PartitionPlan) Секции к созданию и к отсоединению.
+    '''
+    plan = PartitionPlan()
+    current = month_start(now)
+    cutoff = month_start(current, -retention_months)
+    for offset in range(months_ahead + 1):
+        start = month_start(current, offset)
+        name = PARTITION_NAME.format(year=start.year, month=start.month)
+        if name not in existing:
+            plan.create.append((name, start, month_start(start, 1)))
+    for name in sorted(existing):
+        match = PARTITION_PATTERN.match(name)
+        if match is None:
+            continue
+        start = datetime(int(match.group(1)), int(match.group(2)), 1)
+        if month_start(start, 1) <= cutoff:
+            plan.detach.append(name)
+    return plan
+
+
+def create_partition_sql(name: str, start: datetime, end: datetime) -> list[str]:
+    '''
+    Создание секции, в которую сначала переносятся строки диапазона из секции по умолчанию.
+    Иначе ATTACH/PARTITION OF упадёт, если туда уже попали строки за этот месяц.
+    '''
+    bounds = f"time >= '{start:%Y-%m-%d}' AND time < '{end:%Y-%m-%d}'"
+    return [
+        f"CREATE TABLE {name} (LIKE login_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE {bounds}",
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE {bounds}",
+        f"ALTER TABLE login_history ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')",
+    ]
+
+
+def detach_partition_sql(name: str, concurrently: bool) -> str:
+    '''
+    DETACH ... CONCURRENTLY не блокирует читателей, но Postgres запрещает его,
+    если у таблицы есть секция по умолчанию.
+    '''
+    suffix = ' CONCURRENTLY' if concurrently else ''
+    return f"ALTER TABLE login_history DETACH PARTITION {name}{suffix}"
+
+
+async def _partitions(conn) -> tuple[set[str], set[str], bool]:
+    result = await conn.execute(text(
+        "SELECT c.relname, i.inhdetachpending FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'login_history'::regclass"
+    ))
+    rows = result.all()
+    existing = {row.relname for row in rows if not row.inhdetachpending}
+    pending = {row.relname for row in rows if row.inhdetachpending}
+    has_default = await conn.execute(text(
+        "SELECT partdefid <> 0 FROM pg_partitioned_table WHERE partrelid = 'login_history'::regclass"
+    ))
+    return existing, pending, bool(has_default.scalar())
+
+
+async def _create_partition(name: str, start: datetime, end: datetime) -> str:
+    async with engine.begin() as conn:
+        moved = 0
+        for statement in create_partition_sql(name, start, end):
+            result = await conn.execute(text(statement))
+            if statement.startswith('INSERT'):
+                moved = result.rowcount
+    if moved:
+        return f'created {name}, moved {moved} rows from {DEFAULT_PARTITION}'
+    return f'created {name}'
+
+
+async def _detach_partition(name: str, concurrently: bool, drop: bool) -> list[str]:
+    actions = []
+    if concurrently:
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+            await conn.execute(text(detach_partition_sql(name, concurrently=True)))
+            actions.append(f'detached {name}')
+            if drop:
+                await conn.execute(text(f"DROP TABLE {name}"))
+                actions.append(f'dropped {name}')
+        return actions
+    async with engine.begin() as conn:
+        await conn.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+        await conn.execute(text(detach_partition_sql(name, concurrently=False)))
+        actions.append(f'detached {name}')
+        if drop:
+            await conn.execute(text(f"DROP TABLE {name}"))
+            actions.append(f'dropped {name}')
+    return actions
+
+
+async def command_manage_history_partitions(months_ahead: int, retention_months: int, drop: bool) -> list[str]:
+    '''
+    Создаёт секции login_history на months_ahead месяцев вперёд и отсоединяет (или удаляет)
+    секции, целиком вышедшие за срок хранения retention_months.
+
+    Каждая секция обрабатывается в своей транзакции: ошибка на одной попадает в лог
+    и не откатывает остальные. Отсоединение идёт CONCURRENTLY вне транзакции, когда
+    это разрешено; при наличии секции по умолчанию — обычным DETACH с lock_timeout,
+    чтобы не выстраивать читателей в очередь за блокировкой.
+
+    :return: (list[str]) Список выполненных действий для лога.
+    '''
+    actions = []
+    async with engine.connect() as conn:
+        existing, pending, has_default = await _partitions(conn)
+    plan = plan_partitions(existing, datetime.utcnow(), months_ahead, retention_months)
+
+    for name, start, end in plan.create:
+        try:
+            actions.append(await _create_partition(name, start, end))
+        except DBAPIError as err:
+            logger.warning('Failed to create partition %s: %s', name, err)
+            actions.append(f'failed to create {name}')
+
+    for name in sorted(pending):
+        try:
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+                await conn.execute(text(f"ALTER TABLE login_history DETACH PARTITION {name} FINALIZE"))
+            actions.append(f'finalized detach of {name}')
+        except DBAPIError as err:
+            logger.warning('Failed to finalize detach of %s: %s', name, err)
+            actions.append(f'failed to finalize detach of {name}')
+
+    for name in plan.detach:
+        try:
+            actions.extend(await _detach_partition(name, concurrently=not has_default, drop=drop))
+        except DBAPIError as err:
+            logger.warning('Failed to detach partition %s: %s', name, err)
+            actions.append(f'failed to detach {name}')
+
+    if has_default:
+        async with engine.connect() as conn:
+            default_rows = await conn.execute(text(f"SELECT count(*) FROM {DEFAULT_PARTITION}"))
+            default_count = default_rows.scalar()
+        if default_count:
+            actions.append(f'warning: {default_count} rows in {DEFAULT_PARTITION}, create partitions for them')
+    return actions
@@ -0,0 +1,148 @@
+import secrets
+from datetime import datetime, timedelta
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from redis.asyncio import Redis
+from sqlalchemy import select
+
+from core.config import app_settings
+from db.postgres import async_session
+from models.entity import SigningKey, KeyStatus
+from services.key_encryption import encrypt_private_key, decrypt_private_key, kek_id_of
+from services.key_ring import KeyRing
+from services.signing_keys import is_asymmetric, public_jwk
+
+KEY_GENERATORS = {
+    'RS256': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'ES256': lambda: ec.generate_private_key(ec.SECP256R1()),
+    'EdDSA': lambda: ed25519.Ed25519PrivateKey.generate(),
+}
+
+
+def generate_key(algorithm: str) -> SigningKey:
+    '''
+    Создаёт новый ключ подписи. kid асимметричного ключа — отпечаток открытого ключа,
+    для HMAC — случайная строка. Закрытый ключ шифруется текущим KEK.
+    '''
+    if not is_asymmetric(algorithm):
+        kid = secrets.token_urlsafe(16)
+        return SigningKey(
+            kid=kid, algorithm=algorithm, private_key=encrypt_private_key(kid, secrets.token_urlsafe(64))
+        )
+    private_key = KEY_GENERATORS[algorithm]()
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    kid = public_jwk(public_pem, algorithm)['kid']
+    return SigningKey(
+        kid=kid, algorithm=algorithm, private_key=encrypt_private_key(kid, private_pem), public_key=public_pem
+    )
+
+
+async def bump_key_ring_version() -> None:
+    redis = Redis(host=app_settings.redis_host, port=app_settings.redis_port)
+    try:
+        await redis.incr(KeyRing.VERSION_KEY)
+    finally:
+        await redis.close()
+
+
+async def command_stage_signing_key(algorithm: str) -> str:
+    '''
+    Добавляет ключ в статусе staged: он публикуется в JWKS и принимается при проверке,
+    но токены им ещё не подписываются.
+
+    :return: (str) kid нового ключа.
+    '''
+    key = generate_key(algorithm)
+    async with async_session() as session:
+        session.add(key)
+        await session.commit()
+    await bump_key_ring_version()
+    return key.kid
+
+
+async def command_activate_signing_key(kid: str, force: bool) -> str:
+    '''
+    Делает ключ активным, прежний активный ключ переводится в deprecated и продолжает
+    приниматься при проверке, пока не будет выведен из оборота.
+    '''
+    min_staged = timedelta(seconds=2 * app_settings.signing_keys_check_interval)
+    async with async_session() as session:
+        key = await session.get(SigningKey, kid)
+        if key is None:
+            return f'Signing key {kid} does not exist'
+        if key.status == KeyStatus.active:
+            return f'Signing key {kid} is already active'
+        if key.status == KeyStatus.retired:
+            return f'Signing key {kid} is retired, stage a new key instead'
+        if not force and datetime.utcnow() - key.created_at < min_staged:
+            # Все воркеры должны успеть загрузить ключ, иначе токены с новым kid будут отклоняться.
+            return f'Signing key {kid} was staged less than {min_staged} ago, wait or use --force'
+
+        now = datetime.utcnow()
+        result = await session.execute(select(SigningKey).where(SigningKey.status == KeyStatus.active))
+        for previous in result.scalars():
+            previous.status = KeyStatus.deprecated
+            previous.deprecated_at = now
+        await session.flush()
+        key.status = KeyStatus.active
+        key.activated_at = now
+        await session.commit()
+    await bump_key_ring_version()
+    return f'Signing key {kid} is active'
+
+
+async def command_retire_signing_key(kid: str, force: bool) -> str:
+    '''
+    Выводит ключ из оборота: токены, подписанные им, больше не принимаются. По умолчанию прежний
+    ключ можно вывести только после истечения срока жизни refresh token, выданных до его замены.
+    '''
+    async with async_session() as session:
+        key = await session.get(SigningKey, kid)
+        if key is None:
+            return f'Signing key {kid} does not exist'
+        if key.status == KeyStatus.active:
+            return f'Signing key {kid} is active, activate another key first'
+        if key.status == KeyStatus.retired:
+            return f'Signing key {kid} is already retired'
+        if key.status == KeyStatus.deprecated and not force:
+            safe_after = key.deprecated_at + timedelta(seconds=app_settings.authjwt_time_refresh)
+            if datetime.utcnow() < safe_after:
+                return f'Tokens signed with {kid} are valid until {safe_after:%Y-%m-%d %H:%M} UTC, wait or use --force'
+        key.status = KeyStatus.retired
+        await session.commit()
+    await bump_key_ring_version()
+    return f'Signing key {kid} is retired'
+
+
+async def command_list_signing_keys() -> list[str]:
+    async with async_session() as session:
+        result = await session.execute(select(SigningKey).order_by(SigningKey.created_at))
+        return [
+            f'{key.kid} {key.algorithm} {key.status.value} created {key.created_at:%Y-%m-%d %H:%M}'
+            for key in result.scalars()
+        ]
+
+
+async def command_encrypt_signing_keys() -> int:
+    '''
+    Шифрует текущим KEK ключи, сохранённые в открытом виде или зашифрованные другим KEK
+    (смена KEK: новый ключ добавляется в SIGNING_KEKS и становится SIGNING_KEK_ID, после команды
+    прежний можно удалить из настроек).
+
+    :return: (int) Количество перешифрованных ключей.
+    '''
+    changed = 0
+    async with async_session() as session:
+        result = await session.execute(select(SigningKey).with_for_update())
+        for key in result.scalars():
+            if kek_id_of(key.private_key) != app_settings.signing_kek_id:
+                key.private_key = encrypt_private_key(key.kid, decrypt_private_key(key.kid, key.private_key))
+                changed += 1
+        await session.commit()
+    return changed
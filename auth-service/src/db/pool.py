@@ -0,0 +1,35 @@
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from core.metrics import DB_POOL_CHECKOUT_WAIT, DB_POOL_CONNECTIONS
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    '''
+    Пул соединений, замеряющий ожидание свободного соединения. Метка метрики — pool_logging_name движка.
+    '''
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.logging_name).observe(perf_counter() - start)
+
+
+def instrument_pool(engine: Engine, name: str) -> None:
+    '''
+    Ведёт число открытых и выданных соединений пула по событиям пула.
+
+    :param engine: (Engine) Синхронный движок (AsyncEngine.sync_engine).
+    :param name: (str) Метка engine в метриках.
+    '''
+    opened = DB_POOL_CONNECTIONS.labels(name, 'open')
+    checked_out = DB_POOL_CONNECTIONS.labels(name, 'checked_out')
+    event.listen(engine, 'connect', lambda *args: opened.inc())
+    event.listen(engine, 'close', lambda *args: opened.dec())
+    event.listen(engine, 'checkout', lambda *args: checked_out.inc())
+    event.listen(engine, 'checkin', lambda *args: checked_out.dec())
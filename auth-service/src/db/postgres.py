@@ -1,19 +1,88 @@
+from uuid import uuid4
+
 from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
+from sqlalchemy.pool import NullPool
 
-from core.config import app_settings
+from core.config import app_settings, Settings
+from core.server_timing import instrument_engine
+from db.pool import TimedQueuePool, instrument_pool
+from services.password_hasher import password_hasher
 
 Base = declarative_base()
 
-engine = create_async_engine(url=app_settings.database_dsn(), echo=True, future=True)
+
+def engine_options(settings: Settings, name: str) -> dict:
+    '''
+    Параметры create_async_engine из настроек.
+
+    В режиме DB_TRANSACTION_POOLING (pgbouncer и подобные прокси в режиме transaction) соединение
+    с сервером меняется от транзакции к транзакции, поэтому кэши подготовленных выражений asyncpg
+    и SQLAlchemy отключаются, выражения получают уникальные имена, а пул приложения заменяется
+    на NullPool: соединения держит прокси.
+
+    :param name: (str) Имя движка в логах и метриках пула.
+    '''
+    options = {'echo': settings.db_echo, 'pool_pre_ping': settings.db_pool_pre_ping, 'pool_logging_name': name}
+    if settings.db_transaction_pooling:
+        options.update(poolclass=NullPool, connect_args={
+            'statement_cache_size': 0,
+            'prepared_statement_cache_size': 0,
+            'prepared_statement_name_func': lambda: f'__asyncpg_{uuid4()}__',
+        })
+    else:
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            connect_args={
+                'statement_cache_size': settings.db_statement_cache_size,
+                'prepared_statement_cache_size': settings.db_statement_cache_size,
+            },
+        )
+    return options
+
+
+def create_engine(url: str, name: str, **kwargs) -> AsyncEngine:
+    new_engine = create_async_engine(url, **engine_options(app_settings, name), **kwargs)
+    instrument_pool(new_engine.sync_engine, name)
+    if app_settings.server_timing:
+        instrument_engine(new_engine.sync_engine)
+    return new_engine
+
+
+engine = create_engine(app_settings.database_dsn(), 'primary')
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# Реплика для запросов только на чтение, если задан POSTGRES_REPLICA_HOST. Транзакции на ней
+# открываются как READ ONLY, так что случайная запись в реплику завершится ошибкой, а не расхождением.
+replica_engine = None
+replica_session = None
+if app_settings.replica_dsn() is not None:
+    replica_engine = create_engine(
+        app_settings.replica_dsn(), 'replica', execution_options={'postgresql_readonly': True}
+    )
+    replica_session = sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+
 
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
 
 
+async def get_replica_session() -> AsyncSession | None:
+    '''
+    Сессия реплики или None, если реплика не настроена. Соединение берётся из пула только при первом запросе.
+    '''
+    if replica_session is None:
+        yield None
+        return
+    async with replica_session() as session:
+        yield session
+
+
 async def create_database() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -38,5 +107,6 @@ async def command_create_user(repository, model_user, model_role, data) -> str:
         user = await repository_obj.get_obj_by_attr_name(model=model_user, attr_name='login', attr_value=data['login'])
         if user is None:
             data['role_id'] = role.id
+            data['password_hash'] = await password_hasher.hash(data.pop('password'))
             await repository_obj.create_obj(model_user, data)
             return 'Done!'
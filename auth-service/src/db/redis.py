@@ -1,7 +1,51 @@
+from time import perf_counter
+
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from core.metrics import REDIS_CALL_SECONDS
+from core.server_timing import add_timing
 
 redis: Redis | None = None
 
 
+def _observe(operation: str, start: float) -> None:
+    elapsed = perf_counter() - start
+    REDIS_CALL_SECONDS.labels(operation).observe(elapsed)
+    add_timing('redis', elapsed)
+
+
+class InstrumentedPipeline(Pipeline):
+    '''
+    Конвейер, время выполнения которого учитывается как одна операция (PIPELINE или MULTI).
+    '''
+
+    async def execute(self, raise_on_error: bool = True):
+        start = perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            _observe('MULTI' if self.is_transaction else 'PIPELINE', start)
+
+
+class InstrumentedRedis(Redis):
+    '''
+    Клиент Redis, замеряющий каждую команду (метка — имя команды) и добавляющий её время
+    в категорию redis заголовка Server-Timing. Скрипты идут через EVALSHA, конвейеры — через
+    InstrumentedPipeline, так что учитываются все обращения через общий клиент, а не только CacheRedis.
+    Ожидание сообщений pub/sub не замеряется: у PubSub своё соединение и свой execute_command.
+    '''
+
+    async def execute_command(self, *args, **options):
+        start = perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            _observe(str(args[0]).upper(), start)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
 async def get_redis() -> Redis:
     return redis
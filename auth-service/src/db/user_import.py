@@ -0,0 +1,235 @@
+import asyncio
+import csv
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterator
+
+import orjson
+from sqlalchemy import select, text
+
+from db.history_archive import load_checkpoint, save_checkpoint
+from db.postgres import engine
+from models.entity import Role
+from services.password_hasher import PasswordHasher
+
+# Колонки users в порядке COPY. id и created_at задаются в Python, как и при создании через ORM.
+IMPORT_COLUMNS = ('id', 'is_admin', 'login', 'email', 'password', 'first_name', 'last_name', 'created_at', 'role_id')
+STAGING_TABLE = 'users_import'
+FIELD_LIMITS = {'login': 255, 'email': 255, 'first_name': 50, 'last_name': 50}
+# Хеши werkzeug (method$salt$hash), которые проверяет check_password_hash.
+HASH_METHODS = ('pbkdf2:', 'scrypt:')
+SECRET_FIELDS = ('password', 'password_hash')
+PASSWORD_HASH_LIMIT = 255
+
+
+@dataclass
+class ImportRecord:
+    number: int
+    data: dict | None
+    error: str | None = None
+
+    def rejected(self, reason: str) -> dict:
+        '''
+        Строка файла отклонённых записей. Пароли и хеши туда не попадают.
+        '''
+        data = {
+            key: value for key, value in (self.data or {}).items()
+            if isinstance(key, str) and key not in SECRET_FIELDS
+        }
+        return {'record': self.number, 'reason': reason, 'data': data}
+
+
+@dataclass
+class ImportBatch:
+    last_number: int
+    rows: list[tuple] = field(default_factory=list)
+    numbers: dict[uuid.UUID, ImportRecord] = field(default_factory=dict)
+    rejected: list[dict] = field(default_factory=list)
+    imported: int = 0
+
+
+def read_records(path: Path, file_format: str, skip: int = 0) -> Iterator[ImportRecord]:
+    '''
+    Читает входной файл по одной записи, не загружая его в память.
+
+    :param skip: (int) Сколько первых записей пропустить (продолжение с контрольной точки).
+    '''
+    with path.open(encoding='utf-8', newline='') as file:
+        if file_format == 'csv':
+            records = (
+                ImportRecord(number, row)
+                for number, row in enumerate(csv.DictReader(file), start=1)
+            )
+        else:
+            records = (parse_json_line(number, line) for number, line in enumerate(filter(str.strip, file), start=1))
+        yield from islice(records, skip, None)
+
+
+def parse_json_line(number: int, line: str) -> ImportRecord:
+    try:
+        data = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return ImportRecord(number, None, 'invalid json')
+    if not isinstance(data, dict):
+        return ImportRecord(number, None, 'record is not an object')
+    return ImportRecord(number, data)
+
+
+def validate(data: dict) -> str | None:
+    '''
+    Проверяет запись пользователя.
+
+    :return: (str | None) Причина отказа или None, если запись корректна.
+    '''
+    for name in ('login', 'email'):
+        if not data.get(name):
+            return f'{name} is required'
+    for name in (*FIELD_LIMITS, *SECRET_FIELDS):
+        if data.get(name) is not None and not isinstance(data[name], str):
+            return f'{name} must be a string'
+        if '\x00' in (data.get(name) or ''):
+            return f'{name} contains a NUL character'
+    for name, limit in FIELD_LIMITS.items():
+        if len(data.get(name) or '') > limit:
+            return f'{name} is longer than {limit} characters'
+    if data.get('password_hash'):
+        if not data['password_hash'].startswith(HASH_METHODS):
+            return 'unsupported password hash'
+        if len(data['password_hash']) > PASSWORD_HASH_LIMIT:
+            return f'password_hash is longer than {PASSWORD_HASH_LIMIT} characters'
+    elif not data.get('password'):
+        return 'password or password_hash is required'
+    return None
+
+
+async def prepare_batch(records: list[ImportRecord], role_id: uuid.UUID, hasher: PasswordHasher) -> ImportBatch:
+    '''
+    Проверяет записи порции и хеширует пароли в пуле процессов: пароли делятся на части
+    по числу процессов, каждая часть хешируется одной задачей.
+    '''
+    batch = ImportBatch(last_number=records[-1].number)
+    valid = []
+    for record in records:
+        reason = record.error or validate(record.data)
+        if reason:
+            batch.rejected.append(record.rejected(reason))
+        else:
+            valid.append(record)
+
+    plain = [record for record in valid if not record.data.get('password_hash')]
+    chunk_size = -(-len(plain) // hasher.pool_size) or 1
+    chunks = [plain[start:start + chunk_size] for start in range(0, len(plain), chunk_size)]
+    hashed = await asyncio.gather(*(
+        hasher.hash_many([record.data['password'] for record in chunk]) for chunk in chunks
+    ))
+    hashes = {id(record): password for chunk, result in zip(chunks, hashed) for record, password in zip(chunk, result)}
+
+    now = datetime.utcnow()
+    for record in valid:
+        user_id = uuid.uuid4()
+        batch.numbers[user_id] = record
+        batch.rows.append((
+            user_id, False, record.data['login'], record.data['email'],
+            record.data.get('password_hash') or hashes[id(record)],
+            record.data.get('first_name'), record.data.get('last_name'), now, role_id
+        ))
+    return batch
+
+
+async def load_batch(conn, batch: ImportBatch) -> None:
+    '''
+    Загружает порцию одной транзакцией: COPY во временную таблицу, затем INSERT ... ON CONFLICT DO NOTHING.
+    Записи, не вставленные из-за занятого логина или почты, переносятся в отклонённые.
+    '''
+    await conn.execute(text(f'TRUNCATE {STAGING_TABLE}'))
+    if batch.rows:
+        raw_connection = await conn.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            STAGING_TABLE, records=batch.rows, columns=IMPORT_COLUMNS
+        )
+        columns = ', '.join(IMPORT_COLUMNS)
+        result = await conn.execute(text(
+            f'INSERT INTO users ({columns}) SELECT {columns} FROM {STAGING_TABLE} '
+            f'ON CONFLICT DO NOTHING RETURNING id'
+        ))
+        inserted = set(result.scalars())
+        batch.imported = len(inserted)
+        batch.rejected.extend(
+            record.rejected('login or email already exists')
+            for user_id, record in batch.numbers.items() if user_id not in inserted
+        )
+    await conn.commit()
+
+
+async def resolve_role_id(conn, role_level: int | None) -> uuid.UUID | None:
+    query = select(Role.id)
+    query = query.where(Role.lvl == role_level) if role_level is not None else query.order_by(Role.lvl).limit(1)
+    return (await conn.execute(query)).scalar()
+
+
+async def command_import_users(
+        path: Path,
+        file_format: str,
+        batch_size: int,
+        workers: int,
+        role_level: int | None,
+        rejected_path: Path,
+        checkpoint_path: Path,
+        on_progress: Callable[[dict], None] = lambda checkpoint: None
+) -> dict:
+    '''
+    Загружает пользователей из CSV или NDJSON (поля login, email, first_name, last_name и password
+    либо password_hash — готовый хеш werkzeug).
+
+    Файл читается потоково порциями по batch_size: пока одна порция загружается в базу, пароли следующей
+    хешируются в пуле из workers процессов, поэтому в памяти не больше двух порций. Каждая порция
+    загружается через COPY отдельной транзакцией, после которой сохраняется контрольная точка; прерванный
+    запуск продолжается с неё. Порция, загруженная, но не отмеченная в контрольной точке до сбоя,
+    при повторе попадёт в отклонённые как уже существующая. Некорректные записи и занятые логины
+    и почты пишутся в rejected_path (NDJSON, без паролей).
+
+    :return: (dict) Контрольная точка с итогами: records, imported, rejected.
+    '''
+    checkpoint = load_checkpoint(checkpoint_path) or {'records': 0, 'imported': 0, 'rejected': 0}
+    hasher = PasswordHasher(pool_size=workers, queue_size=workers)
+    rejected_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        async with engine.connect() as conn:
+            role_id = await resolve_role_id(conn, role_level)
+            if role_id is None:
+                raise ValueError('Role does not exist. Try command -- python3 cli.py create_default_role')
+            await conn.execute(text(
+                f'CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (LIKE users INCLUDING DEFAULTS)'
+            ))
+            await conn.commit()
+
+            records = read_records(path, file_format, skip=checkpoint['records'])
+            pending = None
+            with rejected_path.open('ab') as rejected_file:
+                while True:
+                    # Пароли следующей порции хешируются, пока текущая загружается в базу.
+                    chunk = list(islice(records, batch_size))
+                    prepared = asyncio.create_task(prepare_batch(chunk, role_id, hasher)) if chunk else None
+                    if pending is not None:
+                        batch = await pending
+                        await load_batch(conn, batch)
+                        rejected_file.writelines(orjson.dumps(row) + b'\n' for row in batch.rejected)
+                        rejected_file.flush()
+                        checkpoint.update(
+                            records=batch.last_number,
+                            imported=checkpoint['imported'] + batch.imported,
+                            rejected=checkpoint['rejected'] + len(batch.rejected)
+                        )
+                        save_checkpoint(checkpoint_path, checkpoint)
+                        on_progress(checkpoint)
+                    if prepared is None:
+                        break
+                    pending = prepared
+    finally:
+        hasher.stop()
+
+    checkpoint_path.unlink(missing_ok=True)
+    return checkpoint
@@ -1,24 +1,30 @@
-from async_fastapi_jwt_auth import AuthJWT
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends
 
+from services.auth_jwt import KeyRingAuthJWT
 from services.user import BaseAuth, UserManage
 from services.role import BaseRole
 from services.history import BaseHistory
 from services.admin import BaseAdmin
-from db.postgres import get_session
+from db.postgres import get_session, get_replica_session
 from db.redis import get_redis, Redis
+from core.config import app_settings
 
 
 def get_manager_history(
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    replica_session: AsyncSession | None = Depends(get_replica_session),
+    redis: Redis = Depends(get_redis)
 ):
-    return BaseHistory(session=session)
+    return BaseHistory(
+        session=session, replica_session=replica_session, redis=redis,
+        sticky_window=app_settings.read_after_write_window
+    )
 
 
 def get_repository_user(
         session: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        authorize: KeyRingAuthJWT = Depends(),
         redis: Redis = Depends(get_redis),
         manager_history: BaseHistory = Depends(get_manager_history)
 ):
@@ -0,0 +1,24 @@
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+# Метрики воркеров собираются через файлы в PROMETHEUS_MULTIPROC_DIR (см. core/metrics.py::render_metrics).
+
+
+def on_starting(server):
+    '''
+    Файлы метрик прошлого запуска удаляются, иначе счётчики продолжатся с прежних значений.
+    '''
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    '''
+    Значения gauge (livesum) завершившегося воркера перестают учитываться.
+    '''
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,13 +1,17 @@
-from fastapi.responses import ORJSONResponse
-from redis.asyncio import Redis
+from fastapi.responses import ORJSONResponse, Response
 import uvicorn
 from fastapi import FastAPI, Request
 from async_fastapi_jwt_auth import AuthJWT
 from async_fastapi_jwt_auth.exceptions import AuthJWTException
 
 from core.config import app_settings
+from core.metrics import MetricsMiddleware, render_metrics
+from core.server_timing import ServerTimingMiddleware
 from db import redis
 from api.v1 import auth, personal_acc, roles
+from services.password_hasher import password_hasher
+from services.revocation import revoked_tokens
+from services.history_sink import history_sink
 
 
 app = FastAPI(
@@ -16,6 +20,9 @@ app = FastAPI(
     openapi_url='/api/openapi.json',
     default_response_class=ORJSONResponse,
 )
+app.add_middleware(MetricsMiddleware)
+if app_settings.server_timing:
+    app.add_middleware(ServerTimingMiddleware)
 
 
 @AuthJWT.load_config
@@ -33,10 +40,26 @@ def authjwt_exception_handler(request: Request, exc: AuthJWTException):
 
 @app.on_event('startup')
 async def startup():
-    redis.redis = Redis(host=app_settings.redis_host, port=app_settings.redis_port)
+    redis.redis = redis.InstrumentedRedis(host=app_settings.redis_host, port=app_settings.redis_port)
+    password_hasher.start()
+    revoked_tokens.start(redis.redis)
+    history_sink.start()
     # from models.entity import User
     # await create_database()
 
+
+@app.on_event('shutdown')
+async def shutdown():
+    await history_sink.stop()
+    await revoked_tokens.stop()
+    password_hasher.stop()
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 app.include_router(auth.router, prefix='/api/v1/auth', tags=['login'])
 app.include_router(personal_acc.router, prefix='/api/v1/profile', tags=['personal_acc'])
 app.include_router(roles.router, prefix='/api/v1/admin', tags=['admin'])
@@ -0,0 +1,41 @@
+"""signing keys
+
+Revision ID: 2b7e9c4a1f60
+Revises: 8d4e2f61c7a3
+Create Date: 2026-10-18 19:41:08.310447
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7e9c4a1f60'
+down_revision = '8d4e2f61c7a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('signing_keys',
+    sa.Column('kid', sa.String(length=64), nullable=False),
+    sa.Column('algorithm', sa.String(length=16), nullable=False),
+    sa.Column('private_key', sa.Text(), nullable=False),
+    sa.Column('public_key', sa.Text(), nullable=True),
+    sa.Column('status', sa.Enum('staged', 'active', 'deprecated', 'retired', name='keystatus'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('activated_at', sa.DateTime(), nullable=True),
+    sa.Column('deprecated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('kid')
+    )
+    # Подписывать токены может только один ключ.
+    op.create_index(
+        'ix_signing_keys_single_active', 'signing_keys', ['status'],
+        unique=True, postgresql_where=sa.text("status = 'active'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_signing_keys_single_active', table_name='signing_keys')
+    op.drop_table('signing_keys')
+    sa.Enum(name='keystatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,29 @@
+"""login history keyset index
+
+Revision ID: 5c1f3a7d2b94
+Revises: 039e1eae5b38
+Create Date: 2026-10-18 10:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f3a7d2b94'
+down_revision = '039e1eae5b38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_login_history_user_id_time_id',
+        'login_history',
+        ['user_id', sa.text('time DESC'), 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_login_history_user_id_time_id', table_name='login_history')
@@ -0,0 +1,92 @@
+"""partition login history by month
+
+Revision ID: 8d4e2f61c7a3
+Revises: 5c1f3a7d2b94
+Create Date: 2026-10-18 11:03:27.204615
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4e2f61c7a3'
+down_revision = '5c1f3a7d2b94'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE login_history RENAME TO login_history_old")
+    op.execute("ALTER TABLE login_history_old RENAME CONSTRAINT login_history_pkey TO login_history_old_pkey")
+    op.execute("ALTER TABLE login_history_old RENAME CONSTRAINT login_history_id_key TO login_history_old_id_key")
+    op.execute("ALTER INDEX ix_login_history_user_id_time_id RENAME TO ix_login_history_old_user_id_time_id")
+    op.execute("UPDATE login_history_old SET time = timezone('utc', now()) WHERE time IS NULL")
+
+    # Ключ секционирования обязан входить в первичный ключ, поэтому PK становится (id, time).
+    op.execute("""
+        CREATE TABLE login_history (
+            id UUID NOT NULL,
+            user_id UUID NOT NULL REFERENCES users (id),
+            time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            browser VARCHAR(255) NOT NULL,
+            event_type eventenum,
+            result BOOLEAN NOT NULL,
+            CONSTRAINT login_history_pkey PRIMARY KEY (id, time)
+        ) PARTITION BY RANGE (time)
+    """)
+    op.execute("CREATE INDEX ix_login_history_user_id_time_id ON login_history (user_id, time DESC, id)")
+    op.execute("CREATE TABLE login_history_default PARTITION OF login_history DEFAULT")
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month_start DATE;
+        BEGIN
+            FOR month_start IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce((SELECT min(time) FROM login_history_old), now())),
+                    date_trunc('month', now()) + interval '{MONTHS_AHEAD} months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF login_history FOR VALUES FROM (%L) TO (%L)',
+                    'login_history_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+                    month_start,
+                    (month_start + interval '1 month')::date
+                );
+            END LOOP;
+        END $$
+    """)
+    op.execute("""
+        INSERT INTO login_history (id, user_id, time, browser, event_type, result)
+        SELECT id, user_id, time, browser, event_type, result FROM login_history_old
+    """)
+    op.execute("DROP TABLE login_history_old")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE login_history RENAME TO login_history_partitioned")
+    op.execute("ALTER INDEX ix_login_history_user_id_time_id RENAME TO ix_login_history_partitioned_user_id_time_id")
+    op.execute(
+        "ALTER TABLE login_history_partitioned RENAME CONSTRAINT login_history_pkey TO login_history_partitioned_pkey"
+    )
+    op.execute("""
+        CREATE TABLE login_history (
+            id UUID NOT NULL,
+            user_id UUID NOT NULL REFERENCES users (id),
+            time TIMESTAMP WITHOUT TIME ZONE,
+            browser VARCHAR(255) NOT NULL,
+            event_type eventenum,
+            result BOOLEAN NOT NULL,
+            CONSTRAINT login_history_pkey PRIMARY KEY (id),
+            CONSTRAINT login_history_id_key UNIQUE (id)
+        )
+    """)
+    op.execute("""
+        INSERT INTO login_history (id, user_id, time, browser, event_type, result)
+        SELECT id, user_id, time, browser, event_type, result FROM login_history_partitioned
+    """)
+    op.execute("DROP TABLE login_history_partitioned")
+    op.execute("CREATE INDEX ix_login_history_user_id_time_id ON login_history (user_id, time DESC, id)")
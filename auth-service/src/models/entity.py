@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 import enum
-from sqlalchemy import Boolean, Column, DateTime, String, Enum, ForeignKey, Integer
+from sqlalchemy import Boolean, Column, DateTime, String, Enum, ForeignKey, Integer, Index, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -24,15 +24,19 @@ class User(Base):
     role = relationship("Role")
 
     def __init__(
-            self, login: str, password: str, first_name: str,
-            last_name: str, role: 'Role', email: str, is_admin: bool = False
+            self, login: str, first_name: str, last_name: str, email: str,
+            password: str | None = None, password_hash: str | None = None,
+            role: 'Role | None' = None, role_id: uuid.UUID | None = None, is_admin: bool = False
     ) -> None:
         self.is_admin = is_admin
         self.login = login
-        self.password = generate_password_hash(password)
+        self.password = password_hash if password_hash is not None else generate_password_hash(password)
         self.first_name = first_name
         self.last_name = last_name
-        self.role = role
+        if role is not None:
+            self.role = role
+        else:
+            self.role_id = role_id
         self.email = email
 
     def check_password(self, password: str) -> bool:
@@ -70,14 +74,19 @@ class EventEnum(enum.Enum):
 class History(Base):
     __tablename__ = 'login_history'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
-    time = Column(DateTime, default=datetime.utcnow)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False)
+    time = Column(DateTime, primary_key=True, default=datetime.utcnow, nullable=False)
     browser = Column(String(255), nullable=False)
     event_type = Column(Enum(EventEnum))
     result = Column(Boolean, nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     user = relationship("User")
 
+    __table_args__ = (
+        Index('ix_login_history_user_id_time_id', user_id, time.desc(), id),
+        {'postgresql_partition_by': 'RANGE (time)'},
+    )
+
     def __init__(self, user_id: UUID, browser: str, event_type: enum, result: bool) -> None:
         self.user_id = user_id
         self.browser = browser
@@ -86,3 +95,38 @@ class History(Base):
 
     def __repr__(self) -> str:
         return f'<User {self.user_id}>'
+
+
+class KeyStatus(enum.Enum):
+    staged = "staged"
+    active = "active"
+    deprecated = "deprecated"
+    retired = "retired"
+
+
+class SigningKey(Base):
+    __tablename__ = 'signing_keys'
+
+    kid = Column(String(64), primary_key=True, nullable=False)
+    algorithm = Column(String(16), nullable=False)
+    # Шифротекст закрытого ключа (services/key_encryption.py), ключ в открытом виде в базу не пишется.
+    private_key = Column(Text, nullable=False)
+    public_key = Column(Text)
+    status = Column(Enum(KeyStatus), default=KeyStatus.staged, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    activated_at = Column(DateTime)
+    deprecated_at = Column(DateTime)
+
+    __table_args__ = (
+        Index('ix_signing_keys_single_active', status, unique=True, postgresql_where=status == KeyStatus.active),
+    )
+
+    def __init__(self, kid: str, algorithm: str, private_key: str, public_key: str | None = None) -> None:
+        self.kid = kid
+        self.algorithm = algorithm
+        self.private_key = private_key
+        self.public_key = public_key
+        self.status = KeyStatus.staged
+
+    def __repr__(self) -> str:
+        return f'<SigningKey {self.kid}:{self.status.value}>'
@@ -1,6 +1,6 @@
 from uuid import UUID
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class FieldFilter(BaseModel):
@@ -16,6 +16,19 @@ class HistoryUser(BaseModel):
     result: bool
 
 
+class HistoryPage(BaseModel):
+    items: list[HistoryUser]
+    next_cursor: str | None = None
+
+
+class SessionInfo(BaseModel):
+    id: str
+    user_agent: str | None = None
+    created_at: datetime | None = None
+    expires_at: datetime
+    current: bool = False
+
+
 class UserCreate(BaseModel):
     login: str
     password: str = Field(min_length=8)
@@ -74,5 +87,29 @@ class UserRole(BaseModel):
     role_id: UUID
 
 
+class UserFilter(BaseModel):
+    role_id: UUID | None = None
+    is_admin: bool | None = None
+    email_domain: str | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+
+
+class BulkRoleAssign(BaseModel):
+    role_id: UUID
+    user_ids: list[UUID] | None = None
+    filter: UserFilter | None = None
+
+    @model_validator(mode='after')
+    def check_target(self) -> 'BulkRoleAssign':
+        if (self.user_ids is None) == (self.filter is None):
+            raise ValueError('Pass either user_ids or filter')
+        return self
+
+
+class AffectedUsers(BaseModel):
+    affected: int
+
+
 class ChangeLevel(BaseModel):
     level_up: bool
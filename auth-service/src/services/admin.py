@@ -1,8 +1,13 @@
 import uuid
 
-from schemas.entity import RoleCreate
+from sqlalchemy import any_, bindparam, delete, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+from schemas.entity import RoleCreate, BulkRoleAssign, UserFilter
 from models.entity import User, Role
+from services.profile_cache import profile_cache
 from services.repository import BaseRepository
+from services.role_catalog import role_catalog
 from core.exceptions import *
 
 
@@ -27,6 +32,7 @@ class BaseAdmin(BaseRepository):
             "max_year": data.max_year
         }
         await self.create_obj(Role, new_role)
+        await role_catalog.invalidate(self.manager_auth.redis)
         return RoleCreate(**new_role)
 
     async def update_role(self, role_id: uuid.UUID, new_data: RoleCreate):
@@ -37,6 +43,7 @@ class BaseAdmin(BaseRepository):
                 if value:
                     setattr(role_obj, attr, value)
             await self.manager_auth.session.commit()
+            await role_catalog.invalidate(self.manager_auth.redis)
             return RoleCreate(**vars(role_obj))
         else:
             raise DoesNotExistException(name=Name.ROLE)
@@ -47,6 +54,7 @@ class BaseAdmin(BaseRepository):
         if role_obj and user_obj:
             user_obj.role = role_obj
             await self.manager_auth.session.commit()
+            await profile_cache.invalidate(self.manager_auth.redis, [user_id])
         elif user_obj and not role_obj:
             raise DoesNotExistException(name=Name.ROLE)
         elif role_obj and not user_obj:
@@ -54,5 +62,70 @@ class BaseAdmin(BaseRepository):
         else:
             raise DoesNotExistException(name=Name.BOTH)
 
-    async def delete_role(self, role_id: uuid.UUID):
-        await self.delete_obj(Role, role_id)
+    async def assign_role_bulk(self, data: BulkRoleAssign) -> int:
+        """
+        Назначает роль списку пользователей или всем пользователям, подходящим под фильтр, одним UPDATE.
+
+        :param data: (BulkRoleAssign) id роли и либо список id пользователей, либо фильтр.
+        :return:
+        int: Количество пользователей, у которых изменилась роль.
+        """
+        if await role_catalog.get_by_id(self.manager_auth.redis, data.role_id) is None:
+            raise DoesNotExistException(name=Name.ROLE)
+        if data.user_ids is not None:
+            # Список передаётся одним параметром-массивом: число параметров запроса не зависит от его длины.
+            filters = [User.id == any_(bindparam('user_ids', data.user_ids, type_=ARRAY(UUID(as_uuid=True))))]
+        else:
+            filters = self._user_filters(data.filter)
+        affected = await self.update_objs_returning(
+            User, {'role_id': data.role_id}, [*filters, User.role_id.is_distinct_from(data.role_id)], User.id
+        )
+        await self.session.commit()
+        await profile_cache.invalidate(self.manager_auth.redis, affected)
+        return len(affected)
+
+    @staticmethod
+    def _user_filters(user_filter: UserFilter) -> list:
+        filters = []
+        if user_filter.role_id is not None:
+            filters.append(User.role_id == user_filter.role_id)
+        if user_filter.is_admin is not None:
+            filters.append(User.is_admin == user_filter.is_admin)
+        if user_filter.email_domain:
+            filters.append(User.email.endswith(f'@{user_filter.email_domain}', autoescape=True))
+        if user_filter.created_after is not None:
+            filters.append(User.created_at >= user_filter.created_after)
+        if user_filter.created_before is not None:
+            filters.append(User.created_at < user_filter.created_before)
+        return filters
+
+    async def delete_role(self, role_id: uuid.UUID, fallback_role_id: uuid.UUID | None = None) -> int:
+        """
+        Удаляет роль, её пользователи в той же транзакции переводятся на запасную роль.
+
+        :param role_id: (UUID) id удаляемой роли.
+        :param fallback_role_id: (UUID) id запасной роли, по умолчанию — оставшаяся роль с минимальным уровнем.
+        :return:
+        int: Количество пользователей, переведённых на запасную роль.
+        """
+        # Строка роли блокируется до конца транзакции: параллельное назначение этой роли ждёт на проверке
+        # внешнего ключа, и между переводом пользователей и DELETE на роль никто не попадёт.
+        if await self.session.get(Role, role_id, with_for_update=True) is None:
+            raise DoesNotExistException(name=Name.ROLE)
+        if fallback_role_id is None:
+            fallback_role_id = await self._get_obj(
+                select(Role.id).where(Role.id != role_id).order_by(Role.lvl).limit(1)
+            )
+        elif fallback_role_id == role_id or await self.session.get(Role, fallback_role_id) is None:
+            fallback_role_id = None
+        if fallback_role_id is None:
+            raise DoesNotExistException(name=Name.FALLBACK_ROLE)
+
+        reassigned = await self.update_objs_returning(
+            User, {'role_id': fallback_role_id}, [User.role_id == role_id], User.id
+        )
+        await self.session.execute(delete(Role).where(Role.id == role_id))
+        await self.session.commit()
+        await role_catalog.invalidate(self.manager_auth.redis)
+        await profile_cache.invalidate(self.manager_auth.redis, reassigned)
+        return len(reassigned)
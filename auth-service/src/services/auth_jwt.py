@@ -1,6 +1,62 @@
+import jwt
 from async_fastapi_jwt_auth import AuthJWT
+from async_fastapi_jwt_auth.exceptions import AuthJWTException, InvalidHeaderError, JWTDecodeError
 
 from core.config import app_settings
+from core.metrics import JWT_SECONDS, timed
+from db.redis import get_redis
+from services.key_ring import key_ring, RingKey
+from services.signing_keys import token_headers
+
+
+class KeyRingAuthJWT(AuthJWT):
+    '''
+    AuthJWT, который подписывает токены активным ключом из key_ring и проверяет их ключом,
+    выбранным по kid из заголовка. Токены без kid или с kid ключа из настроек проверяются ключами
+    из настроек, токены с неизвестным или выведенным из оборота kid отклоняются.
+    '''
+
+    _signing_key: RingKey | None = None
+
+    async def _create_token(self, **kwargs) -> str:
+        active = (await key_ring.get(await get_redis())).active
+        # Ключ запоминается, чтобы подпись и заголовок kid относились к одному ключу,
+        # даже если набор перезагрузится между вызовами.
+        self._signing_key = active
+        if active is not None:
+            kwargs['algorithm'] = active.algorithm
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), 'kid': active.kid}
+        elif kwargs.get('headers') is None:
+            kwargs['headers'] = token_headers()
+        return await super()._create_token(**kwargs)
+
+    async def _get_secret_key(self, algorithm: str, process: str):
+        if process == 'encode' and self._signing_key is not None:
+            return self._signing_key.signing_key
+        return await super()._get_secret_key(algorithm, process)
+
+    async def _verified_token(self, encoded_token: str, issuer: str | None = None) -> dict:
+        try:
+            kid = jwt.get_unverified_header(encoded_token).get('kid')
+        except Exception as err:
+            raise InvalidHeaderError(status_code=422, message=str(err))
+        static_kid = (token_headers() or {}).get('kid')
+        if kid is None or kid == static_kid:
+            return await super()._verified_token(encoded_token, issuer)
+        key = await key_ring.get_by_kid(await get_redis(), kid)
+        if key is None:
+            raise JWTDecodeError(status_code=422, message='Unknown signing key')
+        try:
+            return jwt.decode(
+                encoded_token,
+                key.verifying_key,
+                issuer=issuer,
+                audience=self._decode_audience,
+                leeway=self._decode_leeway,
+                algorithms=[key.algorithm],
+            )
+        except Exception as err:
+            raise JWTDecodeError(status_code=422, message=str(err))
 
 
 class BaseAuthJWT:
@@ -14,6 +70,20 @@ class BaseAuthJWT:
             user_claims: dict,
             expires_time_access: int = app_settings.authjwt_time_access,
             expires_time_refresh: int = app_settings.authjwt_time_refresh
+    ) -> tuple[str, str]:
+        access_token, refresh_token = await self.issue_tokens(
+            sub, user_claims, expires_time_access, expires_time_refresh
+        )
+        await self.set_token_cookies(access_token, refresh_token)
+        return access_token, refresh_token
+
+    @timed(JWT_SECONDS.labels('issue'), 'jwt')
+    async def issue_tokens(
+            self,
+            sub: str,
+            user_claims: dict,
+            expires_time_access: int = app_settings.authjwt_time_access,
+            expires_time_refresh: int = app_settings.authjwt_time_refresh
     ) -> tuple[str, str]:
         access_token = await self.auth.create_access_token(
             subject=sub, expires_time=expires_time_access, user_claims=user_claims
@@ -23,20 +93,36 @@ class BaseAuthJWT:
         refresh_token = await self.auth.create_refresh_token(
             subject=sub, expires_time=expires_time_refresh, user_claims=user_claims
         )
+        return access_token, refresh_token
+
+    async def set_token_cookies(self, access_token: str, refresh_token: str) -> None:
         await self.auth.set_access_cookies(access_token)
         await self.auth.set_refresh_cookies(refresh_token)
-        return access_token, refresh_token
 
+    @timed(JWT_SECONDS.labels('verify_access'), 'jwt')
     async def check_access_token(self) -> dict:
         await self.auth.jwt_required()
         user_data = await self.auth.get_raw_jwt()
         return user_data
 
+    @timed(JWT_SECONDS.labels('verify_refresh'), 'jwt')
     async def check_refresh_token(self) -> dict:
         await self.auth.jwt_refresh_token_required()
         user_data = await self.auth.get_raw_jwt()
         return user_data
 
+    @timed(JWT_SECONDS.labels('verify_refresh'), 'jwt')
+    async def refresh_token_jti(self, refresh_token: str | None) -> str | None:
+        '''
+        jti проверенного refresh token или None, если токена нет или он недействителен.
+        '''
+        if not refresh_token:
+            return None
+        try:
+            return (await self.auth.get_raw_jwt(refresh_token)).get('jti')
+        except AuthJWTException:
+            return None
+
     async def jwt_logout(self) -> None:
         await self.auth.jwt_required()
         await self.auth.unset_jwt_cookies()
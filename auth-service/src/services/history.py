@@ -1,24 +1,120 @@
+import csv
+import io
 import uuid
+from typing import AsyncIterator
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
 
-from schemas.entity import HistoryUser
+import orjson
+from redis.asyncio import Redis
+
+from schemas.entity import HistoryUser, HistoryPage
 from models.entity import History
 from services.repository import BaseRepository
+from services.history_sink import history_sink
+from db.history_partitions import retention_start
+from core.config import app_settings, FileFormat, EXPORT_CHUNK_SIZE
+from core.exceptions import InvalidCursorException
+
+EXPORT_COLUMNS = ('id', 'time', 'browser', 'event_type', 'result')
 
 
 class BaseHistory(BaseRepository):
+    def __init__(self, *args, redis: Redis | None = None, **kwargs):
+        self.redis = redis
+        super().__init__(*args, **kwargs)
+
     async def write_entry_history(self, user_id: uuid.UUID, user_agent: str, event_type: str, result: bool):
-        await self.create_obj(
-            model=History,
-            data={
+        if not history_sink.running:
+            await self.create_obj(
+                model=History,
+                data={
+                    'user_id': user_id,
+                    'browser': user_agent,
+                    'event_type': event_type,
+                    'result': result
+                }
+            )
+        else:
+            history_sink.put({
+                'id': uuid.uuid4(),
+                'time': datetime.utcnow(),
                 'user_id': user_id,
                 'browser': user_agent,
                 'event_type': event_type,
                 'result': result
-            }
-        )
+            })
+        await self.stick_to_primary(user_id)
 
     async def get_history(self, user_id: uuid.UUID, page_number: int, page_size: int):
         list_obj = await self.get_list_obj_by_attr_name(model=History, attr_name='user_id', attr_value=user_id,
-                                                  page_number=page_number, page_size=page_size)
+                                                        page_number=page_number, page_size=page_size,
+                                                        order_by=(History.time.desc(), History.id),
+                                                        filters=self._retention_filter(), user_id=user_id)
         result = [HistoryUser.model_validate(obj.__dict__) for obj in list_obj]
         return result
+
+    async def get_history_page(self, user_id: uuid.UUID, cursor: str | None, page_size: int) -> HistoryPage:
+        '''
+        Возвращает страницу истории, начиная с курсора, и курсор следующей страницы.
+
+        :param user_id: (UUID) id пользователя.
+        :param cursor: (str | None) Курсор из предыдущего ответа, None для первой страницы.
+        :param page_size: (int) Количество записей на странице.
+        '''
+        after = self._decode_cursor(cursor) if cursor else None
+        list_obj = await self.get_list_obj_by_keyset(model=History, attr_name='user_id', attr_value=user_id,
+                                                     order_attr='time', after=after, page_size=page_size + 1,
+                                                     filters=self._retention_filter(), user_id=user_id)
+        items = [HistoryUser.model_validate(obj.__dict__) for obj in list_obj[:page_size]]
+        next_cursor = None
+        if len(list_obj) > page_size:
+            next_cursor = self._encode_cursor(items[-1].time, items[-1].id)
+        return HistoryPage(items=items, next_cursor=next_cursor)
+
+    async def export_history(self, user_id: uuid.UUID, file_format: FileFormat) -> AsyncIterator[str]:
+        '''
+        Отдаёт всю историю пользователя порциями NDJSON или CSV, читая базу серверным курсором.
+
+        :param user_id: (UUID) id пользователя.
+        :param file_format: (FileFormat) Формат выгрузки.
+        '''
+        columns = [getattr(History, column) for column in EXPORT_COLUMNS]
+        chunks = self.stream_columns_by_attr_name(
+            model=History, columns=columns, attr_name='user_id', attr_value=user_id, chunk_size=EXPORT_CHUNK_SIZE,
+            order_by=(History.time.desc(), History.id), filters=self._retention_filter(), user_id=user_id
+        )
+        if file_format == FileFormat.CSV:
+            yield ','.join(EXPORT_COLUMNS) + '\n'
+        async for rows in chunks:
+            records = [
+                {column: getattr(row, column) for column in EXPORT_COLUMNS}
+                | {'event_type': row.event_type.value if row.event_type else None}
+                for row in rows
+            ]
+            if file_format == FileFormat.CSV:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows(record.values() for record in records)
+                yield buffer.getvalue()
+            else:
+                yield ''.join(orjson.dumps(record).decode() + '\n' for record in records)
+
+    @staticmethod
+    def _retention_filter() -> tuple:
+        '''
+        Ограничение по времени, по которому планировщик отбрасывает секции старше срока хранения.
+        '''
+        return (History.time >= retention_start(app_settings.history_retention_months),)
+
+    @staticmethod
+    def _encode_cursor(time: datetime, id: uuid.UUID) -> str:
+        return urlsafe_b64encode(f'{time.isoformat()}|{id}'.encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+        try:
+            time, id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(time), uuid.UUID(id)
+        except ValueError:
+            raise InvalidCursorException()
@@ -0,0 +1,114 @@
+import asyncio
+from collections import deque
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.config import app_settings
+from core.metrics import HISTORY_EVENTS, HISTORY_PENDING
+from db.postgres import async_session
+from models.entity import History
+from logger import logger
+
+
+class HistorySink:
+    '''
+    Буферизованная запись истории входов.
+
+    События складываются в ограниченный буфер и сбрасываются в базу одним многострочным INSERT,
+    когда набирается batch_size событий или проходит flush_interval секунд. Если буфер полон,
+    событие отбрасывается и учитывается в счётчике dropped. При остановке остаток буфера дописывается.
+    Счётчики и размер буфера отдаются на /metrics (auth_history_events_total, auth_history_pending_events).
+    '''
+
+    def __init__(self, session_factory, buffer_size: int, batch_size: int, flush_interval: float):
+        self.session_factory = session_factory
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._buffer: deque[dict] = deque()
+        self._wakeup: asyncio.Event | None = None
+        self._closing = False
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def put(self, event: dict) -> None:
+        '''
+        Ставит событие в очередь на запись, не дожидаясь базы.
+
+        :param event: (dict) Значения колонок таблицы login_history.
+        '''
+        if len(self._buffer) >= self.buffer_size:
+            self.dropped += 1
+            HISTORY_EVENTS.labels('dropped').inc()
+            return
+        self._buffer.append(event)
+        HISTORY_PENDING.inc()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flush(self, batch: list[dict]) -> None:
+        try:
+            async with self.session_factory() as session:
+                await session.execute(insert(History), batch)
+                await session.commit()
+            self.written += len(batch)
+            HISTORY_EVENTS.labels('written').inc(len(batch))
+        except (SQLAlchemyError, OSError) as error:
+            self.failed += len(batch)
+            HISTORY_EVENTS.labels('failed').inc(len(batch))
+            logger.error('Failed to write %s history events: %s', len(batch), error)
+        except Exception:
+            # Неожиданная ошибка (например, от драйвера мимо SQLAlchemy) не должна остановить фоновую задачу:
+            # иначе буфер перестанет сбрасываться, а события будут молча отбрасываться как dropped.
+            self.failed += len(batch)
+            HISTORY_EVENTS.labels('failed').inc(len(batch))
+            logger.exception('Failed to write %s history events', len(batch))
+
+    async def _flush_pending(self) -> None:
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            HISTORY_PENDING.dec(len(batch))
+            await self._flush(batch)
+
+    async def _run(self) -> None:
+        while not self._closing:
+            self._wakeup.clear()
+            if len(self._buffer) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self._flush_pending()
+        await self._flush_pending()
+
+
+history_sink = HistorySink(
+    session_factory=async_session,
+    buffer_size=app_settings.history_buffer_size,
+    batch_size=app_settings.history_batch_size,
+    flush_interval=app_settings.history_flush_interval
+)
@@ -0,0 +1,76 @@
+import os
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from core.config import app_settings
+
+# Закрытые ключи подписи хранятся в signing_keys зашифрованными (envelope encryption): каждый ключ
+# шифруется своим случайным ключом данных (DEK, AES-256-GCM), а DEK — ключом шифрования ключей (KEK)
+# из настроек SIGNING_KEKS. В базе, на реплике и в резервных копиях лежат только шифротексты;
+# kid ключа подписи входит в AAD, поэтому запись нельзя подставить под другой kid.
+# Формат: enc:v1:{id KEK}:{зашифрованный DEK}:{nonce}:{зашифрованный ключ}, части в base64url.
+ENCRYPTED_PREFIX = 'enc:v1:'
+NONCE_SIZE = 12
+
+
+class KeyEncryptionError(Exception):
+    pass
+
+
+def _b64(data: bytes) -> str:
+    return urlsafe_b64encode(data).decode()
+
+
+def _kek(kek_id: str) -> AESGCM:
+    try:
+        key = urlsafe_b64decode(app_settings.signing_keks[kek_id])
+    except KeyError:
+        raise KeyEncryptionError(f'KEK {kek_id} is not configured in SIGNING_KEKS')
+    if len(key) != 32:
+        raise KeyEncryptionError(f'KEK {kek_id} must be 32 bytes encoded as base64url')
+    return AESGCM(key)
+
+
+def is_encrypted(stored: str) -> bool:
+    return stored.startswith(ENCRYPTED_PREFIX)
+
+
+def encrypt_private_key(kid: str, private_key: str, kek_id: str | None = None) -> str:
+    '''
+    Шифрует закрытый ключ подписи для записи в signing_keys.
+
+    :param kid: (str) kid ключа подписи, связывается с шифротекстом через AAD.
+    :param kek_id: (str) id KEK, по умолчанию текущий SIGNING_KEK_ID.
+    '''
+    kek_id = kek_id or app_settings.signing_kek_id
+    if kek_id is None:
+        raise KeyEncryptionError('SIGNING_KEK_ID is not configured')
+    aad = kid.encode()
+    dek = AESGCM.generate_key(bit_length=256)
+    dek_nonce, key_nonce = os.urandom(NONCE_SIZE), os.urandom(NONCE_SIZE)
+    wrapped_dek = dek_nonce + _kek(kek_id).encrypt(dek_nonce, dek, aad)
+    ciphertext = AESGCM(dek).encrypt(key_nonce, private_key.encode(), aad)
+    return ENCRYPTED_PREFIX + ':'.join((kek_id, _b64(wrapped_dek), _b64(key_nonce), _b64(ciphertext)))
+
+
+def decrypt_private_key(kid: str, stored: str) -> str:
+    '''
+    Расшифровывает закрытый ключ из signing_keys. Записи без префикса — ключи, сохранённые до
+    шифрования; их шифрует команда cli.py encrypt_signing_keys.
+    '''
+    if not is_encrypted(stored):
+        return stored
+    try:
+        kek_id, wrapped_dek, key_nonce, ciphertext = stored[len(ENCRYPTED_PREFIX):].split(':')
+        wrapped_dek = urlsafe_b64decode(wrapped_dek)
+        aad = kid.encode()
+        dek = _kek(kek_id).decrypt(wrapped_dek[:NONCE_SIZE], wrapped_dek[NONCE_SIZE:], aad)
+        return AESGCM(dek).decrypt(urlsafe_b64decode(key_nonce), urlsafe_b64decode(ciphertext), aad).decode()
+    except (ValueError, InvalidTag) as err:
+        raise KeyEncryptionError(f'Signing key {kid} cannot be decrypted: {err!r}')
+
+
+def kek_id_of(stored: str) -> str | None:
+    return stored[len(ENCRYPTED_PREFIX):].split(':', 1)[0] if is_encrypted(stored) else None
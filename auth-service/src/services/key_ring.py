@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from jwt.algorithms import get_default_algorithms
+from redis.asyncio import Redis
+from sqlalchemy import select
+
+from core.config import app_settings
+from db.postgres import async_session
+from models.entity import SigningKey, KeyStatus
+from services.key_encryption import decrypt_private_key
+from services.signing_keys import is_asymmetric, public_jwk, current_jwk
+from services.versioned_cache import VersionedCache
+
+
+@dataclass(frozen=True)
+class RingKey:
+    '''
+    Ключ подписи с уже разобранными объектами ключей: PEM разбирается один раз при загрузке,
+    а не при каждой подписи и проверке токена.
+    '''
+    kid: str
+    algorithm: str
+    status: KeyStatus
+    signing_key: Any
+    verifying_key: Any
+    jwk: dict | None
+
+
+@dataclass(frozen=True)
+class KeyRingSnapshot:
+    keys: Mapping[str, RingKey]
+    active: RingKey | None
+
+
+class KeyRing(VersionedCache[KeyRingSnapshot]):
+    '''
+    Набор ключей подписи из таблицы signing_keys.
+
+    Токены подписываются активным ключом (kid в заголовке), проверяются любым не выведенным из
+    оборота ключом: подготовленным (staged), активным или прежним (deprecated). Поэтому после смены
+    активного ключа выданные ранее токены продолжают действовать, а клиенты переходят на новый ключ
+    постепенно, по мере обновления токенов. Пока в таблице нет ключей, используются ключи из настроек.
+    Версию набора увеличивают команды cli.py для ключей.
+    '''
+
+    VERSION_KEY = 'signing_keys:version'
+
+    async def get_by_kid(self, redis: Redis, kid: str) -> RingKey | None:
+        return (await self.get(redis)).keys.get(kid)
+
+    async def jwks(self, redis: Redis) -> dict:
+        '''
+        Открытые ключи для проверки токенов другими сервисами. Подготовленный ключ публикуется
+        до активации, чтобы проверяющие стороны успели его получить.
+        '''
+        keys = [key.jwk for key in (await self.get(redis)).keys.values() if key.jwk is not None]
+        static_jwk = current_jwk()
+        if static_jwk is not None and all(key['kid'] != static_jwk['kid'] for key in keys):
+            keys.append(static_jwk)
+        return {'keys': keys}
+
+    async def _load(self, session_factory) -> KeyRingSnapshot:
+        async with session_factory() as session:
+            result = await session.execute(select(SigningKey).where(SigningKey.status != KeyStatus.retired))
+            keys = [self._parse(row) for row in result.scalars()]
+        return KeyRingSnapshot(
+            keys=MappingProxyType({key.kid: key for key in keys}),
+            active=next((key for key in keys if key.status == KeyStatus.active), None),
+        )
+
+    @staticmethod
+    def _parse(row: SigningKey) -> RingKey:
+        algorithm = get_default_algorithms()[row.algorithm]
+        asymmetric = is_asymmetric(row.algorithm)
+        private_key = decrypt_private_key(row.kid, row.private_key)
+        return RingKey(
+            kid=row.kid,
+            algorithm=row.algorithm,
+            status=row.status,
+            signing_key=algorithm.prepare_key(private_key),
+            verifying_key=algorithm.prepare_key(row.public_key if asymmetric else private_key),
+            jwk=public_jwk(row.public_key, row.algorithm) if asymmetric else None,
+        )
+
+
+key_ring = KeyRing(async_session, app_settings.signing_keys_check_interval)
@@ -0,0 +1,104 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Any, Callable
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from core.config import app_settings
+from core.exceptions import HashingOverloadedException
+from core.metrics import PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS
+from core.server_timing import add_timing
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    return [generate_password_hash(password) for password in passwords]
+
+
+class PasswordHasher:
+    '''
+    Асинхронное хеширование и проверка паролей в пуле процессов.
+
+    PBKDF2 не выполняется в event loop воркера, поэтому вход одного пользователя не задерживает
+    проверку токенов остальных. Очередь ограничена: если операций больше, чем pool_size + queue_size,
+    новый запрос сразу отклоняется с 503. Глубина очереди, отказы и время операций отдаются на /metrics
+    (auth_password_hash_queue_depth, auth_password_hash_rejected_total, auth_password_hash_duration_seconds).
+    '''
+
+    def __init__(self, pool_size: int, queue_size: int):
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self._executor: ProcessPoolExecutor | None = None
+        self._in_flight = 0
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size, mp_context=multiprocessing.get_context('spawn')
+            )
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        '''
+        Количество операций, ожидающих свободный процесс пула.
+        '''
+        return max(self._in_flight - self.pool_size, 0)
+
+    async def _run(self, operation: str, func: Callable, *args: Any) -> Any:
+        if self._in_flight >= self.pool_size + self.queue_size:
+            PASSWORD_HASH_REJECTED.inc()
+            raise HashingOverloadedException()
+        self.start()
+        self._in_flight += 1
+        if self._in_flight > self.pool_size:
+            PASSWORD_HASH_QUEUE_DEPTH.inc()
+        started = perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            # Метрика повторяет queue_depth: с завершением любой операции очередь становится на одну короче.
+            if self._in_flight > self.pool_size:
+                PASSWORD_HASH_QUEUE_DEPTH.dec()
+            self._in_flight -= 1
+            elapsed = perf_counter() - started
+            PASSWORD_HASH_SECONDS.labels(operation).observe(elapsed)
+            add_timing('hash', elapsed)
+
+    async def hash(self, password: str) -> str:
+        '''
+        Возвращает хеш пароля.
+
+        :param password: (str) Пароль в открытом виде.
+        :return: (str) Хеш в формате werkzeug.
+        '''
+        return await self._run('hash', generate_password_hash, password)
+
+    async def hash_many(self, passwords: list[str]) -> list[str]:
+        '''
+        Хеширует пачку паролей одной задачей пула: для массовой загрузки пользователей,
+        чтобы не передавать в процесс каждый пароль отдельно.
+        '''
+        return await self._run('hash_many', hash_passwords, passwords)
+
+    async def verify(self, password_hash: str, password: str) -> bool:
+        '''
+        Проверяет пароль по сохранённому хешу.
+
+        :param password_hash: (str) Хеш из базы данных.
+        :param password: (str) Пароль в открытом виде.
+        :return: (bool) True, если пароль верный.
+        '''
+        return await self._run('verify', check_password_hash, password_hash, password)
+
+
+password_hasher = PasswordHasher(pool_size=app_settings.hash_pool_size, queue_size=app_settings.hash_queue_size)
@@ -0,0 +1,120 @@
+import asyncio
+import uuid
+from typing import Iterable
+
+import orjson
+from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+
+from core.config import app_settings
+from core.metrics import PROFILE_CACHE_REQUESTS
+from db.postgres import async_session, replica_session
+from models.entity import User
+from services.repository import BaseRepository
+
+# Поля профиля в кэше. Название роли не кэшируется: оно берётся из role_catalog по role_id,
+# поэтому изменение роли администратором не требует сброса профилей.
+PROFILE_COLUMNS = (User.login, User.first_name, User.last_name, User.email, User.role_id)
+
+# Профиль из базы записывается, только если версия не изменилась с начала загрузки: иначе
+# профиль успели изменить или сбросить, и загруженные данные могут быть устаревшими.
+FILL_PROFILE = AsyncScript(None, b'''
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+''')
+
+# Сколько пользователей сбрасывается одним pipeline при массовом изменении ролей.
+INVALIDATE_BATCH = 1000
+
+
+class ProfileCache:
+    '''
+    Кэш профилей пользователей в Redis.
+
+    Методы, меняющие профиль, сбрасывают его (invalidate) после фиксации транзакции. Сброс
+    увеличивает версию профиля, поэтому загрузка из базы, начатая до изменения, не перезапишет
+    кэш старыми данными. Изменённый профиль в кэш не записывается: он собран из прочитанного
+    раньше профиля, и параллельная смена роли была бы затёрта прежним role_id. Одновременные промахи по одному
+    пользователю внутри воркера объединяются в одну загрузку, так что после сброса кэша база
+    получает не больше одного запроса на пользователя от каждого воркера.
+
+    Если настроена реплика, промахи читаются с неё. После изменения профиля пользователь на
+    sticky_window секунд закрепляется за основной базой (ключ PRIMARY_KEY, общий с BaseRepository.read_session),
+    чтобы отставание реплики не вернуло в кэш данные, записанные до изменения.
+    '''
+
+    PROFILE_KEY = 'user:profile:{user_id}'
+    VERSION_KEY = 'user:profile:version:{user_id}'
+    PRIMARY_KEY = BaseRepository.PRIMARY_KEY
+
+    def __init__(self, session_factory, ttl: int, replica_session_factory=None, sticky_window: float = 0):
+        self.session_factory = session_factory
+        self.replica_session_factory = replica_session_factory
+        self.ttl = ttl
+        self.sticky_window_ms = int(sticky_window * 1000)
+        self._loads: dict[str, asyncio.Task] = {}
+
+    def _keys(self, user_id) -> list[str]:
+        return [self.PROFILE_KEY.format(user_id=user_id), self.VERSION_KEY.format(user_id=user_id)]
+
+    def _stick_to_primary(self, pipe, user_id) -> None:
+        if self.replica_session_factory is not None and self.sticky_window_ms:
+            pipe.set(self.PRIMARY_KEY.format(user_id=user_id), 1, px=self.sticky_window_ms)
+
+    async def get(self, redis: Redis, user_id: str) -> dict | None:
+        '''
+        Профиль пользователя (login, first_name, last_name, email, role_id) или None, если пользователя нет.
+        '''
+        profile, version, primary = await redis.mget([*self._keys(user_id), self.PRIMARY_KEY.format(user_id=user_id)])
+        if profile is not None:
+            PROFILE_CACHE_REQUESTS.labels('hit').inc()
+            return orjson.loads(profile)
+        load = self._loads.get(user_id)
+        if load is None:
+            PROFILE_CACHE_REQUESTS.labels('miss').inc()
+            load = asyncio.ensure_future(self._fill(redis, user_id, (version or b'0').decode(), primary is not None))
+            self._loads[user_id] = load
+            load.add_done_callback(lambda _: self._loads.pop(user_id, None))
+        else:
+            PROFILE_CACHE_REQUESTS.labels('coalesced').inc()
+        # Загрузка общая для всех ожидающих запросов и не отменяется, если клиент первого из них отключился.
+        return await asyncio.shield(load)
+
+    async def invalidate(self, redis: Redis, user_ids: Iterable) -> None:
+        '''
+        Сбрасывает профили пользователей, при массовых изменениях — порциями по INVALIDATE_BATCH.
+        '''
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), INVALIDATE_BATCH):
+            async with redis.pipeline(transaction=False) as pipe:
+                for user_id in user_ids[start:start + INVALIDATE_BATCH]:
+                    profile_key, version_key = self._keys(user_id)
+                    pipe.delete(profile_key)
+                    pipe.incr(version_key)
+                    pipe.expire(version_key, self.ttl)
+                    self._stick_to_primary(pipe, user_id)
+                await pipe.execute()
+
+    async def _fill(self, redis: Redis, user_id: str, version: str, primary: bool) -> dict | None:
+        session_factory = self.session_factory
+        if self.replica_session_factory is not None and not primary:
+            session_factory = self.replica_session_factory
+        async with session_factory() as session:
+            row = await BaseRepository(session=session).get_user_with_role(uuid.UUID(user_id), PROFILE_COLUMNS)
+        if row is None:
+            return None
+        # role_id — UUID или None (пользователь без роли), orjson сохраняет их как строку и null.
+        profile = row._asdict()
+        await FILL_PROFILE(
+            keys=self._keys(user_id), args=[version, orjson.dumps(profile), self.ttl], client=redis
+        )
+        return profile
+
+
+profile_cache = ProfileCache(
+    async_session, app_settings.profile_cache_ttl,
+    replica_session_factory=replica_session, sticky_window=app_settings.read_after_write_window
+)
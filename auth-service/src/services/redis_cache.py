@@ -1,5 +1,14 @@
+import json
+from time import time
+
 from redis.asyncio import Redis
 
+from services.revocation import revoked_tokens
+from services.sessions import (
+    ADD_SESSION, ROTATE_SESSION, LIST_SESSIONS, REVOKE_SESSIONS, REPLACE_SESSIONS, SESSION_KEY,
+    index_keys, session_id, session_info, session_key
+)
+
 
 class CacheRedis:
     def __init__(self, redis: Redis):
@@ -14,3 +23,120 @@ class CacheRedis:
 
     async def _delete_object_from_cache(self, obj: str):
         await self.redis.delete(obj)
+
+    async def _put_session(self, user_id: str, jti: str, record: bytes, user_agent: str | None, time_cache: int):
+        '''
+        Сохраняет сессию refresh token и добавляет её в индекс сессий пользователя.
+        '''
+        now = int(time())
+        await ADD_SESSION(
+            keys=[*index_keys(user_id), session_key(jti)],
+            args=[now, record, time_cache, session_id(jti), now + time_cache, session_info(user_agent, now)],
+            client=self.redis
+        )
+
+    async def _rotate_session(
+            self,
+            user_id: str,
+            old_jti: str,
+            old_token: str,
+            expected_record: bytes,
+            new_jti: str,
+            new_record: bytes,
+            user_agent: str | None,
+            time_cache: int
+    ) -> int:
+        '''
+        Заменяет сессию refresh token и её запись в индексе за один запрос к Redis.
+
+        :return: (int) 1 — успешно, 0 — сессии нет (истекла, отозвана или использована повторно),
+            -1 — запись сессии не совпала с запросом, сессия удалена.
+        '''
+        now = int(time())
+        return await ROTATE_SESSION(
+            keys=[*index_keys(user_id), session_key(old_jti), session_key(new_jti), old_token],
+            args=[
+                now, expected_record, new_record, time_cache, session_id(old_jti), session_id(new_jti),
+                now + time_cache, session_info(user_agent, now)
+            ],
+            client=self.redis
+        )
+
+    async def _delete_session(self, user_id: str, jti: str, token: str) -> None:
+        '''
+        Удаляет сессию и её запись в индексе; ключ, равный самому токену, — сессия, сохранённая
+        до перехода на короткие ключи.
+        '''
+        index_key, info_key = index_keys(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(session_key(jti), token)
+            pipe.zrem(index_key, session_id(jti))
+            pipe.hdel(info_key, session_id(jti))
+            await pipe.execute()
+
+    async def _list_sessions(self, user_id: str) -> list[tuple[str, int, dict]]:
+        '''
+        Действующие сессии пользователя, истёкшие по пути удаляются из индекса.
+
+        :return: (list) Кортежи (id сессии, время истечения, описание сессии).
+        '''
+        flat = await LIST_SESSIONS(keys=index_keys(user_id), args=[int(time())], client=self.redis)
+        return [
+            (flat[i].decode(), int(float(flat[i + 1])), json.loads(flat[i + 2]))
+            for i in range(0, len(flat), 3)
+        ]
+
+    async def _revoke_sessions(self, user_id: str, session_ids: list[str] | None = None) -> int:
+        '''
+        Отзывает сессии пользователя одним скриптом. Ключи сессий передаются в KEYS, поэтому для отзыва
+        всех сессий их id сначала читаются из индекса.
+
+        :param session_ids: (list[str]) id отзываемых сессий, по умолчанию — все сессии пользователя.
+        :return: (int) Число отозванных сессий.
+        '''
+        keys = index_keys(user_id)
+        if session_ids is None:
+            session_ids = [value.decode() for value in await self.redis.zrange(keys[0], 0, -1)]
+        if not session_ids:
+            return 0
+        return await REVOKE_SESSIONS(
+            keys=[*keys, *(SESSION_KEY.format(session_id=value) for value in session_ids)],
+            args=[int(time()), *session_ids],
+            client=self.redis
+        )
+
+    async def _replace_sessions(
+            self,
+            user_id: str,
+            jti: str,
+            record: bytes,
+            user_agent: str | None,
+            time_cache: int,
+            old_token: str | None = None
+    ) -> int:
+        '''
+        Отзывает все сессии пользователя и сохраняет новую сессию одним скриптом. Id сессий сначала
+        читаются из индекса, чтобы передать их ключи в KEYS.
+
+        :param old_token: (str | None) Refresh token текущей сессии: удаляется и её ключ, равный
+            самому токену, — сессия, сохранённая до перехода на короткие ключи.
+        :return: (int) Число отозванных сессий.
+        '''
+        keys = index_keys(user_id)
+        session_ids = [value.decode() for value in await self.redis.zrange(keys[0], 0, -1)]
+        now = int(time())
+        return await REPLACE_SESSIONS(
+            keys=[
+                *keys, session_key(jti), *(SESSION_KEY.format(session_id=value) for value in session_ids),
+                *([old_token] if old_token is not None else [])
+            ],
+            args=[now, record, time_cache, session_id(jti), now + time_cache, session_info(user_agent, now),
+                  *session_ids],
+            client=self.redis
+        )
+
+    async def _revoke_access_token(self, jti: str, exp: int):
+        await revoked_tokens.revoke(self.redis, jti, exp)
+
+    async def _access_token_is_revoked(self, jti: str, exp: int, iat: int) -> bool:
+        return await revoked_tokens.is_revoked(self.redis, jti, exp, iat)
@@ -1,17 +1,73 @@
 import uuid
-from typing import Any
+from typing import Any, AsyncIterator, Sequence
+from redis.asyncio import Redis
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, Select, Result
+from sqlalchemy import select, update, or_, and_, Select, Result, Row
 
+from core.metrics import REPOSITORY_CALL_SECONDS, instrument_methods
 from db.postgres import Base
 from models.entity import Role, User
 
+# Колонки профиля пользователя и его роли для get_user_with_role.
+USER_PROFILE_COLUMNS = (
+    User.id, User.login, User.first_name, User.last_name, User.email, User.role_id, Role.lvl, Role.name_role
+)
+
+
+def violated_constraint(err: IntegrityError) -> str | None:
+    """
+    Имя нарушенного ограничения из ошибки asyncpg, обёрнутой SQLAlchemy.
+    """
+    return getattr(err.orig.__cause__, 'constraint_name', None)
+
 
 class BaseRepository:
-    def __init__(self, session: AsyncSession, **kwargs):
+    # Признак недавней записи пользователя: пока ключ жив, его чтения идут в основную базу.
+    PRIMARY_KEY = 'user:primary:{user_id}'
+
+    # Клиент Redis для признака PRIMARY_KEY. Задаётся репозиториями, читающими с реплики (BaseHistory),
+    # и CacheRedis у BaseAuth; без него признак не ставится и не проверяется.
+    redis: Redis | None = None
+
+    def __init__(self, session: AsyncSession, replica_session: AsyncSession | None = None,
+                 sticky_window: float = 0, **kwargs):
         self.session = session
+        self.replica_session = replica_session
+        self.sticky_window_ms = int(sticky_window * 1000)
         super().__init__(**kwargs)
 
+    async def read_session(self, user_id: uuid.UUID | None = None) -> AsyncSession:
+        """
+        Сессия для запросов только на чтение: реплика, если она настроена. Если в основной сессии
+        уже открыта транзакция или через репозиторий что-то записано, чтения остаются в основной базе,
+        чтобы запрос видел свои же изменения. Записи из прошлых запросов учитываются через признак
+        PRIMARY_KEY: после stick_to_primary чтения пользователя user_id sticky_window секунд идут в основную базу.
+
+        :param user_id: (UUID | None) Пользователь, чьи недавние записи должен видеть запрос.
+        :return:
+        AsyncSession: Сессия реплики или основной базы.
+        """
+        if self.replica_session is None or self.session.in_transaction() or self.session.info.get('wrote'):
+            return self.session
+        if user_id is not None and self._sticky_enabled():
+            if await self.redis.exists(self.PRIMARY_KEY.format(user_id=user_id)):
+                return self.session
+        return self.replica_session
+
+    async def stick_to_primary(self, user_id: uuid.UUID) -> None:
+        """
+        Закрепляет чтения пользователя за основной базой на sticky_window секунд после записи,
+        чтобы следующие запросы не прочитали с реплики ещё не доехавшие изменения.
+
+        :param user_id: (UUID) Пользователь, чьи данные изменены.
+        """
+        if self._sticky_enabled():
+            await self.redis.set(self.PRIMARY_KEY.format(user_id=user_id), 1, px=self.sticky_window_ms)
+
+    def _sticky_enabled(self) -> bool:
+        return self.replica_session is not None and self.redis is not None and self.sticky_window_ms > 0
+
     async def _get_obj(self, query: Select) -> Base | None:
         """
         Выполняет запрос к базе данных и возвращает результат.
@@ -24,10 +80,17 @@ class BaseRepository:
         obj = obj.scalar()
         return obj
 
-    async def _get_list_obj(self, query: Select) -> Result[Any]:
-        list_obj = await self.session.execute(query)
+    async def _get_list_obj(self, query: Select, session: AsyncSession | None = None) -> Result[Any]:
+        list_obj = await (session or self.session).execute(query)
         return list_obj.iterator
 
+    async def _get_list_scalars(self, query: Select, session: AsyncSession | None = None) -> list[Base]:
+        list_obj = await (session or self.session).execute(query)
+        return list(list_obj.scalars())
+
+    def _mark_written(self) -> None:
+        self.session.info['wrote'] = True
+
     @classmethod
     async def _create_data_filter(cls, data_filter: dict) -> tuple:
         """
@@ -60,6 +123,27 @@ class BaseRepository:
         obj = await self.session.get(model, pk)
         return obj
 
+    async def get_user_with_role(
+            self, user_id: uuid.UUID | str, columns: Sequence = USER_PROFILE_COLUMNS
+    ) -> Row | None:
+        """
+        Загружает пользователя вместе с его ролью одним запросом с JOIN, без объектов ORM
+        и ленивой загрузки связи role.
+
+        :param user_id: (UUID | str) id пользователя.
+        :param columns: (Sequence) Колонки users и roles, которые нужно выбрать.
+        :return:
+        Row | None: Строка с выбранными колонками или None, если пользователь не найден.
+        """
+        query = (
+            select(*columns)
+            .select_from(User)
+            .join(Role, User.role_id == Role.id, isouter=True)
+            .where(User.id == user_id)
+        )
+        result = await self.session.execute(query)
+        return result.first()
+
     async def get_obj_by_attr_name(self, model: Base, attr_name: str, attr_value: str | int) -> Base | None:
         """
         Получает объект из базы данных, используя фильтр по имени атрибута и его значению.
@@ -75,21 +159,84 @@ class BaseRepository:
         return await self._get_obj(query)
 
     async def get_list_obj_by_attr_name(self, model: Base, attr_name: str, attr_value: str | int,
-                                        page_number: int, page_size: int) -> Base | None:
+                                        page_number: int, page_size: int, order_by: tuple = (),
+                                        filters: tuple = (), user_id: uuid.UUID | None = None) -> Base | None:
         """
         Получает объект из базы данных, используя фильтр по имени атрибута и его значению.
 
         :param model: (Base) Класс модели SQLAlchemy, из которого нужно получить объект.
         :param attr_name: (str) Имя атрибута, по которому будет производиться фильтрация.
         :param attr_value: (str | int) Значение атрибута, по которому будет производиться фильтрация.
+        :param order_by: (tuple) Выражения сортировки, без них порядок страниц не гарантирован.
+        :param filters: (tuple) Дополнительные условия WHERE.
+        :param user_id: (UUID | None) Пользователь, чьи недавние записи должен видеть запрос (см. read_session).
         :return:
         Base | None: Возвращает список объектов из базы данных, соответствующий указанному фильтру,
                     либо None, если объекты не были найдены.
         """
         start_number = (page_number - 1) * page_size
         start_number = start_number if start_number > 0 else 0
-        query = select(model).where(getattr(model, attr_name) == attr_value).offset(start_number).limit(page_size)
-        return await self._get_list_obj(query)
+        query = select(model).where(getattr(model, attr_name) == attr_value, *filters).order_by(*order_by)
+        query = query.offset(start_number).limit(page_size)
+        return await self._get_list_obj(query, await self.read_session(user_id))
+
+    async def get_list_obj_by_keyset(self, model: Base, attr_name: str, attr_value: str | int, order_attr: str,
+                                     after: tuple | None, page_size: int, filters: tuple = (),
+                                     user_id: uuid.UUID | None = None) -> list[Base]:
+        """
+        Получает страницу объектов по ключу (keyset pagination) без OFFSET. Запрос идёт через read_session.
+
+        Объекты сортируются по (order_attr DESC, id ASC), следующая страница начинается строго после
+        пары значений последнего объекта предыдущей страницы. Направления сортировки разные, поэтому
+        сравнение строк (order_attr, id) < (...) неприменимо; условие order_attr <= значения курсора
+        рядом с OR задаёт границу диапазона индекса (attr_name, order_attr DESC, id), и глубокие
+        страницы не перебирают все более новые строки.
+
+        :param model: (Base) Класс модели SQLAlchemy, из которого нужно получить объекты.
+        :param attr_name: (str) Имя атрибута, по которому будет производиться фильтрация.
+        :param attr_value: (str | int) Значение атрибута, по которому будет производиться фильтрация.
+        :param order_attr: (str) Имя атрибута сортировки.
+        :param after: (tuple | None) Пара (значение order_attr, id) последнего объекта предыдущей страницы.
+        :param page_size: (int) Количество объектов на странице.
+        :param filters: (tuple) Дополнительные условия WHERE.
+        :param user_id: (UUID | None) Пользователь, чьи недавние записи должен видеть запрос (см. read_session).
+        :return:
+        list[Base]: Список объектов страницы.
+        """
+        order_column = getattr(model, order_attr)
+        query = select(model).where(getattr(model, attr_name) == attr_value, *filters)
+        if after is not None:
+            last_value, last_id = after
+            query = query.where(
+                order_column <= last_value,
+                or_(order_column < last_value, and_(order_column == last_value, model.id > last_id))
+            )
+        query = query.order_by(order_column.desc(), model.id).limit(page_size)
+        return await self._get_list_scalars(query, await self.read_session(user_id))
+
+    async def stream_columns_by_attr_name(self, model: Base, columns: Sequence, attr_name: str, attr_value: str | int,
+                                          chunk_size: int, order_by: tuple = (), filters: tuple = (),
+                                          user_id: uuid.UUID | None = None) -> AsyncIterator[Sequence[Row]]:
+        """
+        Построчно читает выбранные колонки серверным курсором и отдаёт их порциями, без создания ORM-объектов.
+        Запрос идёт через read_session.
+
+        :param model: (Base) Класс модели SQLAlchemy, по которой идёт фильтрация.
+        :param columns: (Sequence) Колонки модели, которые нужно выбрать.
+        :param attr_name: (str) Имя атрибута, по которому будет производиться фильтрация.
+        :param attr_value: (str | int) Значение атрибута, по которому будет производиться фильтрация.
+        :param chunk_size: (int) Размер порции, которую курсор читает за один раз.
+        :param order_by: (tuple) Выражения сортировки.
+        :param filters: (tuple) Дополнительные условия WHERE.
+        :param user_id: (UUID | None) Пользователь, чьи недавние записи должен видеть запрос (см. read_session).
+        :return:
+        AsyncIterator[Sequence[Row]]: Асинхронный итератор порций строк.
+        """
+        query = select(*columns).where(getattr(model, attr_name) == attr_value, *filters).order_by(*order_by)
+        session = await self.read_session(user_id)
+        result = await session.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield rows
 
     async def get_list_obj_by_list_attr_name_operator_or(self, data_filter: list[dict]) -> Result[Any]:
         """
@@ -130,10 +277,43 @@ class BaseRepository:
             **data
         )
         self.session.add(new_db_obj)
+        self._mark_written()
         await self.session.commit()
 
+    async def update_objs(self, model: Base, values: dict, filters: Sequence = ()) -> int:
+        """
+        Обновляет все строки, подходящие под фильтры, одним запросом UPDATE. Транзакция не фиксируется.
+
+        :param model: (Base) Класс модели SQLAlchemy.
+        :param values: (dict) Новые значения колонок.
+        :param filters: (Sequence) Условия WHERE.
+        :return:
+        int: Количество обновлённых строк.
+        """
+        query = update(model).where(*filters).values(**values).execution_options(synchronize_session=False)
+        self._mark_written()
+        result = await self.session.execute(query)
+        return result.rowcount
+
+    async def update_objs_returning(self, model: Base, values: dict, filters: Sequence, column) -> list:
+        """
+        Как update_objs, но возвращает значения колонки обновлённых строк (UPDATE ... RETURNING).
+
+        :param column: Колонка модели, значения которой нужно вернуть, обычно первичный ключ.
+        :return:
+        list: Значения колонки обновлённых строк.
+        """
+        query = (
+            update(model).where(*filters).values(**values)
+            .returning(column).execution_options(synchronize_session=False)
+        )
+        self._mark_written()
+        result = await self.session.execute(query)
+        return list(result.scalars())
+
     async def delete_obj(self, model: Base, id: uuid.UUID) -> None:
         obj = await self.session.get(model, id)
+        self._mark_written()
         await self.session.delete(obj)
 
     async def test_join(self):
@@ -141,3 +321,6 @@ class BaseRepository:
         x = await self._get_list_obj(query)
         for i in x.iterator:
             print([type(j) for j in i])
+
+
+instrument_methods(BaseRepository, REPOSITORY_CALL_SECONDS)
@@ -0,0 +1,242 @@
+import asyncio
+import math
+from hashlib import blake2b
+from time import time
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError, RedisError
+
+from core.config import app_settings, RevocationMode
+from logger import logger
+
+
+class KeyRevocationStore:
+    '''
+    Хранилище отзывов "ключ на токен": каждый jti — отдельный ключ Redis с TTL до истечения токена.
+    '''
+
+    def add(self, pipe: Pipeline, jti: str, exp: int, now: int) -> None:
+        pipe.set(jti, jti, exp - now)
+
+    async def contains(self, redis: Redis, jti: str, exp: int) -> bool:
+        return bool(await redis.exists(jti))
+
+
+class BloomRevocationStore(KeyRevocationStore):
+    '''
+    Хранилище отзывов на фильтрах Блума перед ключами "ключ на токен".
+
+    Токены раскладываются по окнам длиной в срок жизни access-токена (по exp). На каждое окно
+    заводится битовая карта Redis (фильтр Блума), которая истекает целиком вместе с последним
+    токеном окна. Отрицательный ответ фильтра окончательный, и проверка действующего токена
+    не трогает ключи jti; только положительный ответ перепроверяется по ключу jti.
+    '''
+
+    BITS_KEY = 'revoked_tokens:bloom:{bucket}'
+
+    def __init__(self, window: int, capacity: int, false_positive_rate: float):
+        self.window = window
+        self.false_positive_rate = false_positive_rate
+        self.size = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+
+    def _bucket(self, exp: int) -> int:
+        return exp // self.window
+
+    def _positions(self, jti: str) -> list[int]:
+        digest = blake2b(jti.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, pipe: Pipeline, jti: str, exp: int, now: int) -> None:
+        bucket = self._bucket(exp)
+        bits_key = self.BITS_KEY.format(bucket=bucket)
+        for position in self._positions(jti):
+            pipe.setbit(bits_key, position, 1)
+        pipe.expireat(bits_key, (bucket + 1) * self.window)
+        super().add(pipe, jti, exp, now)
+
+    async def might_contain(self, redis: Redis, jti: str, exp: int) -> bool:
+        '''
+        Ответ одного фильтра Блума, без точной проверки: False окончателен, True может быть ложным.
+        '''
+        bits_key = self.BITS_KEY.format(bucket=self._bucket(exp))
+        async with redis.pipeline(transaction=False) as pipe:
+            for position in self._positions(jti):
+                pipe.getbit(bits_key, position)
+            bits = await pipe.execute()
+        return all(bits)
+
+    async def contains(self, redis: Redis, jti: str, exp: int) -> bool:
+        if not await self.might_contain(redis, jti, exp):
+            return False
+        return await super().contains(redis, jti, exp)
+
+
+class RevokedTokenCache:
+    '''
+    Локальный для воркера набор отозванных access-токенов (jti -> exp).
+
+    Набор синхронизируется через канал Redis pub/sub. Пока подписка не готова, проверка идёт
+    напрямую в хранилище Redis. Отзывы, сделанные до подписки, воркер не получал, поэтому по умолчанию
+    локальному набору доверяют только для токенов, выпущенных после подписки (iat), а более старые
+    токены (не дольше срока жизни access-токена после (пере)подключения) проверяются в хранилище.
+    С snapshot=True каждый отзыв ещё и записывается в sorted set INDEX_KEY, при подписке из него
+    загружается снимок, и локальному набору доверяют для всех токенов ценой записи в индексе на отзыв.
+
+    Если за health_check_interval секунд не пришло ни одного сообщения, в подписку отправляется PING;
+    если и на него нет ответа за следующий интервал, соединение считается потерянным и подписка
+    оформляется заново. Так «тихо» оборванное соединение не оставляет кеш навсегда устаревшим.
+    '''
+
+    CHANNEL = 'revoked_tokens'
+    INDEX_KEY = 'revoked_tokens:index'
+    PRUNE_INTERVAL = 60
+    # Допустимое расхождение часов воркеров: iat ставит выпустивший токен воркер.
+    CLOCK_SKEW = 5
+
+    def __init__(
+            self, store: KeyRevocationStore | BloomRevocationStore, reconnect_delay: float,
+            health_check_interval: float, snapshot: bool = False
+    ):
+        self.store = store
+        self.reconnect_delay = reconnect_delay
+        self.health_check_interval = health_check_interval
+        self.snapshot = snapshot
+        self._revoked: dict[str, int] = {}
+        self._ready = False
+        self._subscribed_at = 0.0
+        self._last_prune = time()
+        self._redis: Redis | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def start(self, redis: Redis) -> None:
+        self._redis = redis
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._ready = False
+
+    def contains(self, jti: str) -> bool:
+        exp = self._revoked.get(jti)
+        return exp is not None and exp > time()
+
+    async def is_revoked(self, redis: Redis, jti: str, exp: int, iat: int) -> bool:
+        '''
+        Проверяет, отозван ли access-токен: по локальному набору, если он полон для этого токена,
+        иначе в хранилище Redis.
+
+        :param redis: (Redis) Клиент Redis.
+        :param jti: (str) Идентификатор токена.
+        :param exp: (int) Время истечения токена (unix time).
+        :param iat: (int) Время выпуска токена (unix time).
+        '''
+        if self._ready and (self.snapshot or iat - self.CLOCK_SKEW >= self._subscribed_at):
+            return self.contains(jti)
+        return await self.store.contains(redis, jti, exp)
+
+    async def revoke(self, redis: Redis, jti: str, exp: int) -> None:
+        '''
+        Отзывает access-токен до момента его истечения.
+
+        За один round trip сохраняет отзыв в хранилище (и в индексе снимка, если он включён)
+        и публикует событие для остальных воркеров.
+
+        :param redis: (Redis) Клиент Redis.
+        :param jti: (str) Идентификатор токена.
+        :param exp: (int) Время истечения токена (unix time).
+        '''
+        now = int(time())
+        if exp <= now:
+            return
+        self._add(jti, exp)
+        async with redis.pipeline(transaction=False) as pipe:
+            self.store.add(pipe, jti, exp, now)
+            if self.snapshot:
+                pipe.zadd(self.INDEX_KEY, {jti: exp})
+                pipe.zremrangebyscore(self.INDEX_KEY, '-inf', now)
+            pipe.publish(self.CHANNEL, f'{jti}:{exp}')
+            await pipe.execute()
+
+    def _add(self, jti: str, exp: int) -> None:
+        self._revoked[jti] = exp
+        now = time()
+        if now - self._last_prune > self.PRUNE_INTERVAL:
+            self._revoked = {key: value for key, value in self._revoked.items() if value > now}
+            self._last_prune = now
+
+    async def _load_snapshot(self) -> None:
+        entries = await self._redis.zrangebyscore(self.INDEX_KEY, int(time()), '+inf', withscores=True)
+        for jti, exp in entries:
+            self._revoked[jti.decode()] = int(exp)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                self._subscribed_at = time()
+                if self.snapshot:
+                    await self._load_snapshot()
+                self._ready = True
+                await self._consume(pubsub)
+            except (RedisError, OSError) as error:
+                logger.warning('Revoked tokens subscription lost: %s', error)
+            finally:
+                self._ready = False
+                await pubsub.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _consume(self, pubsub) -> None:
+        awaiting_pong = False
+        while True:
+            message = await pubsub.get_message(timeout=self.health_check_interval)
+            if message is None:
+                if awaiting_pong:
+                    raise ConnectionError('no reply to PING on the revoked tokens subscription')
+                await pubsub.ping()
+                awaiting_pong = True
+                continue
+            awaiting_pong = False
+            if message['type'] == 'message':
+                self._handle(message['data'])
+
+    def _handle(self, data: bytes) -> None:
+        try:
+            jti, _, exp = data.decode().rpartition(':')
+            if not jti:
+                raise ValueError('empty jti')
+            self._add(jti, int(exp))
+        except ValueError as error:
+            logger.warning('Malformed revoked token message %r: %s', data, error)
+
+
+def create_revocation_store() -> KeyRevocationStore | BloomRevocationStore:
+    if app_settings.revocation_mode == RevocationMode.BLOOM:
+        return BloomRevocationStore(
+            window=app_settings.authjwt_time_access,
+            capacity=app_settings.revocation_bloom_capacity,
+            false_positive_rate=app_settings.revocation_bloom_fpr
+        )
+    return KeyRevocationStore()
+
+
+revoked_tokens = RevokedTokenCache(
+    store=create_revocation_store(),
+    reconnect_delay=app_settings.revocation_reconnect_delay,
+    health_check_interval=app_settings.revocation_health_check_interval,
+    snapshot=app_settings.revocation_snapshot
+)
@@ -0,0 +1,83 @@
+import time
+import uuid
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from redis.asyncio import Redis
+from sqlalchemy import select
+
+from core.config import app_settings
+from db.postgres import async_session, replica_session
+from models.entity import Role
+from services.versioned_cache import VersionedCache
+
+
+@dataclass(frozen=True)
+class CachedRole:
+    id: uuid.UUID
+    lvl: int
+    name_role: str
+    description: str | None
+    max_year: int
+
+
+@dataclass(frozen=True)
+class RoleSnapshot:
+    '''
+    Неизменяемый снимок таблицы roles.
+    '''
+    by_id: Mapping[uuid.UUID, CachedRole]
+    by_lvl: Mapping[int, CachedRole]
+
+    @property
+    def lowest(self) -> CachedRole | None:
+        '''
+        Роль с минимальным уровнем, она назначается при регистрации.
+        '''
+        return self.by_lvl[min(self.by_lvl)] if self.by_lvl else None
+
+
+class RoleCatalog(VersionedCache[RoleSnapshot]):
+    '''
+    Кэш ролей в памяти воркера. Версию увеличивают методы BaseAdmin, меняющие роли.
+    Если настроена реплика, роли читаются с неё.
+    '''
+
+    VERSION_KEY = 'roles:version'
+    PRIMARY_KEY = 'roles:primary'
+
+    async def get_by_id(self, redis: Redis, role_id: uuid.UUID) -> CachedRole | None:
+        '''
+        Ищет роль по id. Роль, созданная в другом воркере до очередной сверки версии,
+        может отсутствовать в снимке, поэтому при промахе версия сверяется сразу и каталог
+        перечитывается, если она изменилась. Безусловно (для ролей, созданных в обход BaseAdmin
+        без смены версии) каталог перечитывается не чаще раза в check_interval, так что поток
+        запросов с несуществующими id не превращается в поток чтений таблицы roles.
+        '''
+        role = (await self.get(redis)).by_id.get(role_id)
+        if role is None:
+            force = time.monotonic() - self._loaded_at >= self.check_interval
+            role = (await self.get(redis, force=force, recheck=True)).by_id.get(role_id)
+        return role
+
+    async def _load(self, session_factory) -> RoleSnapshot:
+        async with session_factory() as session:
+            result = await session.execute(select(Role))
+            roles = [
+                CachedRole(
+                    id=role.id, lvl=role.lvl, name_role=role.name_role,
+                    description=role.description, max_year=role.max_year
+                )
+                for role in result.scalars()
+            ]
+        return RoleSnapshot(
+            by_id=MappingProxyType({role.id: role for role in roles}),
+            by_lvl=MappingProxyType({role.lvl: role for role in roles}),
+        )
+
+
+role_catalog = RoleCatalog(
+    async_session, app_settings.role_catalog_check_interval,
+    replica_session_factory=replica_session, sticky_window=app_settings.read_after_write_window
+)
@@ -0,0 +1,191 @@
+import json
+import uuid
+from base64 import urlsafe_b64encode
+from hashlib import blake2b
+
+import jwt
+from redis.commands.core import AsyncScript
+
+# Сессия (refresh token) хранится под коротким ключом из хэша jti, значение — 32 байта:
+# id пользователя (16), хэш User-Agent (8) и хэш подписи access token, выданного вместе с refresh (8).
+SESSION_KEY = 'rt:{session_id}'
+KEY_DIGEST_SIZE = 12
+FIELD_DIGEST_SIZE = 8
+RECORD_SIZE = 16 + 2 * FIELD_DIGEST_SIZE
+
+# Индекс сессий пользователя: sorted set id сессий со временем истечения в качестве score и hash
+# с описаниями сессий (User-Agent, время входа). Истёкшие сессии удаляются из индекса при каждом
+# его изменении и чтении, а сами ключи индекса истекают вместе с последней сессией.
+SESSION_INDEX_KEY = 'user:sessions:{user_id}'
+SESSION_INFO_KEY = 'user:sessions:info:{user_id}'
+# Сколько истёкших сессий удаляется из индекса за один вызов.
+PRUNE_BATCH = 100
+
+# Общие функции скриптов индекса: KEYS[1] — sorted set, KEYS[2] — описания, ARGV[1] — текущее время.
+_INDEX_FUNCTIONS = b'''
+local function prune()
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, %d)
+    for _, session_id in ipairs(expired) do
+        redis.call('ZREM', KEYS[1], session_id)
+        redis.call('HDEL', KEYS[2], session_id)
+    end
+end
+
+local function add(session_id, expires_at, info)
+    redis.call('ZADD', KEYS[1], expires_at, session_id)
+    redis.call('HSET', KEYS[2], session_id, info)
+    local last = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+    redis.call('EXPIREAT', KEYS[1], last[2])
+    redis.call('EXPIREAT', KEYS[2], last[2])
+end
+
+local function remove(session_id)
+    redis.call('ZREM', KEYS[1], session_id)
+    redis.call('HDEL', KEYS[2], session_id)
+end
+''' % PRUNE_BATCH
+
+# Новая сессия. KEYS[3] — ключ сессии. ARGV: 2 — запись, 3 — срок жизни, 4 — id сессии,
+# 5 — время истечения, 6 — описание.
+ADD_SESSION = AsyncScript(None, _INDEX_FUNCTIONS + b'''
+prune()
+redis.call('SET', KEYS[3], ARGV[2], 'EX', ARGV[3])
+add(ARGV[4], ARGV[5], ARGV[6])
+''')
+
+# Обмен refresh token за один атомарный запрос: старая сессия удаляется, новая записывается,
+# только если старая существовала и её запись совпала с ожидаемой (тот же пользователь, User-Agent
+# и access token). Описание (время входа) переходит к новой сессии. Сессии, сохранённые до перехода
+# на короткие ключи, лежат под ключом, равным самому refresh token (KEYS[5]); они принимаются без
+# сверки записи и исчезнут сами через срок жизни refresh token, после чего эту ветку можно удалить.
+# KEYS: 3 — старая сессия, 4 — новая сессия, 5 — старый ключ-токен. ARGV: 2 — ожидаемая запись,
+# 3 — новая запись, 4 — срок жизни, 5 — id старой сессии, 6 — id новой сессии, 7 — время истечения,
+# 8 — описание на случай, если у старой сессии его нет.
+# Результат: 1 — сессия обменяна, 0 — сессии нет (истекла, отозвана или уже использована),
+# -1 — запись не совпала, сессия удалена.
+ROTATE_SESSION = AsyncScript(None, _INDEX_FUNCTIONS + b'''
+local info = redis.call('HGET', KEYS[2], ARGV[5]) or ARGV[8]
+remove(ARGV[5])
+prune()
+local record = redis.call('GET', KEYS[3])
+if record then
+    redis.call('DEL', KEYS[3])
+    if record ~= ARGV[2] then
+        return -1
+    end
+elseif redis.call('DEL', KEYS[5]) == 0 then
+    return 0
+end
+redis.call('SET', KEYS[4], ARGV[3], 'EX', ARGV[4])
+add(ARGV[6], ARGV[7], info)
+return 1
+''')
+
+# Действующие сессии пользователя плоским списком: id, время истечения, описание.
+LIST_SESSIONS = AsyncScript(None, _INDEX_FUNCTIONS + b'''
+prune()
+local result = {}
+local sessions = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+for i = 1, #sessions, 2 do
+    result[#result + 1] = sessions[i]
+    result[#result + 1] = sessions[i + 1]
+    result[#result + 1] = redis.call('HGET', KEYS[2], sessions[i]) or '{}'
+end
+return result
+''')
+
+# Отзыв сессий по id (ARGV[2:]); KEYS[3:] — ключи этих сессий в том же порядке. Удаляются только
+# сессии из индекса этого пользователя. Результат — число отозванных сессий.
+REVOKE_SESSIONS = AsyncScript(None, _INDEX_FUNCTIONS + b'''
+local revoked = 0
+for i = 2, #ARGV do
+    if redis.call('ZSCORE', KEYS[1], ARGV[i]) then
+        redis.call('DEL', KEYS[i + 1])
+        remove(ARGV[i])
+        revoked = revoked + 1
+    end
+end
+return revoked
+''')
+
+
+# «Выход из остальных устройств» одним запросом: отзыв сессий по id (ARGV[7:], их ключи — KEYS[4:] в том же
+# порядке) и запись новой сессии текущего устройства. Удаляются только сессии из индекса этого пользователя;
+# ключи после ключей отзываемых сессий (старый ключ-токен текущей сессии) удаляются без проверки.
+# KEYS[3] — ключ новой сессии. ARGV: 2 — запись, 3 — срок жизни, 4 — id новой сессии, 5 — время истечения,
+# 6 — описание. Результат — число отозванных сессий.
+REPLACE_SESSIONS = AsyncScript(None, _INDEX_FUNCTIONS + b'''
+local revoked = 0
+for i = 7, #ARGV do
+    if redis.call('ZSCORE', KEYS[1], ARGV[i]) then
+        redis.call('DEL', KEYS[i - 3])
+        remove(ARGV[i])
+        revoked = revoked + 1
+    end
+end
+for i = #ARGV - 2, #KEYS do
+    redis.call('DEL', KEYS[i])
+end
+prune()
+redis.call('SET', KEYS[3], ARGV[2], 'EX', ARGV[3])
+add(ARGV[4], ARGV[5], ARGV[6])
+return revoked
+''')
+
+
+def _digest(value: str, size: int) -> bytes:
+    return blake2b(value.encode(), digest_size=size).digest()
+
+
+def session_id(jti: str) -> str:
+    '''
+    id сессии по jti refresh token, он же показывается пользователю в списке сессий.
+    '''
+    return urlsafe_b64encode(_digest(jti, KEY_DIGEST_SIZE)).decode()
+
+
+def session_key(jti: str) -> str:
+    '''
+    Ключ сессии в Redis по jti refresh token.
+    '''
+    return SESSION_KEY.format(session_id=session_id(jti))
+
+
+def index_keys(user_id: str) -> list[str]:
+    '''
+    Ключи индекса сессий пользователя: sorted set и hash с описаниями.
+    '''
+    return [SESSION_INDEX_KEY.format(user_id=user_id), SESSION_INFO_KEY.format(user_id=user_id)]
+
+
+def session_info(user_agent: str | None, created_at: int) -> str:
+    '''
+    Описание сессии для списка сессий пользователя.
+
+    :param user_agent: (str) Заголовок User-Agent, с которым выполнен вход.
+    :param created_at: (int) Время входа, unix timestamp.
+    '''
+    return json.dumps({'user_agent': user_agent, 'created_at': created_at})
+
+
+def session_record(user_id: str, user_agent: str | None, access_token: str) -> bytes:
+    '''
+    Упакованная запись сессии.
+
+    :param user_id: (str) id пользователя.
+    :param user_agent: (str) Заголовок User-Agent, с которым выдан токен.
+    :param access_token: (str) Access token (или только его подпись), выданный вместе с refresh token.
+    '''
+    signature = access_token.split('.')[-1]
+    return (
+        uuid.UUID(user_id).bytes
+        + _digest(user_agent or '', FIELD_DIGEST_SIZE)
+        + _digest(signature, FIELD_DIGEST_SIZE)
+    )
+
+
+def token_jti(token: str) -> str:
+    '''
+    jti только что выпущенного токена. Подпись не проверяется: токен создан этим же процессом.
+    '''
+    return jwt.decode(token, options={'verify_signature': False})['jti']
@@ -0,0 +1,63 @@
+import hashlib
+import json
+from base64 import urlsafe_b64encode
+from functools import lru_cache
+
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from jwt.algorithms import get_default_algorithms
+
+from core.config import app_settings
+
+SYMMETRIC_ALGORITHMS = {'HS256', 'HS384', 'HS512'}
+
+# Обязательные поля JWK для отпечатка ключа по RFC 7638.
+THUMBPRINT_MEMBERS = {
+    'RSA': ('e', 'kty', 'n'),
+    'EC': ('crv', 'kty', 'x', 'y'),
+    'OKP': ('crv', 'kty', 'x'),
+}
+
+
+def is_asymmetric(algorithm: str) -> bool:
+    return algorithm not in SYMMETRIC_ALGORITHMS
+
+
+def jwk_thumbprint(jwk: dict) -> str:
+    '''
+    Отпечаток открытого ключа (RFC 7638), используется как kid.
+    '''
+    members = {name: jwk[name] for name in THUMBPRINT_MEMBERS[jwk['kty']]}
+    digest = hashlib.sha256(json.dumps(members, separators=(',', ':'), sort_keys=True).encode()).digest()
+    return urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def public_jwk(public_key_pem: str, algorithm: str) -> dict:
+    '''
+    Переводит открытый ключ PEM в JWK с полями kid, alg и use.
+
+    :param public_key_pem: (str) Открытый ключ в формате PEM.
+    :param algorithm: (str) Алгоритм подписи (RS256, ES256, EdDSA и т.п.).
+    '''
+    key = load_pem_public_key(public_key_pem.encode())
+    jwk = get_default_algorithms()[algorithm].to_jwk(key, as_dict=True)
+    jwk.update(kid=jwk_thumbprint(jwk), alg=algorithm, use='sig')
+    return jwk
+
+
+@lru_cache
+def current_jwk() -> dict | None:
+    '''
+    JWK ключа, которым подписываются токены, или None для симметричного алгоритма:
+    секрет HMAC публиковать нельзя, такие токены проверяет только сервис авторизации.
+    '''
+    if not is_asymmetric(app_settings.authjwt_algorithm):
+        return None
+    return public_jwk(app_settings.authjwt_public_key, app_settings.authjwt_algorithm)
+
+
+def token_headers() -> dict | None:
+    '''
+    Заголовки JWT: для асимметричного алгоритма — kid, по которому проверяющая сторона выбирает ключ.
+    '''
+    jwk = current_jwk()
+    return {'kid': jwk['kid']} if jwk is not None else None
@@ -0,0 +1,68 @@
+import time
+
+from redis.asyncio import Redis
+
+from core.config import app_settings
+
+
+class TokenGenerations:
+    '''
+    Номера поколений токенов пользователей.
+
+    Каждый токен несёт claim 'gen' с номером поколения на момент выпуска. «Выход из остальных
+    устройств» увеличивает номер в Redis, и все выпущенные ранее токены перестают приниматься.
+    Для проверки токена номер берётся из локального словаря и перечитывается из Redis не чаще
+    раза в cache_ttl секунд, поэтому другие воркеры отклоняют старые токены не позже чем через cache_ttl.
+    '''
+
+    KEY = 'user:gen:{user_id}'
+
+    def __init__(self, cache_ttl: float, cache_size: int):
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache: dict[str, tuple[int, float]] = {}
+
+    async def get(self, redis: Redis, user_id: str, fresh: bool = False) -> int:
+        '''
+        Возвращает текущее поколение токенов пользователя.
+
+        :param redis: (Redis) Клиент Redis.
+        :param user_id: (str) id пользователя.
+        :param fresh: (bool) Прочитать значение из Redis в обход локального кэша.
+            Используется при выпуске новых токенов, чтобы не выдать токен устаревшего поколения.
+        '''
+        cached = self._cache.get(user_id)
+        if not fresh and cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        value = await redis.get(self.KEY.format(user_id=user_id))
+        generation = int(value) if value is not None else 0
+        self._remember(user_id, generation)
+        return generation
+
+    async def bump(self, redis: Redis, user_id: str) -> int:
+        '''
+        Увеличивает поколение токенов пользователя, отзывая все выпущенные ранее токены.
+
+        :return: (int) Новое поколение, его нужно записать в токены текущей сессии.
+        '''
+        generation = await redis.incr(self.KEY.format(user_id=user_id))
+        self._remember(user_id, generation)
+        return generation
+
+    def is_current(self, claims: dict, generation: int) -> bool:
+        '''
+        Токены без claim 'gen' выпущены до появления поколений и считаются поколением 0.
+        '''
+        return claims.get('gen', 0) >= generation
+
+    def _remember(self, user_id: str, generation: int) -> None:
+        self._cache.pop(user_id, None)
+        if len(self._cache) >= self.cache_size:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[user_id] = (generation, time.monotonic() + self.cache_ttl)
+
+
+token_generations = TokenGenerations(
+    cache_ttl=app_settings.token_generation_cache_ttl,
+    cache_size=app_settings.token_generation_cache_size,
+)
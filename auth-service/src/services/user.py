@@ -1,17 +1,30 @@
 from fastapi import Request
+import uuid
+from datetime import datetime
 from time import time
-from werkzeug.security import generate_password_hash
+from typing import AsyncIterator, Sequence
+from sqlalchemy import Row
+from sqlalchemy.exc import IntegrityError
 
-from schemas.entity import UserCreate, UserLogin, UserProfil, ChangeProfil, ChangePassword, FieldFilter
+from schemas.entity import UserCreate, UserLogin, UserProfil, ChangeProfil, ChangePassword, FieldFilter, SessionInfo
 from models.entity import User, Role, EventEnum
-from services.repository import BaseRepository
+from services.repository import BaseRepository, violated_constraint, USER_PROFILE_COLUMNS
 from services.auth_jwt import BaseAuthJWT
 from services.history import BaseHistory
 from services.redis_cache import CacheRedis
 from services.role import BaseRole
-from core.config import app_settings
+from services.role_catalog import role_catalog
+from services.password_hasher import password_hasher
+from services.profile_cache import profile_cache
+from services.token_generation import token_generations
+from services.sessions import session_id, session_record, token_jti
+from core.config import app_settings, FileFormat
+from core.metrics import AUTH_EVENTS
 from core.exceptions import *
 
+# Ограничения уникальности таблицы users (имена Postgres по умолчанию) и поля, которые они защищают.
+UNIQUE_USER_FIELDS = {'users_login_key': Name.LOGIN, 'users_email_key': Name.EMAIL}
+
 
 class BaseAuth(BaseRepository, BaseAuthJWT, CacheRedis):
 
@@ -23,44 +36,42 @@ class BaseAuth(BaseRepository, BaseAuthJWT, CacheRedis):
         """
         Регистрирует нового пользователя.
 
+        Дубликаты логина и почты не ищутся заранее: роль берётся из кэша, и пользователь создаётся
+        одним INSERT, а нарушение ограничений уникальности переводится в AlreadyExistsException.
+
         :param data: (UserCreate) Данные, необходимые для создания нового пользователя.
         :return:
         None: Возвращает None, если регистрация прошла успешно.
         В противном случае выбрасывается исключение.
         """
-        data_filter = [
-            {
-                'model': User,
-                'fields': [
-                    FieldFilter(attr_name='login', attr_value=data.login),
-                    FieldFilter(attr_name='email', attr_value=data.email)
-                ]
-            },
-        ]
-        users = await self.get_list_obj_by_list_attr_name_operator_or(data_filter)
-        for user in users:
-            if user.login == data.login:
-                raise AlreadyExistsException(name=Name.LOGIN)
-            if user.email == data.email:
-                raise AlreadyExistsException(name=Name.EMAIL)
-
-        role = await self.get_first_obj_order_by_attr_name(Role, 'lvl')
+        role = (await role_catalog.get(self.redis)).lowest
+        if role is None:
+            role = (await role_catalog.get(self.redis, force=True)).lowest
         if role is None:
             role_manager = BaseRole(self.session)
             await role_manager.create_default_role()
-            role = await self.get_first_obj_order_by_attr_name(Role, 'lvl')
-
-        await self.create_obj(
-            model=User,
-            data={
-                'login': data.login,
-                'password': data.password,
-                'last_name': data.last_name,
-                'first_name': data.first_name,
-                'email': data.email,
-                'role': role
-            }
-        )
+            await role_catalog.invalidate(self.redis)
+            role = (await role_catalog.get(self.redis, force=True)).lowest
+
+        password_hash = await password_hasher.hash(data.password)
+        try:
+            await self.create_obj(
+                model=User,
+                data={
+                    'login': data.login,
+                    'password_hash': password_hash,
+                    'last_name': data.last_name,
+                    'first_name': data.first_name,
+                    'email': data.email,
+                    'role_id': role.id
+                }
+            )
+        except IntegrityError as err:
+            await self.session.rollback()
+            name = UNIQUE_USER_FIELDS.get(violated_constraint(err))
+            if name is None:
+                raise
+            raise AlreadyExistsException(name=name)
 
     async def log_in(self, data: UserLogin, user_agent: str) -> None:
         """
@@ -74,14 +85,24 @@ class BaseAuth(BaseRepository, BaseAuthJWT, CacheRedis):
         """
         user = await self.get_obj_by_attr_name(User, 'login', data.login)
         if user is None:
+            AUTH_EVENTS.labels('login', 'unknown_user').inc()
             raise DoesNotExistException(name=Name.USER)
-        elif not user.check_password(data.password):
+        elif not await password_hasher.verify(user.password, data.password):
+            AUTH_EVENTS.labels('login', 'invalid_password').inc()
             raise InvalidPasswordException()
-        _, refresh_token = await self.create_tokens(sub=str(user.id), user_claims={
+        access_token, refresh_token = await self.create_tokens(sub=str(user.id), user_claims={
             'user_agent': user_agent,
-            'is_admin': user.is_admin
+            'is_admin': user.is_admin,
+            'gen': await token_generations.get(self.redis, str(user.id), fresh=True)
             })
-        await self._put_object_to_cache(obj=refresh_token, time_cache=app_settings.authjwt_time_refresh)
+        await self._put_session(
+            user_id=str(user.id),
+            jti=token_jti(refresh_token),
+            record=session_record(str(user.id), user_agent, access_token),
+            user_agent=user_agent,
+            time_cache=app_settings.authjwt_time_refresh
+        )
+        AUTH_EVENTS.labels('login', 'success').inc()
         result = True
         await self.manager_history.write_entry_history(
             user_id=user.id,
@@ -101,11 +122,19 @@ class BaseAuth(BaseRepository, BaseAuthJWT, CacheRedis):
         В противном случае выбрасывается исключение.
         """
         user_data = await self.check_access_token()
-        if await self._object_from_cache(obj=user_data.get('jti')):
+        if await self._access_token_is_revoked(
+                jti=user_data.get('jti'), exp=user_data.get('exp', int(time())), iat=user_data.get('iat', 0)
+        ):
+            AUTH_EVENTS.labels('revoked_token', 'access').inc()
+            raise InvalidTokenException(token=Token.ACCESS)
+        elif not token_generations.is_current(
+                user_data, await token_generations.get(self.redis, user_data.get('sub'))
+        ):
+            AUTH_EVENTS.labels('revoked_token', 'generation').inc()
             raise InvalidTokenException(token=Token.ACCESS)
         elif user_agent != user_data.get('user_agent'):
-            time_cache = user_data.get('exp', int(time())) - int(time())
-            await self._put_object_to_cache(obj=user_data.get('jti'), time_cache=time_cache)
+            AUTH_EVENTS.labels('unsafe_entry', 'access_user_agent').inc()
+            await self._revoke_access_token(jti=user_data.get('jti'), exp=user_data.get('exp', int(time())))
             raise UnsafeEntryException()
         else:
             return user_data
@@ -121,23 +150,46 @@ class BaseAuth(BaseRepository, BaseAuthJWT, CacheRedis):
         В противном случае выбрасывается исключение.
         """
         refresh_token = request.cookies.get(app_settings.authjwt_refresh_cookie_key)
-        if not await self._object_from_cache(obj=refresh_token):
-            raise InvalidTokenException(token=Token.REFRESH)
-
-        await self._delete_object_from_cache(obj=refresh_token)
-        uuid_access = request.cookies.get(app_settings.authjwt_access_cookie_key).split('.')[-1]
+        access_cookie = request.cookies.get(app_settings.authjwt_access_cookie_key)
+        uuid_access = access_cookie.split('.')[-1]
         data = await self.check_refresh_token()
         if data.get('user_agent', '') != user_agent:
+            AUTH_EVENTS.labels('unsafe_entry', 'refresh_user_agent').inc()
+            await self._delete_session(data.get('sub'), data.get('jti'), refresh_token)
             raise UnsafeEntryException()
         elif data.get('uuid_access', '') != uuid_access:
+            AUTH_EVENTS.labels('refresh', 'token_mismatch').inc()
+            await self._delete_session(data.get('sub'), data.get('jti'), refresh_token)
             raise InvalidTokenException(token=Token.BOTH)
-        _, refresh_token = await self.create_tokens(
+        generation = await token_generations.get(self.redis, data.get('sub'), fresh=True)
+        if not token_generations.is_current(data, generation):
+            AUTH_EVENTS.labels('revoked_token', 'generation').inc()
+            raise InvalidTokenException(token=Token.REFRESH)
+        access_token, new_refresh_token = await self.issue_tokens(
             sub=data.get('sub'),
             user_claims={
                 'user_agent': user_agent,
-                'is_admin': data.get('is_admin')
+                'is_admin': data.get('is_admin'),
+                'gen': generation
                 })
-        await self._put_object_to_cache(refresh_token, app_settings.authjwt_time_refresh)
+        rotated = await self._rotate_session(
+            user_id=data.get('sub'),
+            old_jti=data.get('jti'),
+            old_token=refresh_token,
+            expected_record=session_record(data.get('sub'), user_agent, access_cookie),
+            new_jti=token_jti(new_refresh_token),
+            new_record=session_record(data.get('sub'), user_agent, access_token),
+            user_agent=user_agent,
+            time_cache=app_settings.authjwt_time_refresh
+        )
+        if rotated == 0:
+            AUTH_EVENTS.labels('revoked_token', 'refresh').inc()
+            raise InvalidTokenException(token=Token.REFRESH)
+        elif rotated < 0:
+            AUTH_EVENTS.labels('unsafe_entry', 'refresh_session').inc()
+            raise UnsafeEntryException()
+        AUTH_EVENTS.labels('refresh', 'success').inc()
+        await self.set_token_cookies(access_token, new_refresh_token)
         result = True
         await self.manager_history.write_entry_history(
             user_id=data.get('sub'),
@@ -157,11 +209,12 @@ class BaseAuth(BaseRepository, BaseAuthJWT, CacheRedis):
         В противном случае выбрасывается исключение.
         """
         user_data = await self.check_access_token()
-        time_cache = user_data.get('exp', int(time())) - int(time())
-        await self._put_object_to_cache(obj=user_data.get('jti'), time_cache=time_cache)
+        await self._revoke_access_token(jti=user_data.get('jti'), exp=user_data.get('exp', int(time())))
 
         refresh_token = request.cookies.get(app_settings.authjwt_refresh_cookie_key)
-        await self._delete_object_from_cache(obj=refresh_token)
+        refresh_jti = await self.refresh_token_jti(refresh_token)
+        if refresh_jti is not None:
+            await self._delete_session(user_data.get('sub'), refresh_jti, refresh_token)
 
         await self.jwt_logout()
 
@@ -172,6 +225,94 @@ class BaseAuth(BaseRepository, BaseAuthJWT, CacheRedis):
             result=True
         )
 
+    async def logout_others(self, request: Request, user_agent: str) -> None:
+        """
+        Осуществляет выход из всех остальных устройств пользователя.
+
+        Поколение токенов пользователя увеличивается, поэтому все ранее выпущенные access и refresh
+        токены перестают приниматься, а текущей сессии выдаются новые токены.
+
+        :param request: (Request) Объект запроса, содержащий cookies с refresh token.
+        :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+        :return:
+        None: Метод не возвращает значения. В противном случае выбрасывается исключение.
+        """
+        user_data = await self.get_info_from_access_token(user_agent)
+        generation = await token_generations.bump(self.redis, user_data.get('sub'))
+
+        old_refresh_token = request.cookies.get(app_settings.authjwt_refresh_cookie_key)
+        refresh_jti = await self.refresh_token_jti(old_refresh_token)
+        access_token, refresh_token = await self.create_tokens(
+            sub=user_data.get('sub'),
+            user_claims={
+                'user_agent': user_agent,
+                'is_admin': user_data.get('is_admin'),
+                'gen': generation
+                })
+        # Токены других устройств уже отклоняются по поколению, их сессии удаляются, чтобы не занимать память;
+        # удаление и запись новой сессии текущего устройства выполняются одним скриптом.
+        await self._replace_sessions(
+            user_id=user_data.get('sub'),
+            jti=token_jti(refresh_token),
+            record=session_record(user_data.get('sub'), user_agent, access_token),
+            user_agent=user_agent,
+            time_cache=app_settings.authjwt_time_refresh,
+            old_token=old_refresh_token if refresh_jti is not None else None
+        )
+
+    async def get_sessions(self, request: Request, user_agent: str) -> list[SessionInfo]:
+        """
+        Возвращает действующие сессии (устройства) пользователя.
+
+        :param request: (Request) Объект запроса, по refresh token из cookies отмечается текущая сессия.
+        :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+        :return:
+        list[SessionInfo]: Сессии, отсортированные по времени истечения. В противном случае выбрасывается исключение.
+        """
+        user_data = await self.get_info_from_access_token(user_agent)
+        refresh_jti = await self.refresh_token_jti(request.cookies.get(app_settings.authjwt_refresh_cookie_key))
+        current = session_id(refresh_jti) if refresh_jti is not None else None
+        return [
+            SessionInfo(
+                id=id_,
+                user_agent=info.get('user_agent'),
+                created_at=datetime.utcfromtimestamp(info['created_at']) if 'created_at' in info else None,
+                expires_at=datetime.utcfromtimestamp(expires_at),
+                current=id_ == current
+            )
+            for id_, expires_at, info in await self._list_sessions(user_data.get('sub'))
+        ]
+
+    async def revoke_session(self, user_agent: str, revoked_id: str) -> None:
+        """
+        Отзывает одну сессию пользователя: её refresh token больше не принимается.
+
+        :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+        :param revoked_id: (str) id сессии из списка сессий.
+        :return:
+        None: Если сессия отозвана. В противном случае выбрасывается исключение.
+        """
+        user_data = await self.get_info_from_access_token(user_agent)
+        if not await self._revoke_sessions(user_data.get('sub'), [revoked_id]):
+            raise DoesNotExistException(name=Name.SESSION)
+
+    async def logout_all(self, user_agent: str) -> int:
+        """
+        Осуществляет выход со всех устройств пользователя, включая текущее.
+
+        Все сессии удаляются одним запросом к Redis, поколение токенов увеличивается,
+        поэтому выданные ранее access token тоже перестают приниматься.
+
+        :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+        :return:
+        int: Число отозванных сессий. В противном случае выбрасывается исключение.
+        """
+        user_data = await self.get_info_from_access_token(user_agent)
+        await token_generations.bump(self.redis, user_data.get('sub'))
+        revoked = await self._revoke_sessions(user_data.get('sub'))
+        await self.auth.unset_jwt_cookies()
+        return revoked
+
 
 class UserManage:
     '''
@@ -190,12 +331,34 @@ class UserManage:
         :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
         '''
 
-        user_obj: User = await self.get_user_obj(user_agent)
-        if not isinstance(user_obj, User):
-            return user_obj
-        result = await self.manager_history.get_history(user_obj.id, page_number, page_size)
+        user_data = await self.manager_auth.get_info_from_access_token(user_agent)
+        result = await self.manager_history.get_history(user_data.get('sub'), page_number, page_size)
         return result
 
+    async def get_history_page(self, user_agent: str, cursor: str | None, page_size: int):
+        '''
+        Метод для получения истории постранично по курсору
+
+        :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+        :param cursor: (str | None) Курсор следующей страницы из предыдущего ответа.
+        '''
+
+        user_data = await self.manager_auth.get_info_from_access_token(user_agent)
+        result = await self.manager_history.get_history_page(user_data.get('sub'), cursor, page_size)
+        return result
+
+    async def export_history(self, user_agent: str, file_format: FileFormat) -> AsyncIterator[str]:
+        '''
+        Метод для выгрузки всей истории пользователя файлом. Токен проверяется до начала отдачи ответа.
+
+        :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
+        :param file_format: (FileFormat) Формат выгрузки.
+        :return: (AsyncIterator[str]) Генератор порций файла.
+        '''
+
+        user_data = await self.manager_auth.get_info_from_access_token(user_agent)
+        return self.manager_history.export_history(user_data.get('sub'), file_format)
+
     async def change_level(self, user_agent: str, level_up=True):
         '''
         Метод для изменения уровня подписки пользователя
@@ -203,17 +366,13 @@ class UserManage:
         :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
         :param level_up: (bool) Параметр для понижения уровня подписки при False или для повышения при True.
         '''
-        user_obj: User = await self.get_user_obj(user_agent)
-        if not isinstance(user_obj, User):
-            return user_obj
-        if level_up:
-            role_lvl_new = user_obj.role.lvl + 1
-        else:
-            role_lvl_new = user_obj.role.lvl - 1
-        role_obj_higher = await self.manager_auth.get_obj_by_attr_name(Role, 'lvl', role_lvl_new)
-        if role_obj_higher:
-            user_obj.role = role_obj_higher
+        user = await self.get_user_row(user_agent, columns=(User.id, Role.lvl))
+        role_lvl_new = user.lvl + 1 if level_up else user.lvl - 1
+        role_new = (await role_catalog.get(self.manager_auth.redis)).by_lvl.get(role_lvl_new)
+        if role_new:
+            await self.manager_auth.update_objs(User, {'role_id': role_new.id}, [User.id == user.id])
             await self.manager_auth.session.commit()
+            await profile_cache.invalidate(self.manager_auth.redis, [user.id])
         else:
             raise DoesNotExistException(name=Name.ROLE)
 
@@ -223,24 +382,22 @@ class UserManage:
         :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
         '''
 
-        user_obj: User = await self.get_user_obj(user_agent)
-        if not isinstance(user_obj, User):
-            return user_obj
-        if not user_obj.check_password(new_data.old_password):
+        user = await self.get_user_row(user_agent, columns=(User.id, User.password))
+        if not await password_hasher.verify(user.password, new_data.old_password):
             raise InvalidPasswordException()
-        user_obj.password = generate_password_hash(new_data.new_password)
+        password_hash = await password_hasher.hash(new_data.new_password)
+        await self.manager_auth.update_objs(User, {'password': password_hash}, [User.id == user.id])
         await self.manager_auth.session.commit()
 
     async def get_user_data(self, user_agent: str):
         '''
-        Метод для получения информации о пользователе.
+        Метод для получения информации о пользователе. Профиль читается из кэша, в базу
+        запрос уходит только при промахе.
         :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
         '''
 
-        user_obj: User = await self.get_user_obj(user_agent)
-        if not isinstance(user_obj, User):
-            return user_obj
-        user_profil = await self.get_user_profil(user_obj)
+        user = await self.get_cached_profile(user_agent)
+        user_profil = await self.get_user_profil(user)
         return user_profil
 
     async def change_profile_user(self, user_agent: str, new_data: ChangeProfil):
@@ -249,49 +406,74 @@ class UserManage:
         :param user_agent: (str) Заголовок User-Agent для идентификации клиентского приложения.
         '''
 
-        user_obj: User = await self.get_user_obj(user_agent)
-        if not isinstance(user_obj, User):
-            return user_obj
+        user_data = await self.manager_auth.get_info_from_access_token(user_agent)
+        user = await self.get_cached_profile(user_agent, user_data)
+        changes = dict()
         data_check = dict()
         if new_data.first_name:
-            user_obj.first_name = new_data.first_name
+            changes['first_name'] = new_data.first_name
         if new_data.last_name:
-            user_obj.last_name = new_data.last_name
+            changes['last_name'] = new_data.last_name
 
-        if new_data.email and new_data.login != user_obj.login:
+        if new_data.email and new_data.login != user['login']:
             data_check["email"] = new_data.email
-        if new_data.login and new_data.email != user_obj.email:
+        if new_data.login and new_data.email != user['email']:
             data_check["login"] = new_data.login
 
         await self.search_for_duplicates(data_check)
 
         if new_data.email:
-            user_obj.email = new_data.email
+            changes['email'] = new_data.email
         if new_data.login:
-            user_obj.login = new_data.login
+            changes['login'] = new_data.login
 
-        await self.manager_auth.session.commit()
+        if changes:
+            user = {**user, **changes}
+            await self.manager_auth.update_objs(User, changes, [User.id == uuid.UUID(user_data.get('sub'))])
+            await self.manager_auth.session.commit()
+            await profile_cache.invalidate(self.manager_auth.redis, [user_data.get('sub')])
 
-        user_profil = await self.get_user_profil(user_obj)
+        user_profil = await self.get_user_profil(user)
         return user_profil
 
-    async def get_user_profil(self, user_obj: User) -> UserProfil:
+    async def get_user_profil(self, user: dict) -> UserProfil:
+        '''
+        Профиль из кэшированных полей пользователя, название роли берётся из каталога ролей по role_id.
+        '''
+        role = None
+        if user['role_id'] is not None:
+            role = await role_catalog.get_by_id(self.manager_auth.redis, uuid.UUID(str(user['role_id'])))
         profil = UserProfil(
-            login=user_obj.login,
-            first_name=user_obj.first_name,
-            last_name=user_obj.last_name,
-            name_role=f"{user_obj.role.lvl}:{user_obj.role.name_role}",
-            email=user_obj.email
+            login=user['login'],
+            first_name=user['first_name'],
+            last_name=user['last_name'],
+            name_role=f'{role.lvl}:{role.name_role}' if role else 'None:None',
+            email=user['email']
         )
         return profil
 
-    async def get_user_obj(self, user_agent: str):
+    async def get_cached_profile(self, user_agent: str, user_data: dict | None = None) -> dict:
+        '''
+        Поля профиля пользователя из access token: из кэша или, при промахе, из базы.
+
+        :param user_data: (dict) Уже проверенные данные access token, если они есть.
+        '''
+        if user_data is None:
+            user_data = await self.manager_auth.get_info_from_access_token(user_agent)
+        user = await profile_cache.get(self.manager_auth.redis, user_data.get('sub'))
+        if user is None:
+            raise DoesNotExistException(name=Name.USER)
+        return user
+
+    async def get_user_row(self, user_agent: str, columns: Sequence = USER_PROFILE_COLUMNS) -> Row:
+        '''
+        Пользователь из access token вместе с ролью, одним запросом и только нужные колонки.
+        '''
         user_data = await self.manager_auth.get_info_from_access_token(user_agent)
-        if not isinstance(user_data, dict):
-            return user_data
-        user_id = user_data.get("sub")
-        user_obj: User = await self.manager_auth.get_obj_by_pk(User, user_id)
-        return user_obj
+        user = await self.manager_auth.get_user_with_role(user_data.get("sub"), columns)
+        if user is None:
+            raise DoesNotExistException(name=Name.USER)
+        return user
 
     async def search_for_duplicates(self, data: dict) -> None:
         fields = [FieldFilter(attr_name=key, attr_value=item) for key, item in data.items()]
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from typing import Generic, TypeVar
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from logger import logger
+
+Snapshot = TypeVar('Snapshot')
+
+
+class VersionedCache(ABC, Generic[Snapshot]):
+    '''
+    Кэш редко меняющихся данных из Postgres в памяти воркера.
+
+    Версия данных хранится в Redis (VERSION_KEY) и увеличивается при каждом изменении.
+    Воркер сверяет версию не чаще раза в check_interval секунд и перечитывает данные, только если
+    она изменилась, поэтому изменения видны всем воркерам не позже чем через check_interval.
+    Снимок заменяется целиком, читатели никогда не видят частично обновлённые данные.
+
+    Если задана фабрика сессий реплики, данные перечитываются с неё. После изменения (invalidate)
+    на sticky_window секунд ставится признак PRIMARY_KEY, и перечитывание идёт из основной базы:
+    иначе отстающая реплика вернула бы старые данные, и воркер закрепил бы их за новой версией.
+    '''
+
+    VERSION_KEY: str
+    PRIMARY_KEY: str
+
+    def __init__(self, session_factory, check_interval: float, replica_session_factory=None, sticky_window: float = 0):
+        self.session_factory = session_factory
+        self.replica_session_factory = replica_session_factory
+        self.check_interval = check_interval
+        self.sticky_window_ms = int(sticky_window * 1000)
+        self._snapshot: Snapshot | None = None
+        self._version: int | None = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, redis: Redis, force: bool = False, recheck: bool = False) -> Snapshot:
+        '''
+        Возвращает актуальный снимок.
+
+        :param redis: (Redis) Клиент Redis, в котором хранится версия.
+        :param force: (bool) Перечитать данные из базы независимо от версии.
+        :param recheck: (bool) Сверить версию сразу, не дожидаясь check_interval.
+        '''
+        if not (force or recheck) and self._is_fresh():
+            return self._snapshot
+        async with self._lock:
+            if not (force or recheck) and self._is_fresh():
+                return self._snapshot
+            version = await self._remote_version(redis)
+            if force or self._snapshot is None or version != self._version:
+                self._snapshot = await self._load(await self._load_session_factory(redis))
+                self._version = version
+                self._loaded_at = time.monotonic()
+            self._checked_at = time.monotonic()
+        return self._snapshot
+
+    async def invalidate(self, redis: Redis) -> None:
+        '''
+        Увеличивает версию после изменения данных. Текущий воркер перечитает данные
+        при следующем обращении, остальные — после очередной сверки версии.
+        '''
+        if self.replica_session_factory is not None and self.sticky_window_ms:
+            # Признак ставится до смены версии: воркер, увидевший новую версию, увидит и его.
+            await redis.set(self.PRIMARY_KEY, 1, px=self.sticky_window_ms)
+        await redis.incr(self.VERSION_KEY)
+        self._checked_at = 0.0
+
+    def _is_fresh(self) -> bool:
+        return self._snapshot is not None and time.monotonic() - self._checked_at < self.check_interval
+
+    async def _remote_version(self, redis: Redis) -> int:
+        try:
+            version = await redis.get(self.VERSION_KEY)
+        except RedisError as error:
+            # Без Redis работаем на текущем снимке, а сверку повторяем через check_interval.
+            logger.warning('%s version check failed: %s', type(self).__name__, error)
+            return self._version if self._version is not None else -1
+        return int(version) if version is not None else 0
+
+    async def _load_session_factory(self, redis: Redis):
+        if self.replica_session_factory is None:
+            return self.session_factory
+        try:
+            primary = await redis.exists(self.PRIMARY_KEY)
+        except RedisError as error:
+            logger.warning('%s primary marker check failed: %s', type(self).__name__, error)
+            return self.session_factory
+        return self.session_factory if primary else self.replica_session_factory
+
+    @abstractmethod
+    async def _load(self, session_factory) -> Snapshot:
+        '''
+        Читает данные из базы и собирает новый снимок.
+
+        :param session_factory: Фабрика сессий основной базы или реплики.
+        '''
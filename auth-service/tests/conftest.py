@@ -1,9 +1,16 @@
 import asyncio
+from base64 import urlsafe_b64encode
+from types import SimpleNamespace
 from typing import AsyncGenerator
 
 import pytest
+from fakeredis import FakeServer, aioredis
 from httpx import AsyncClient
+from core.config import app_settings
+from db import redis
 from main import app
+from services.key_ring import key_ring
+from services.role_catalog import role_catalog
 
 
 # SETUP
@@ -19,3 +26,55 @@ def event_loop(request):
 async def ac() -> AsyncGenerator[AsyncClient, None]:
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
+
+
+@pytest.fixture
+def signing_kek(monkeypatch):
+    """KEK для шифрования ключей подписи в тестах."""
+    monkeypatch.setattr(app_settings, 'signing_keks', {'test': urlsafe_b64encode(b'k' * 32).decode()})
+    monkeypatch.setattr(app_settings, 'signing_kek_id', 'test')
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Общий клиент Redis приложения на fakeredis, отдельный сервер на каждый тест."""
+    client = aioredis.FakeRedis(server=FakeServer())
+    monkeypatch.setattr(redis, 'redis', client)
+    return client
+
+
+class FakeCatalogSession:
+    """Фабрика сессий для кэшей в памяти: отдаёт строки из списка вместо таблицы."""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+    async def execute(self, query):
+        return SimpleNamespace(scalars=lambda: list(self.rows))
+
+
+def reset_cache(monkeypatch, cache, rows: list) -> None:
+    monkeypatch.setattr(cache, 'session_factory', FakeCatalogSession(rows))
+    monkeypatch.setattr(cache, 'replica_session_factory', None)
+    monkeypatch.setattr(cache, '_snapshot', None)
+    monkeypatch.setattr(cache, '_version', None)
+    monkeypatch.setattr(cache, '_checked_at', 0.0)
+    monkeypatch.setattr(cache, '_loaded_at', 0.0)
+
+
+@pytest.fixture
+def offline_app(monkeypatch, fake_redis) -> list:
+    """Приложение без Postgres: Redis на fakeredis, ключи подписи из настроек, роли — из возвращаемого списка."""
+    roles = []
+    reset_cache(monkeypatch, role_catalog, roles)
+    reset_cache(monkeypatch, key_ring, [])
+    return roles
@@ -2,12 +2,16 @@ import pytest
 from httpx import AsyncClient
 from http import HTTPStatus
 
+from core.config import Name
+from core.exceptions import AlreadyExistsException, DoesNotExistException
 from models.entity import User, Role
 from uuid import uuid4
 
 
 START_URL = "/api/v1/admin/"
 
+pytestmark = pytest.mark.usefixtures('offline_app')
+
 # данные для тестов
 role_dict = {
     'lvl': 1,
@@ -48,7 +52,7 @@ role_user_dict = {
         ),
         (
                 role_dict,
-                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": "Такая роль уже существует"}},
+                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": AlreadyExistsException(Name.ROLE).detail}},
                 Role(**role_dict)
         )
     ]
@@ -85,21 +89,21 @@ async def test_create(query_data, expected_answer, mock_get_role, ac: AsyncClien
         ),
         (
                 role_dict,
-                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": "Такой роли не существует"}},
+                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": DoesNotExistException(Name.ROLE).detail}},
                 None,
                 str(uuid4())
         )
     ]
 )
 async def test_update(query_data, expected_answer, mock_get_role, role_id, ac: AsyncClient, monkeypatch):
-    async def mock_get_obj_by_attr_name(*args, **kwargs):
+    async def mock_get_obj_by_pk(*args, **kwargs):
         return mock_get_role
 
     async def mock_get_info_from_access_token(*args, **kwargs):
         return {'is_admin': True}
 
     monkeypatch.setattr('services.user.BaseAuth.get_info_from_access_token', mock_get_info_from_access_token)
-    monkeypatch.setattr('services.user.BaseRepository.get_obj_by_attr_name', mock_get_obj_by_attr_name)
+    monkeypatch.setattr('services.user.BaseRepository.get_obj_by_pk', mock_get_obj_by_pk)
 
     response = await ac.patch(START_URL + f"update/{role_id}/", headers={'User-Agent': 'google'}, json=query_data)
 
@@ -118,19 +122,19 @@ async def test_update(query_data, expected_answer, mock_get_role, role_id, ac: A
         ),
         (
                 role_user_dict,
-                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": "Такой роли не существует"}},
+                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": DoesNotExistException(Name.ROLE).detail}},
                 None,
                 user_with_certain_id,
         ),
         (
                 role_user_dict,
-                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": "Такого пользователя не существует"}},
+                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": DoesNotExistException(Name.USER).detail}},
                 role_with_certain_id,
                 None
         ),
         (
                 role_user_dict,
-                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": "Такого пользователя и такой роли не существует"}},
+                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": DoesNotExistException(Name.BOTH).detail}},
                 None,
                 None
         )
@@ -3,18 +3,22 @@ import time
 import pytest
 from httpx import AsyncClient
 from http import HTTPStatus
-import itertools
 from async_fastapi_jwt_auth import AuthJWT
+from sqlalchemy.exc import IntegrityError
 
+from core.config import Name, Token
+from core.exceptions import (
+    AlreadyExistsException, DoesNotExistException, InvalidPasswordException, InvalidTokenException,
+    UnsafeEntryException
+)
 from models.entity import User, Role
 from uuid import uuid4
 
-from schemas.entity import FieldFilter
-from services.auth_jwt import BaseAuthJWT
-
 START_URL = "/api/v1/auth/"
 TIME_ACCESS_TOKEN = 25
 
+pytestmark = pytest.mark.usefixtures('offline_app')
+
 
 @pytest.mark.parametrize(
     'query_data, expected_answer, mock_get_user',
@@ -26,17 +30,20 @@ TIME_ACCESS_TOKEN = 25
         ),
         (
                 {'login': 'admin', 'password': 'admin'},
-                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": "Пользователя не существует"}},
+                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": DoesNotExistException(Name.USER).detail}},
                 None
         ),
         (
                 {'login': 'admin', 'password': 'admin2'},
-                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": "Неверный пароль"}},
+                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": InvalidPasswordException().detail}},
                 User(login='admin', password='admin', first_name='dima', last_name='ivanov', role_id=uuid4(), email='test@mail.ru', is_admin=False)
         )
     ]
 )
 async def test_login(query_data, expected_answer, mock_get_user, ac: AsyncClient, monkeypatch):
+    if mock_get_user is not None:
+        mock_get_user.id = uuid4()
+
     async def mock_get_obj_by_attr_name(*args, **kwargs):
         return mock_get_user
 
@@ -53,82 +60,75 @@ async def test_login(query_data, expected_answer, mock_get_user, ac: AsyncClient
     assert response.json() == expected_answer['response_body']
 
 
+class UniqueViolation(Exception):
+    def __init__(self, constraint_name: str):
+        self.constraint_name = constraint_name
+
+
 @pytest.mark.parametrize(
-    'query_data, expected_answer, mock_get_users, mock_get_role',
+    'query_data, expected_answer, violated_constraint, table_roles',
     [
         (
                 {"login": "admin", "password": "stringst", "first_name": "string", "last_name": "string", "email": "test@test.ru"},
                 {'status': HTTPStatus.OK, 'response_body': None},
-                tuple(),
-                [None, Role(lvl=0, name_role="str", description="str", max_year="int")]
+                None,
+                []
         ),
         (
                 {"login": "admin", "password": "stringst", "first_name": "string", "last_name": "string", "email": "test@test.ru"},
                 {'status': HTTPStatus.OK, 'response_body': None},
-                tuple(),
+                None,
                 [Role(lvl=0, name_role="str", description="str", max_year="int")]
         ),
         (
                 {"login": "admin", "password": "stringst", "first_name": "string", "last_name": "string",
                  "email": "test@test.ru"},
                 {'status': HTTPStatus.BAD_REQUEST,
-                 'response_body': {"detail": "Пользователь с таким login уже существует"}},
-                 (User(login='admin', password='admin', first_name='dima', last_name='ivanov', role_id=uuid4(),
-                       email='test@mail.ru', is_admin=False),),
+                 'response_body': {"detail": AlreadyExistsException(Name.LOGIN).detail}},
+                'users_login_key',
                 [Role(lvl=0, name_role="str", description="str", max_year="int")]
         ),
         (
                 {"login": "admin", "password": "stringst", "first_name": "string", "last_name": "string",
                  "email": "test@test.ru"},
                 {'status': HTTPStatus.BAD_REQUEST,
-                 'response_body': {"detail": "Пользователь с таким email уже существует"}},
-                 (User(login='user', password='admin', first_name='dima', last_name='ivanov', role_id=uuid4(),
-                       email='test@test.ru', is_admin=False),),
+                 'response_body': {"detail": AlreadyExistsException(Name.EMAIL).detail}},
+                'users_email_key',
                 [Role(lvl=0, name_role="str", description="str", max_year="int")]
         )
     ]
 )
-async def test_sign_up(query_data, expected_answer, mock_get_users, mock_get_role, ac: AsyncClient, monkeypatch):
-    count = 0
-
-    async def mock_get_list_obj_by_list_attr_name_operator_or(*args, **kwargs):
-        assert args[1] == [
-            {
-                'model': User,
-                'fields': [
-                    FieldFilter(attr_name='login', attr_value=query_data['login']),
-                    FieldFilter(attr_name='email', attr_value=query_data['email'])
-                ]
-            },
-        ]
-        return itertools.chain(mock_get_users)
-
-    async def mock_return_null(*args, **kwargs):
-        return None
-
-    async def mock_get_first_obj_order_by_attr_name(*args, **kwargs):
-        nonlocal count
-        if count == 0:
-            count+=1
-            return mock_get_role[0]
-        else:
-            role = mock_get_role[1]
+async def test_sign_up(
+        query_data, expected_answer, violated_constraint, table_roles, offline_app, ac: AsyncClient, monkeypatch
+):
+    for role in table_roles:
+        role.id = uuid4()
+    offline_app.extend(table_roles)
+    created_users = []
+
+    async def mock_create_obj(self, model, data):
+        if model is Role:
+            role = Role(**data)
             role.id = uuid4()
-            return role
+            offline_app.append(role)
+        elif violated_constraint:
+            orig = Exception('duplicate key value violates unique constraint')
+            orig.__cause__ = UniqueViolation(violated_constraint)
+            raise IntegrityError('INSERT INTO users', {}, orig)
+        else:
+            created_users.append(data)
 
-    monkeypatch.setattr('services.user.BaseRepository.get_list_obj_by_list_attr_name_operator_or',
-                        mock_get_list_obj_by_list_attr_name_operator_or)
-    monkeypatch.setattr('services.user.BaseRepository.get_first_obj_order_by_attr_name',
-                        mock_get_first_obj_order_by_attr_name)
-    monkeypatch.setattr('services.user.BaseRepository.create_obj', mock_return_null)
+    monkeypatch.setattr('services.user.BaseRepository.create_obj', mock_create_obj)
 
     response = await ac.post(START_URL + "sign_up/", json=query_data)
     assert response.status_code == expected_answer['status']
     assert response.json() == expected_answer['response_body']
+    if expected_answer['status'] == HTTPStatus.OK:
+        assert created_users[0]['role_id'] == offline_app[0].id
 
 
 @pytest.mark.parametrize(
-    'input_headers, expected_answer, mock_check_access, mock_get_cache',
+    'input_headers, expected_answer, mock_check_access, mock_is_revoked',
     [
         (
                 {},
@@ -138,7 +138,7 @@ async def test_sign_up(query_data, expected_answer, mock_get_users, mock_get_rol
         ),
         (
                 {'User-Agent': 'yandex'},
-                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {'detail': 'подозрение на небезопасный вход'}},
+                {'status': HTTPStatus.BAD_REQUEST, 'response_body': {'detail': UnsafeEntryException().detail}},
                 {'jti': str(uuid4()), 'user_agent': 'google', 'exp': TIME_ACCESS_TOKEN + int(time.time())},
                 False
         ),
@@ -150,25 +150,20 @@ async def test_sign_up(query_data, expected_answer, mock_get_users, mock_get_rol
         )
     ]
 )
-async def test_get_user(input_headers, expected_answer, mock_check_access, mock_get_cache, ac: AsyncClient, monkeypatch):
+async def test_user_info(input_headers, expected_answer, mock_check_access, mock_is_revoked, ac: AsyncClient, monkeypatch):
     if expected_answer['response_body'].get('jti'):
         expected_answer['response_body']['jti'] = mock_check_access['jti']
 
     async def mock_check_access_token(*args, **kwargs):
         return mock_check_access
 
-    async def mock_object_from_cache(*args, **kwargs):
-        return mock_get_cache
-
-    async def mock_put_object_to_cache(self, obj, time_cache):
-        assert time_cache <= TIME_ACCESS_TOKEN
-        return None
+    async def mock_access_token_is_revoked(*args, **kwargs):
+        return mock_is_revoked
 
     monkeypatch.setattr('services.auth_jwt.BaseAuthJWT.check_access_token', mock_check_access_token)
-    monkeypatch.setattr('services.redis_cache.CacheRedis._object_from_cache', mock_object_from_cache)
-    monkeypatch.setattr('services.redis_cache.CacheRedis._put_object_to_cache', mock_put_object_to_cache)
+    monkeypatch.setattr('services.redis_cache.CacheRedis._access_token_is_revoked', mock_access_token_is_revoked)
 
-    response = await ac.get(START_URL + "get_user/", headers=input_headers)
+    response = await ac.get(START_URL + "user_info/", headers=input_headers)
     assert response.status_code == expected_answer['status']
     assert response.json() == expected_answer['response_body']
 
@@ -186,14 +181,14 @@ async def test_get_user(input_headers, expected_answer, mock_check_access, mock_
         (
             User(login='admin', password='admin', first_name='dima', last_name='ivanov', role_id=uuid4(),
                  email='test@mail.ru', is_admin=False),
-            {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": 'подозрение на небезопасный вход'}},
+            {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": UnsafeEntryException().detail}},
             {'User-Agent': 'google2'},
             {'mock_get_cache': True, 'user_agent_token': 'google'}
         ),
         (
             User(login='admin', password='admin', first_name='dima', last_name='ivanov', role_id=uuid4(),
                  email='test@mail.ru', is_admin=False),
-            {'status': HTTPStatus.UNPROCESSABLE_ENTITY, 'response_body': {"detail": 'access токен не принадлежит refresh токену'}},
+            {'status': HTTPStatus.BAD_REQUEST, 'response_body': {"detail": InvalidTokenException(Token.BOTH).detail}},
             {'User-Agent': 'google'},
             {'mock_get_cache': True, 'user_agent_token': 'google', 'fake_access': True}
         ),
@@ -210,12 +205,16 @@ async def test_refresh(user, expected_answer, input_headers, settings_test, ac:
     async def mock_object_from_cache(*args, **kwargs):
         return settings_test['mock_get_cache']
 
+    async def mock_rotate_session(*args, **kwargs):
+        return 1 if settings_test['mock_get_cache'] else 0
+
     async def mock_return_null(*args, **kwargs):
         return None
 
     monkeypatch.setattr('services.redis_cache.CacheRedis._object_from_cache', mock_object_from_cache)
     monkeypatch.setattr('services.redis_cache.CacheRedis._delete_object_from_cache', mock_return_null)
     monkeypatch.setattr('services.redis_cache.CacheRedis._put_object_to_cache', mock_return_null)
+    monkeypatch.setattr('services.redis_cache.CacheRedis._rotate_session', mock_rotate_session)
     monkeypatch.setattr('services.user.BaseRepository.create_obj', mock_return_null)
 
     user.id = uuid4()
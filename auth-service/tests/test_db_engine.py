@@ -0,0 +1,45 @@
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from core.config import app_settings
+from db.pool import TimedQueuePool, instrument_pool
+from db.postgres import engine_options
+
+
+def test_engine_options_use_settings():
+    """Проверяет, что пул и кэш подготовленных выражений настраиваются из Settings, а SQL не логируется."""
+    settings = app_settings.model_copy(update={'db_pool_size': 3, 'db_statement_cache_size': 50})
+
+    options = engine_options(settings, 'primary')
+
+    assert options['echo'] is False
+    assert options['poolclass'] is TimedQueuePool
+    assert options['pool_size'] == 3
+    assert options['connect_args'] == {'statement_cache_size': 50, 'prepared_statement_cache_size': 50}
+
+
+def test_transaction_pooling_disables_prepared_statement_caches():
+    """Проверяет, что в режиме transaction pooling кэши выражений отключены, имена уникальны, пул — NullPool."""
+    settings = app_settings.model_copy(update={'db_transaction_pooling': True})
+
+    options = engine_options(settings, 'primary')
+    name_func = options['connect_args']['prepared_statement_name_func']
+
+    assert options['poolclass'] is NullPool
+    assert options['connect_args']['statement_cache_size'] == 0
+    assert options['connect_args']['prepared_statement_cache_size'] == 0
+    assert name_func() != name_func()
+
+
+def test_pool_connections_are_counted():
+    """Проверяет, что метрики пула отражают открытые и выданные соединения."""
+    engine = create_engine('sqlite://')
+    instrument_pool(engine, 'test')
+
+    def sample(state):
+        return REGISTRY.get_sample_value('auth_db_pool_connections', {'engine': 'test', 'state': state})
+
+    with engine.connect():
+        assert (sample('open'), sample('checked_out')) == (1, 1)
+    assert sample('checked_out') == 0
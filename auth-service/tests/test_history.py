@@ -0,0 +1,114 @@
+import pytest
+from httpx import AsyncClient
+from http import HTTPStatus
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from sqlalchemy.dialects import postgresql
+
+from models.entity import History, EventEnum
+from services.repository import BaseRepository
+
+START_URL = "/api/v1/profile/"
+
+user_id = uuid4()
+now = datetime(2023, 8, 1, 12, 0, 0)
+history = []
+for number in range(3):
+    entry = History(user_id=user_id, browser='google', event_type=EventEnum.login, result=True)
+    entry.id = uuid4()
+    entry.time = now - timedelta(minutes=number)
+    history.append(entry)
+
+
+async def test_user_history_cursor(ac: AsyncClient, monkeypatch):
+    """Проверяет, что курсор первой страницы указывает на последнюю запись и передаётся в запрос второй страницы."""
+    calls = []
+
+    async def mock_info_from_access_token(*args, **kwargs):
+        return {"sub": str(user_id)}
+
+    async def mock_get_list_obj_by_keyset(*args, **kwargs):
+        calls.append(kwargs['after'])
+        if kwargs['after'] is None:
+            return history[:kwargs['page_size']]
+        return history[2:]
+
+    monkeypatch.setattr('services.user.BaseAuth.get_info_from_access_token', mock_info_from_access_token)
+    monkeypatch.setattr('services.history.BaseHistory.get_list_obj_by_keyset', mock_get_list_obj_by_keyset)
+
+    response = await ac.get(START_URL + "user_history/cursor/", params={'page_size': 2})
+    assert response.status_code == HTTPStatus.OK
+    first_page = response.json()
+    assert [item['id'] for item in first_page['items']] == [str(entry.id) for entry in history[:2]]
+    assert first_page['next_cursor'] is not None
+
+    response = await ac.get(
+        START_URL + "user_history/cursor/", params={'page_size': 2, 'cursor': first_page['next_cursor']}
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'items': [{
+            'id': str(history[2].id), 'time': history[2].time.isoformat(), 'browser': 'google',
+            'user_id': str(user_id), 'result': True
+        }],
+        'next_cursor': None
+    }
+    assert calls[1] == (history[1].time, history[1].id)
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', 'MjAyMy0wOC0wMQ'])
+async def test_user_history_invalid_cursor(cursor, ac: AsyncClient, monkeypatch):
+    """Проверяет, что испорченный курсор возвращает 400, а не 500."""
+    async def mock_info_from_access_token(*args, **kwargs):
+        return {"sub": str(user_id)}
+
+    monkeypatch.setattr('services.user.BaseAuth.get_info_from_access_token', mock_info_from_access_token)
+
+    response = await ac.get(START_URL + "user_history/cursor/", params={'cursor': cursor})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid pagination cursor'}
+
+
+@pytest.mark.parametrize('file_format, expected', [
+    ('ndjson', [f'"id":"{entry.id}"' for entry in history]),
+    ('csv', ['id,time,browser,event_type,result'] + [f'{entry.id},{entry.time},google,login,True' for entry in history]),
+])
+async def test_user_history_export(file_format, expected, ac: AsyncClient, monkeypatch):
+    """Проверяет, что выгрузка истории отдаётся порциями в выбранном формате."""
+    async def mock_info_from_access_token(*args, **kwargs):
+        return {"sub": str(user_id)}
+
+    async def mock_stream_columns(*args, **kwargs):
+        for chunk in (history[:2], history[2:]):
+            yield chunk
+
+    monkeypatch.setattr('services.user.BaseAuth.get_info_from_access_token', mock_info_from_access_token)
+    monkeypatch.setattr('services.history.BaseHistory.stream_columns_by_attr_name', mock_stream_columns)
+
+    response = await ac.get(START_URL + "user_history/export/", params={'file_format': file_format})
+    assert response.status_code == HTTPStatus.OK
+    assert 'attachment' in response.headers['content-disposition']
+    lines = response.text.strip().splitlines()
+    assert len(lines) == len(expected)
+    for line, fragment in zip(lines, expected):
+        assert fragment in line
+
+
+async def test_keyset_predicate_is_index_range():
+    """Проверяет, что условие курсора содержит границу time <= значения курсора для диапазона по индексу."""
+    class CapturingSession:
+        query = None
+
+        async def execute(self, query):
+            CapturingSession.query = str(query.compile(dialect=postgresql.dialect()))
+            return self
+
+        def scalars(self):
+            return []
+
+    await BaseRepository(session=CapturingSession()).get_list_obj_by_keyset(
+        History, 'user_id', user_id, 'time', after=(now, uuid4()), page_size=10
+    )
+
+    assert 'login_history.time <= %(time_1)s AND (login_history.time < %(time_2)s OR' in CapturingSession.query
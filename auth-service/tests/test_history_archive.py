@@ -0,0 +1,140 @@
+import gzip
+import json
+import uuid
+from datetime import datetime
+
+import orjson
+
+from db import history_archive
+from db.history_archive import ArchiveWriter, command_archive_history, load_checkpoint, save_checkpoint
+from models.entity import EventEnum
+
+
+def make_row(moment: datetime) -> dict:
+    return {
+        'id': uuid.uuid4(),
+        'user_id': uuid.uuid4(),
+        'time': moment,
+        'browser': 'firefox',
+        'event_type': EventEnum.login.value,
+        'result': True,
+    }
+
+
+class FakeRow:
+    def __init__(self, data: dict):
+        self._data = dict(data, event_type=EventEnum(data['event_type']))
+        self.id = data['id']
+        self.time = data['time']
+
+    def _asdict(self):
+        return dict(self._data)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def partitions(self, size):
+        for start in range(0, len(self.rows), size):
+            yield self.rows[start:start + size]
+
+
+class FakeConnection:
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def stream(self, query):
+        self.engine.queries.append(query)
+        return FakeResult(self.engine.rows)
+
+    async def execute(self, statement):
+        self.engine.deletes.append(statement)
+
+
+class FakeEngine:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.deletes = []
+
+    def connect(self):
+        return FakeConnection(self)
+
+    def begin(self):
+        return FakeConnection(self)
+
+
+def test_writer_gzip_round_trip(tmp_path):
+    """Проверяет, что записанные строки читаются обратно из gzip, в том числе после дозаписи."""
+    first, second = make_row(datetime(2023, 1, 5, 10)), make_row(datetime(2023, 1, 5, 11))
+    writer = ArchiveWriter(tmp_path, 'ndjson')
+    writer.write(first)
+    writer.close()
+    writer = ArchiveWriter(tmp_path, 'ndjson')
+    writer.write(second)
+    writer.close()
+
+    with gzip.open(tmp_path / '2023-01-05.ndjson.gz', 'rt', encoding='utf-8') as file:
+        lines = [orjson.loads(line) for line in file]
+    assert [line['id'] for line in lines] == [str(first['id']), str(second['id'])]
+
+
+def test_writer_fsyncs_rotated_file(tmp_path, monkeypatch):
+    """Проверяет, что файл предыдущего дня сбрасывается на диск при переходе на следующий день."""
+    synced = []
+    real_fsync = history_archive.os.fsync
+
+    def fsync(fd):
+        synced.append(fd)
+        real_fsync(fd)
+
+    monkeypatch.setattr(history_archive.os, 'fsync', fsync)
+    writer = ArchiveWriter(tmp_path, 'csv')
+    writer.write(make_row(datetime(2023, 1, 5, 23, 59)))
+    assert synced == []
+    writer.write(make_row(datetime(2023, 1, 6, 0, 1)))
+    assert len(synced) == 1
+    writer.sync()
+    writer.close()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['2023-01-05.csv.gz', '2023-01-06.csv.gz']
+    with gzip.open(tmp_path / '2023-01-05.csv.gz', 'rt', encoding='utf-8') as file:
+        assert len(file.read().splitlines()) == 2
+
+
+def test_checkpoint_round_trip(tmp_path):
+    """Проверяет сохранение и чтение контрольной точки."""
+    path = tmp_path / 'state' / 'checkpoint.json'
+    assert load_checkpoint(path) is None
+    save_checkpoint(path, {'cutoff': '2023-01-01T00:00:00', 'time': None, 'id': None, 'archived': 0})
+    assert load_checkpoint(path)['cutoff'] == '2023-01-01T00:00:00'
+
+
+async def test_archive_resumes_from_checkpoint(tmp_path, monkeypatch):
+    """Проверяет продолжение с контрольной точки: фильтр по ключу, счётчик и удаление контрольной точки."""
+    rows = [FakeRow(make_row(datetime(2023, 1, day, 12))) for day in (5, 5, 6)]
+    engine = FakeEngine(rows)
+    monkeypatch.setattr(history_archive, 'engine', engine)
+    checkpoint_path = tmp_path / 'checkpoint.json'
+    last_id = uuid.uuid4()
+    checkpoint_path.write_text(json.dumps(
+        {'cutoff': '2023-02-01T00:00:00', 'time': '2023-01-04T12:00:00', 'id': str(last_id), 'archived': 10}
+    ))
+
+    archived = await command_archive_history(90, tmp_path / 'out', 'ndjson', 2, checkpoint_path)
+
+    assert archived == 13
+    assert len(engine.deletes) == 2
+    params = engine.queries[0].compile().params
+    assert datetime(2023, 2, 1) in params.values()
+    assert datetime(2023, 1, 4, 12) in params.values()
+    assert last_id in params.values()
+    assert not checkpoint_path.exists()
+    assert sorted(path.name for path in (tmp_path / 'out').iterdir()) == ['2023-01-05.ndjson.gz', '2023-01-06.ndjson.gz']
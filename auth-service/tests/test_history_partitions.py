@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from db.history_partitions import (
+    create_partition_sql, detach_partition_sql, month_start, plan_partitions, PartitionPlan
+)
+
+
+def test_month_start_offsets():
+    """Проверяет сдвиг месяца вперёд и назад, в том числе через границу года."""
+    moment = datetime(2023, 11, 17, 13, 45)
+    assert month_start(moment) == datetime(2023, 11, 1)
+    assert month_start(moment, 2) == datetime(2024, 1, 1)
+    assert month_start(moment, -11) == datetime(2022, 12, 1)
+    assert month_start(datetime(2024, 1, 1), -1) == datetime(2023, 12, 1)
+
+
+def test_plan_creates_missing_and_detaches_expired():
+    """Проверяет, что план создаёт только недостающие секции и отсоединяет целиком просроченные."""
+    existing = {
+        'login_history_y2023m05',
+        'login_history_y2023m06',
+        'login_history_y2023m11',
+        'login_history_y2023m12',
+        'login_history_default',
+    }
+    plan = plan_partitions(existing, datetime(2023, 11, 17), months_ahead=2, retention_months=5)
+    assert plan == PartitionPlan(
+        create=[('login_history_y2024m01', datetime(2024, 1, 1), datetime(2024, 2, 1))],
+        detach=['login_history_y2023m05'],
+    )
+
+
+def test_create_partition_moves_default_rows_before_attach():
+    """Проверяет, что строки диапазона переносятся из секции по умолчанию до ATTACH."""
+    statements = create_partition_sql('login_history_y2024m01', datetime(2024, 1, 1), datetime(2024, 2, 1))
+    assert statements[0].startswith('CREATE TABLE login_history_y2024m01 (LIKE login_history')
+    assert statements[1] == (
+        "INSERT INTO login_history_y2024m01 SELECT * FROM login_history_default "
+        "WHERE time >= '2024-01-01' AND time < '2024-02-01'"
+    )
+    assert statements[2].startswith('DELETE FROM login_history_default')
+    assert statements[3] == (
+        "ALTER TABLE login_history ATTACH PARTITION login_history_y2024m01 "
+        "FOR VALUES FROM ('2024-01-01') TO ('2024-02-01')"
+    )
+
+
+def test_detach_partition_sql():
+    """Проверяет выбор CONCURRENTLY."""
+    assert detach_partition_sql('p', concurrently=True) == 'ALTER TABLE login_history DETACH PARTITION p CONCURRENTLY'
+    assert detach_partition_sql('p', concurrently=False) == 'ALTER TABLE login_history DETACH PARTITION p'
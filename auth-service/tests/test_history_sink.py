@@ -0,0 +1,88 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from services.history_sink import HistorySink
+
+
+class FakeSession:
+    batches = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+    async def execute(self, query, rows):
+        self.batches.append(list(rows))
+
+    async def commit(self):
+        return None
+
+
+async def test_history_sink_flushes_in_batches_and_drains_on_stop():
+    """Проверяет, что события пишутся пачками, лишние отбрасываются, а остаток дописывается при остановке."""
+    FakeSession.batches = []
+    sink = HistorySink(session_factory=FakeSession, buffer_size=5, batch_size=2, flush_interval=10)
+    sink.start()
+    for number in range(7):
+        sink.put({'number': number})
+
+    assert sink.dropped == 2
+    await sink.stop()
+
+    assert [len(batch) for batch in FakeSession.batches] == [2, 2, 1]
+    assert sink.written == 5
+    assert sink.pending == 0
+
+
+class BrokenSession(FakeSession):
+    fail = True
+
+    async def execute(self, query, rows):
+        if BrokenSession.fail:
+            BrokenSession.fail = False
+            raise ValueError('unexpected driver error')
+        await super().execute(query, rows)
+
+
+async def test_history_sink_survives_unexpected_error():
+    """Проверяет, что неожиданная ошибка записи учитывается как сбой пачки и не останавливает фоновую задачу."""
+    FakeSession.batches, BrokenSession.fail = [], True
+    sink = HistorySink(session_factory=BrokenSession, buffer_size=10, batch_size=2, flush_interval=10)
+    sink.start()
+    sink.put({'number': 0})
+    sink.put({'number': 1})
+    for _ in range(10):
+        await asyncio.sleep(0)
+    sink.put({'number': 2})
+    await sink.stop()
+
+    assert sink.failed == 2
+    assert sink.written == 1
+    assert FakeSession.batches == [[{'number': 2}]]
+
+
+def sample(name: str, labels: dict | None = None) -> float:
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+async def test_history_sink_exports_metrics():
+    """Проверяет, что отброшенные, записанные и неудачные события и размер буфера видны в реестре метрик."""
+    FakeSession.batches, BrokenSession.fail = [], True
+    results = ('written', 'dropped', 'failed')
+    before = {result: sample('auth_history_events_total', {'result': result}) for result in results}
+    pending = sample('auth_history_pending_events')
+    sink = HistorySink(session_factory=BrokenSession, buffer_size=3, batch_size=2, flush_interval=10)
+    sink.start()
+    for number in range(4):
+        sink.put({'number': number})
+    assert sample('auth_history_pending_events') == pending + 3
+
+    await sink.stop()
+
+    assert sample('auth_history_pending_events') == pending
+    assert {
+        result: sample('auth_history_events_total', {'result': result}) - before[result] for result in results
+    } == {'written': 1, 'dropped': 1, 'failed': 2}
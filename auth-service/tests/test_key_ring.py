@@ -0,0 +1,73 @@
+import jwt
+import pytest
+from async_fastapi_jwt_auth.exceptions import JWTDecodeError
+
+from db.key_rotation import generate_key
+from models.entity import KeyStatus
+from services.auth_jwt import KeyRingAuthJWT
+from services.key_ring import KeyRing
+
+pytestmark = pytest.mark.usefixtures('signing_kek')
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self.rows
+
+
+class FakeSession:
+    keys = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+    async def execute(self, query):
+        return FakeResult([key for key in self.keys if key.status != KeyStatus.retired])
+
+
+async def test_key_rotation_keeps_old_tokens_valid_until_retired(monkeypatch):
+    """Проверяет, что после смены ключа новые токены подписываются новым kid, а старые действуют до вывода ключа."""
+    old_key, new_key = generate_key('EdDSA'), generate_key('RS256')
+    old_key.status = KeyStatus.active
+    FakeSession.keys = [old_key, new_key]
+    redis = FakeRedis()
+    ring = KeyRing(session_factory=FakeSession, check_interval=0)
+
+    async def mock_get_redis():
+        return redis
+
+    monkeypatch.setattr('services.auth_jwt.key_ring', ring)
+    monkeypatch.setattr('services.auth_jwt.get_redis', mock_get_redis)
+
+    old_token = await KeyRingAuthJWT().create_access_token(subject='user')
+    assert jwt.get_unverified_header(old_token) == {'alg': 'EdDSA', 'kid': old_key.kid, 'typ': 'JWT'}
+    assert {key['kid'] for key in (await ring.jwks(redis))['keys']} >= {old_key.kid, new_key.kid}
+
+    old_key.status, new_key.status = KeyStatus.deprecated, KeyStatus.active
+    await ring.invalidate(redis)
+    new_token = await KeyRingAuthJWT().create_access_token(subject='user')
+    assert jwt.get_unverified_header(new_token)['kid'] == new_key.kid
+    assert (await KeyRingAuthJWT()._verified_token(old_token))['sub'] == 'user'
+    assert (await KeyRingAuthJWT()._verified_token(new_token))['sub'] == 'user'
+
+    old_key.status = KeyStatus.retired
+    await ring.invalidate(redis)
+    with pytest.raises(JWTDecodeError):
+        await KeyRingAuthJWT()._verified_token(old_token)
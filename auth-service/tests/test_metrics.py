@@ -0,0 +1,61 @@
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from core.exceptions import DoesNotExistException
+from core.metrics import MetricsMiddleware
+from models.entity import User
+from schemas.entity import UserLogin
+from services.repository import BaseRepository
+from services.user import BaseAuth
+
+
+def sample(name: str, labels: dict) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_request_latency_is_labeled_by_route_template():
+    """Проверяет, что время ответа учитывается по шаблону маршрута, а не по пути с id."""
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get('/items/{item_id}/')
+    async def item(item_id: str):
+        return {'id': item_id}
+
+    labels = {'method': 'GET', 'route': '/items/{item_id}/', 'status': '200'}
+    before = sample('auth_http_request_duration_seconds_count', labels)
+    client = TestClient(app)
+    client.get('/items/1/')
+    client.get('/items/2/')
+    client.get('/missing/')
+
+    assert sample('auth_http_request_duration_seconds_count', labels) == before + 2
+    assert sample('auth_http_request_duration_seconds_count',
+                  {'method': 'GET', 'route': 'unmatched', 'status': '404'}) >= 1
+
+
+async def test_login_outcome_and_repository_call_are_counted(monkeypatch):
+    """Проверяет, что неудачный вход учитывается в исходах авторизации, а запрос к базе — по методу репозитория."""
+    class FakeSession:
+        async def execute(self, query):
+            return self
+
+        def scalar(self):
+            return None
+
+    outcome = {'event': 'login', 'result': 'unknown_user'}
+    call = {'method': 'get_obj_by_attr_name'}
+    before = sample('auth_events_total', outcome), sample('auth_repository_call_duration_seconds_count', call)
+
+    with pytest.raises(DoesNotExistException):
+        await BaseAuth(session=FakeSession(), auth=None, redis=None, manager_history=None).log_in(
+            UserLogin(login='login', password='password'), 'google'
+        )
+    await BaseRepository(session=FakeSession()).get_obj_by_attr_name(User, 'id', uuid.uuid4())
+
+    assert sample('auth_events_total', outcome) == before[0] + 1
+    assert sample('auth_repository_call_duration_seconds_count', call) == before[1] + 2
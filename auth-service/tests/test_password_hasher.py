@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from prometheus_client import REGISTRY
+
+from core.exceptions import HashingOverloadedException
+from services.password_hasher import PasswordHasher
+
+
+def sample(name: str, labels: dict | None = None) -> float:
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(pool_size=1, queue_size=1)
+    hasher._executor = ThreadPoolExecutor(max_workers=hasher.pool_size)
+    yield hasher
+    hasher.stop()
+
+
+async def test_hasher_rejects_above_pool_and_queue_size(hasher, monkeypatch):
+    """Проверяет, что операции сверх pool_size + queue_size сразу отклоняются, а счётчики возвращаются к нулю."""
+    release = threading.Event()
+
+    def slow_hash(password):
+        release.wait(5)
+        return f'hash:{password}'
+
+    monkeypatch.setattr('services.password_hasher.generate_password_hash', slow_hash)
+    depth, rejected = sample('auth_password_hash_queue_depth'), sample('auth_password_hash_rejected_total')
+    tasks = [asyncio.create_task(hasher.hash(f'password-{number}')) for number in range(2)]
+    while hasher.in_flight < 2:
+        await asyncio.sleep(0)
+    assert hasher.queue_depth == 1
+    assert sample('auth_password_hash_queue_depth') == depth + 1
+
+    with pytest.raises(HashingOverloadedException):
+        await hasher.hash('password-2')
+    assert sample('auth_password_hash_rejected_total') == rejected + 1
+
+    release.set()
+    assert await asyncio.gather(*tasks) == ['hash:password-0', 'hash:password-1']
+    assert hasher.in_flight == 0
+    assert hasher.queue_depth == 0
+    assert sample('auth_password_hash_queue_depth') == depth
+
+
+async def test_hasher_releases_slot_after_error(hasher, monkeypatch):
+    """Проверяет, что ошибка в операции не занимает место в очереди навсегда."""
+    def broken(password_hash, password):
+        raise ValueError('broken hash')
+
+    monkeypatch.setattr('services.password_hasher.check_password_hash', broken)
+    calls = sample('auth_password_hash_duration_seconds_count', {'operation': 'verify'})
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            await hasher.verify('hash', 'password')
+    assert hasher.in_flight == 0
+    assert sample('auth_password_hash_duration_seconds_count', {'operation': 'verify'}) == calls + 3
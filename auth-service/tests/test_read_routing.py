@@ -0,0 +1,114 @@
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from fakeredis import FakeServer, aioredis
+
+from models.entity import History
+from services.history import BaseHistory
+from services.profile_cache import ProfileCache
+from services.repository import BaseRepository
+from services.role_catalog import RoleCatalog
+
+
+class FakeSession:
+    def __init__(self, name: str):
+        self.name = name
+        self.info = {}
+        self.queries = 0
+        self.transaction = False
+        self.rowcount = 0
+
+    def in_transaction(self):
+        return self.transaction
+
+    async def execute(self, query):
+        self.queries += 1
+        return self
+
+    def first(self):
+        return None
+
+    def scalars(self):
+        return []
+
+
+def session_factory(session: FakeSession):
+    @asynccontextmanager
+    async def factory():
+        yield session
+    return factory
+
+
+async def test_reads_go_to_replica_until_primary_is_used():
+    """Проверяет, что чтения идут в реплику, а после записи или начатой транзакции — в основную базу."""
+    primary, replica = FakeSession('primary'), FakeSession('replica')
+    repository = BaseRepository(session=primary, replica_session=replica)
+    user_id = uuid.uuid4()
+
+    await repository.get_list_obj_by_keyset(History, 'user_id', user_id, 'time', after=None, page_size=10)
+    assert (primary.queries, replica.queries) == (0, 1)
+
+    await repository.update_objs(History, {'browser': 'google'}, [History.user_id == user_id])
+    await repository.get_list_obj_by_keyset(History, 'user_id', user_id, 'time', after=None, page_size=10)
+    assert (primary.queries, replica.queries) == (2, 1)
+
+    assert (await BaseRepository(session=FakeSession('primary')).read_session()).name == 'primary'
+
+
+async def test_history_reads_stick_to_primary_after_write(monkeypatch):
+    """Проверяет, что после записи истории следующие запросы пользователя читают её из основной базы."""
+    entries = []
+    monkeypatch.setattr('services.history.history_sink', SimpleNamespace(running=True, put=entries.append))
+    redis = aioredis.FakeRedis(server=FakeServer())
+    user_id, other_id = uuid.uuid4(), uuid.uuid4()
+
+    def request():
+        primary, replica = FakeSession('primary'), FakeSession('replica')
+        history = BaseHistory(session=primary, replica_session=replica, redis=redis, sticky_window=5)
+        return history, primary, replica
+
+    history, _, _ = request()
+    await history.write_entry_history(user_id, 'firefox', 'login', True)
+    assert len(entries) == 1
+
+    history, primary, replica = request()
+    await history.get_history_page(user_id, None, 10)
+    await history.get_history_page(other_id, None, 10)
+    assert (primary.queries, replica.queries) == (1, 1)
+
+    await redis.delete(BaseRepository.PRIMARY_KEY.format(user_id=user_id))
+    history, primary, replica = request()
+    await history.get_history_page(user_id, None, 10)
+    assert (primary.queries, replica.queries) == (0, 1)
+
+
+async def test_profile_fill_sticks_to_primary_after_invalidation():
+    """Проверяет, что промах профиля читается с реплики, а сразу после сброса профиля — из основной базы."""
+    primary, replica = FakeSession('primary'), FakeSession('replica')
+    cache = ProfileCache(session_factory(primary), ttl=60, replica_session_factory=session_factory(replica),
+                         sticky_window=5)
+    redis = aioredis.FakeRedis(server=FakeServer())
+    user_id = str(uuid.uuid4())
+
+    await cache.get(redis, user_id)
+    assert (primary.queries, replica.queries) == (0, 1)
+
+    await cache.invalidate(redis, [user_id])
+    await cache.get(redis, user_id)
+    assert (primary.queries, replica.queries) == (1, 1)
+
+
+async def test_role_catalog_loads_from_replica_except_after_change():
+    """Проверяет, что каталог ролей читается с реплики, а сразу после изменения ролей — из основной базы."""
+    primary, replica = FakeSession('primary'), FakeSession('replica')
+    catalog = RoleCatalog(session_factory(primary), check_interval=0,
+                          replica_session_factory=session_factory(replica), sticky_window=5)
+    redis = aioredis.FakeRedis(server=FakeServer())
+
+    await catalog.get(redis)
+    assert (primary.queries, replica.queries) == (0, 1)
+
+    await catalog.invalidate(redis)
+    await catalog.get(redis)
+    assert (primary.queries, replica.queries) == (1, 1)
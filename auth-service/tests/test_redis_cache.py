@@ -0,0 +1,120 @@
+import asyncio
+from uuid import uuid4
+
+from fakeredis import FakeServer, aioredis
+
+from services.redis_cache import CacheRedis
+from services.sessions import session_id, session_key, session_record, index_keys, RECORD_SIZE
+
+user_id = str(uuid4())
+
+
+def rotate(cache: CacheRedis, old_jti: str, old_token: str, expected: bytes, new_jti: str, new: bytes):
+    return cache._rotate_session(
+        user_id=user_id, old_jti=old_jti, old_token=old_token, expected_record=expected,
+        new_jti=new_jti, new_record=new, user_agent='google', time_cache=60
+    )
+
+
+async def test_rotate_session_allows_single_use():
+    """Проверяет, что сессию можно обменять только один раз, даже при одновременных запросах."""
+    redis = aioredis.FakeRedis(server=FakeServer())
+    cache = CacheRedis(redis)
+    record = session_record(user_id, 'google', 'header.payload.signature')
+    await cache._put_session(user_id, 'old-jti', record, 'google', 60)
+    assert len(await redis.get(session_key('old-jti'))) == RECORD_SIZE
+
+    results = await asyncio.gather(*(
+        rotate(cache, 'old-jti', 'old-token', record, f'new-jti-{number}', record) for number in range(5)
+    ))
+
+    assert sorted(results) == [0, 0, 0, 0, 1]
+    assert not await redis.exists(session_key('old-jti'))
+    new_jti = f'new-jti-{results.index(1)}'
+    assert 0 < await redis.ttl(session_key(new_jti)) <= 60
+    assert [session[0] for session in await cache._list_sessions(user_id)] == [session_id(new_jti)]
+
+
+async def test_rotate_session_rejects_other_user_agent():
+    """Проверяет, что при несовпадении User-Agent сессия не обменивается и удаляется."""
+    redis = aioredis.FakeRedis(server=FakeServer())
+    cache = CacheRedis(redis)
+    await cache._put_session(user_id, 'jti', session_record(user_id, 'google', 'a.b.signature'), 'google', 60)
+
+    result = await rotate(
+        cache, 'jti', 'token', session_record(user_id, 'firefox', 'a.b.signature'),
+        'new-jti', session_record(user_id, 'firefox', 'c.d.other')
+    )
+
+    assert result == -1
+    assert await redis.dbsize() == 0
+
+
+async def test_rotate_session_accepts_legacy_token_key():
+    """Проверяет, что сессия, сохранённая по старой схеме (ключ — сам refresh token), обменивается на новую."""
+    redis = aioredis.FakeRedis(server=FakeServer())
+    cache = CacheRedis(redis)
+    await redis.set('legacy-refresh-token', 'legacy-refresh-token', 60)
+    record = session_record(user_id, 'google', 'a.b.signature')
+
+    assert await rotate(cache, 'jti', 'legacy-refresh-token', record, 'new-jti', record) == 1
+    assert sorted(await redis.keys()) == sorted(
+        [session_key('new-jti').encode(), *(key.encode() for key in index_keys(user_id))]
+    )
+
+
+async def test_session_index_lists_and_revokes_sessions():
+    """Проверяет список сессий пользователя, отзыв одной сессии и отзыв всех сессий одним вызовом."""
+    redis = aioredis.FakeRedis(server=FakeServer())
+    cache = CacheRedis(redis)
+    record = session_record(user_id, 'google', 'a.b.signature')
+    for number in range(3):
+        await cache._put_session(user_id, f'jti-{number}', record, f'device-{number}', 60 + number)
+    await cache._put_session(str(uuid4()), 'other-user-jti', record, 'google', 60)
+
+    sessions = await cache._list_sessions(user_id)
+    assert [info['user_agent'] for _, _, info in sessions] == ['device-0', 'device-1', 'device-2']
+    assert 0 < await redis.ttl(index_keys(user_id)[0]) <= 62
+
+    assert await cache._revoke_sessions(user_id, [session_id('jti-1'), session_id('other-user-jti')]) == 1
+    assert not await redis.exists(session_key('jti-1'))
+    assert await redis.exists(session_key('other-user-jti'))
+
+    assert await cache._revoke_sessions(user_id) == 2
+    assert await cache._list_sessions(user_id) == []
+    assert not await redis.exists(session_key('jti-0'), session_key('jti-2'), *index_keys(user_id))
+    assert await redis.exists(session_key('other-user-jti'))
+
+
+async def test_session_index_prunes_expired_sessions():
+    """Проверяет, что истёкшие сессии удаляются из индекса при следующем обращении к нему."""
+    redis = aioredis.FakeRedis(server=FakeServer())
+    cache = CacheRedis(redis)
+    record = session_record(user_id, 'google', 'a.b.signature')
+    await cache._put_session(user_id, 'expired-jti', record, 'google', 60)
+    index_key, info_key = index_keys(user_id)
+    await redis.zadd(index_key, {session_id('expired-jti'): 1})
+
+    await cache._put_session(user_id, 'jti', record, 'google', 60)
+
+    assert await redis.zrange(index_key, 0, -1) == [session_id('jti').encode()]
+    assert await redis.hkeys(info_key) == [session_id('jti').encode()]
+
+
+async def test_replace_sessions_revokes_all_and_adds_current():
+    """Проверяет, что выход из остальных устройств отзывает все сессии и записывает новую одним скриптом."""
+    redis = aioredis.FakeRedis(server=FakeServer())
+    cache = CacheRedis(redis)
+    record = session_record(user_id, 'google', 'a.b.signature')
+    for number in range(3):
+        await cache._put_session(user_id, f'jti-{number}', record, f'device-{number}', 60)
+    await redis.set('legacy-refresh-token', 'legacy-refresh-token')
+    await cache._put_session(str(uuid4()), 'other-user-jti', record, 'google', 60)
+
+    revoked = await cache._replace_sessions(user_id, 'new-jti', record, 'google', 60, old_token='legacy-refresh-token')
+
+    assert revoked == 3
+    assert [session[0] for session in await cache._list_sessions(user_id)] == [session_id('new-jti')]
+    assert await redis.get(session_key('new-jti')) == record
+    assert not await redis.exists(*(session_key(f'jti-{number}') for number in range(3)), 'legacy-refresh-token')
+    assert await redis.exists(session_key('other-user-jti'))
@@ -0,0 +1,168 @@
+import asyncio
+from time import time
+
+import pytest
+from fakeredis import FakeServer, aioredis
+from redis.exceptions import ConnectionError
+
+from services.revocation import BloomRevocationStore, KeyRevocationStore, RevokedTokenCache
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    deadline = time() + timeout
+    while not condition():
+        assert time() < deadline, 'condition not reached'
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def redis():
+    return aioredis.FakeRedis(server=FakeServer())
+
+
+async def test_revoke_reaches_other_worker(redis):
+    """Проверяет, что отзыв в одном воркере через pub/sub попадает в локальный кеш другого."""
+    listener = RevokedTokenCache(KeyRevocationStore(), reconnect_delay=0.01, health_check_interval=1)
+    other = RevokedTokenCache(KeyRevocationStore(), reconnect_delay=0.01, health_check_interval=1)
+    listener.start(redis)
+    try:
+        await wait_for(lambda: listener.ready)
+        await other.revoke(redis, 'jti-1', int(time()) + 60)
+        await wait_for(lambda: listener.contains('jti-1'))
+        assert await listener.store.contains(redis, 'jti-1', int(time()) + 60)
+        assert not listener.contains('jti-2')
+    finally:
+        await listener.stop()
+
+
+async def test_snapshot_loaded_on_subscribe(redis):
+    """Проверяет, что с включённым снимком отзывы, сделанные до подписки, подгружаются из индекса."""
+    await RevokedTokenCache(KeyRevocationStore(), 0.01, 1, snapshot=True).revoke(redis, 'early', int(time()) + 60)
+    listener = RevokedTokenCache(KeyRevocationStore(), reconnect_delay=0.01, health_check_interval=1, snapshot=True)
+    listener.start(redis)
+    try:
+        await wait_for(lambda: listener.ready)
+        assert listener.contains('early')
+        assert await listener.is_revoked(redis, 'early', int(time()) + 60, iat=0)
+    finally:
+        await listener.stop()
+
+
+async def test_tokens_issued_before_subscription_are_checked_in_store(redis):
+    """Проверяет, что без снимка токены, выпущенные до подписки, проверяются в хранилище, а новые — локально."""
+    await RevokedTokenCache(KeyRevocationStore(), 0.01, 1).revoke(redis, 'early', int(time()) + 60)
+    assert not await redis.exists(RevokedTokenCache.INDEX_KEY)
+    listener = RevokedTokenCache(KeyRevocationStore(), reconnect_delay=0.01, health_check_interval=1)
+    listener.start(redis)
+    try:
+        await wait_for(lambda: listener.ready)
+        assert not listener.contains('early')
+        assert await listener.is_revoked(redis, 'early', int(time()) + 60, iat=int(time()) - 60)
+
+        await redis.set('issued-later', 'issued-later')
+        issued_later = int(time()) + RevokedTokenCache.CLOCK_SKEW + 1
+        assert not await listener.is_revoked(redis, 'issued-later', issued_later + 60, iat=issued_later)
+    finally:
+        await listener.stop()
+
+
+async def test_malformed_message_keeps_subscription(redis):
+    """Проверяет, что битое сообщение пропускается, а кеш и подписка сохраняются."""
+    listener = RevokedTokenCache(KeyRevocationStore(), reconnect_delay=0.01, health_check_interval=1)
+    listener.start(redis)
+    try:
+        await wait_for(lambda: listener.ready)
+        await RevokedTokenCache(KeyRevocationStore(), 0.01, 1).revoke(redis, 'before', int(time()) + 60)
+        await wait_for(lambda: listener.contains('before'))
+        await redis.publish(RevokedTokenCache.CHANNEL, 'broken:not-a-number')
+        await redis.publish(RevokedTokenCache.CHANNEL, f'after:{int(time()) + 60}')
+        await wait_for(lambda: listener.contains('after'))
+        assert listener.ready
+        assert listener.contains('before')
+    finally:
+        await listener.stop()
+
+
+class SilentPubSub:
+    def __init__(self):
+        self.pings = 0
+
+    async def get_message(self, timeout):
+        await asyncio.sleep(0)
+        return None
+
+    async def ping(self):
+        self.pings += 1
+
+
+async def test_silent_connection_is_dropped():
+    """Проверяет, что подписка без ответа на PING считается потерянной."""
+    cache = RevokedTokenCache(KeyRevocationStore(), reconnect_delay=0.01, health_check_interval=0.01)
+    pubsub = SilentPubSub()
+    with pytest.raises(ConnectionError):
+        await cache._consume(pubsub)
+    assert pubsub.pings == 1
+
+
+def test_bloom_positions_are_distinct_and_in_range():
+    """Проверяет, что фильтр даёт k различных позиций в пределах размера битовой карты."""
+    store = BloomRevocationStore(window=300, capacity=1000, false_positive_rate=0.01)
+    assert store.hashes == 7
+    for number in range(500):
+        positions = store._positions(f'jti-{number}')
+        assert len(set(positions)) == store.hashes
+        assert all(0 <= position < store.size for position in positions)
+    assert store._positions('jti-1') == store._positions('jti-1')
+
+
+async def test_bloom_revoke_contains_round_trip(redis):
+    """Проверяет отзыв и проверку токена через фильтр Блума и ключ jti."""
+    store = BloomRevocationStore(window=300, capacity=1000, false_positive_rate=0.01)
+    exp = int(time()) + 60
+    async with redis.pipeline(transaction=False) as pipe:
+        store.add(pipe, 'revoked', exp, int(time()))
+        await pipe.execute()
+
+    assert await store.might_contain(redis, 'revoked', exp)
+    assert await store.contains(redis, 'revoked', exp)
+    assert not await store.contains(redis, 'other', exp)
+
+
+async def test_bloom_buckets_roll_over_and_expire(redis):
+    """Проверяет, что токены раскладываются по окнам по exp, а битовая карта окна истекает вместе с его последним токеном."""
+    window = 300
+    store = BloomRevocationStore(window=window, capacity=1000, false_positive_rate=0.01)
+    now = int(time())
+    bucket = now // window
+    first_exp, second_exp = (bucket + 1) * window - 1, (bucket + 1) * window + 1
+    async with redis.pipeline(transaction=False) as pipe:
+        store.add(pipe, 'first', first_exp, now)
+        store.add(pipe, 'second', second_exp, now)
+        await pipe.execute()
+
+    expected_ttl = {
+        store.BITS_KEY.format(bucket=bucket): (bucket + 1) * window - now,
+        store.BITS_KEY.format(bucket=bucket + 1): (bucket + 2) * window - now,
+        'first': first_exp - now,
+        'second': second_exp - now,
+    }
+    for key, ttl in expected_ttl.items():
+        assert ttl - 1 <= await redis.ttl(key) <= ttl
+    assert await store.contains(redis, 'second', second_exp)
+    assert not await store.might_contain(redis, 'second', first_exp)
+    assert not await store.contains(redis, 'second', first_exp)
+
+
+async def test_bloom_checks_jti_key_only_on_bitmap_hit(redis):
+    """Проверяет, что ключ jti читается только при положительном ответе фильтра."""
+    store = BloomRevocationStore(window=300, capacity=1000, false_positive_rate=0.01)
+    exp = int(time()) + 60
+    await redis.set('not-in-bitmap', 'not-in-bitmap')
+    assert not await store.contains(redis, 'not-in-bitmap', exp)
+
+    async with redis.pipeline(transaction=False) as pipe:
+        store.add(pipe, 'revoked', exp, int(time()))
+        await pipe.execute()
+    await redis.delete('revoked')
+    assert await store.might_contain(redis, 'revoked', exp)
+    assert not await store.contains(redis, 'revoked', exp)
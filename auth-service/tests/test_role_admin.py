@@ -0,0 +1,84 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from core.exceptions import DoesNotExistException
+from models.entity import Role
+from schemas.entity import BulkRoleAssign, UserFilter
+from services.admin import BaseAdmin
+
+
+class FakeSession:
+    def __init__(self, roles: dict, rowcount: int):
+        self.roles = roles
+        self.rowcount = rowcount
+        self.statements = []
+        self.commits = 0
+        self.info = {}
+        self.locked = []
+
+    async def get(self, model, pk, with_for_update=False):
+        if with_for_update:
+            self.locked.append(pk)
+        return self.roles.get(pk)
+
+    async def execute(self, query):
+        self.statements.append(query)
+        if query.is_select:
+            return SimpleNamespace(scalar=lambda: next(iter(self.roles)))
+        return SimpleNamespace(scalars=lambda: [uuid.uuid4() for _ in range(self.rowcount)])
+
+    async def commit(self):
+        self.commits += 1
+
+
+def make_admin(session: FakeSession) -> BaseAdmin:
+    return BaseAdmin(session=session, manager_auth=SimpleNamespace(redis=None), manager_role=None)
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    invalidated = []
+
+    async def get_by_id(redis, role_id):
+        return role_id
+
+    async def invalidate(redis):
+        invalidated.append(True)
+
+    monkeypatch.setattr('services.admin.role_catalog.get_by_id', get_by_id)
+    monkeypatch.setattr('services.admin.role_catalog.invalidate', invalidate)
+    monkeypatch.setattr('services.admin.profile_cache.invalidate', lambda redis, user_ids: asyncio.sleep(0))
+    return invalidated
+
+
+@pytest.mark.parametrize('target', [
+    {'user_ids': [uuid.uuid4() for _ in range(1000)]},
+    {'filter': UserFilter(email_domain='example.com')},
+])
+async def test_assign_role_bulk_uses_single_update(catalog, target):
+    """Проверяет, что роль назначается многим пользователям одним UPDATE и возвращается число изменённых строк."""
+    session = FakeSession(roles={}, rowcount=1000)
+
+    affected = await make_admin(session).assign_role_bulk(BulkRoleAssign(role_id=uuid.uuid4(), **target))
+
+    assert affected == 1000
+    assert [query.is_dml for query in session.statements] == [True]
+    assert session.commits == 1
+
+
+async def test_delete_role_moves_users_to_fallback_role(catalog):
+    """Проверяет, что пользователи удаляемой роли переводятся на запасную роль в той же транзакции."""
+    role_id, fallback_id = uuid.uuid4(), uuid.uuid4()
+    session = FakeSession(roles={fallback_id: Role(0, 'standart', '', 2000), role_id: Role(1, 'gold', '', 2000)}, rowcount=7)
+
+    assert await make_admin(session).delete_role(role_id) == 7
+    assert session.locked == [role_id]
+    assert [type(query).__name__ for query in session.statements] == ['Select', 'Update', 'Delete']
+    assert session.commits == 1
+    assert catalog == [True]
+
+    with pytest.raises(DoesNotExistException):
+        await make_admin(session).delete_role(role_id, fallback_role_id=role_id)
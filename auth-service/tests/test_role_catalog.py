@@ -0,0 +1,95 @@
+import uuid
+
+from models.entity import Role
+from services.role_catalog import RoleCatalog
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self.rows
+
+
+class FakeSession:
+    roles = []
+    loads = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+    async def execute(self, query):
+        FakeSession.loads += 1
+        return FakeResult(list(self.roles))
+
+
+def make_role(lvl: int) -> Role:
+    role = Role(lvl=lvl, name_role=f'role_{lvl}', description='', max_year=1980)
+    role.id = uuid.uuid4()
+    return role
+
+
+async def test_role_catalog_reloads_only_on_version_change():
+    """Проверяет, что роли читаются из базы один раз и перечитываются только после смены версии."""
+    FakeSession.roles, FakeSession.loads = [make_role(0), make_role(1)], 0
+    redis = FakeRedis()
+    catalog = RoleCatalog(session_factory=FakeSession, check_interval=0)
+
+    snapshot = await catalog.get(redis)
+    await catalog.get(redis)
+    assert FakeSession.loads == 1
+    assert snapshot.lowest.lvl == 0
+    assert snapshot.by_lvl[1].id == FakeSession.roles[1].id
+
+    FakeSession.roles.append(make_role(2))
+    await catalog.invalidate(redis)
+    snapshot = await catalog.get(redis)
+    assert FakeSession.loads == 2
+    assert sorted(snapshot.by_lvl) == [0, 1, 2]
+
+
+async def test_role_catalog_reloads_on_unknown_id_after_version_change():
+    """Проверяет, что промах по id сразу сверяет версию и перечитывает каталог, если её сменил другой воркер."""
+    FakeSession.roles, FakeSession.loads = [make_role(0)], 0
+    catalog = RoleCatalog(session_factory=FakeSession, check_interval=60)
+    redis = FakeRedis()
+    await catalog.get(redis)
+
+    new_role = make_role(1)
+    FakeSession.roles.append(new_role)
+    await redis.incr(RoleCatalog.VERSION_KEY)
+    role = await catalog.get_by_id(redis, new_role.id)
+    assert role.name_role == 'role_1'
+    assert FakeSession.loads == 2
+
+
+async def test_role_catalog_rate_limits_reloads_on_unknown_id():
+    """Проверяет, что промахи при неизменной версии перечитывают каталог не чаще раза в check_interval."""
+    FakeSession.roles, FakeSession.loads = [make_role(0)], 0
+    catalog = RoleCatalog(session_factory=FakeSession, check_interval=60)
+    redis = FakeRedis()
+    await catalog.get(redis)
+
+    for _ in range(5):
+        assert await catalog.get_by_id(redis, uuid.uuid4()) is None
+    assert FakeSession.loads == 1
+
+    catalog._loaded_at -= 60
+    assert await catalog.get_by_id(redis, uuid.uuid4()) is None
+    assert await catalog.get_by_id(redis, uuid.uuid4()) is None
+    assert FakeSession.loads == 2
@@ -0,0 +1,64 @@
+from fakeredis import FakeServer, aioredis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from core.server_timing import ServerTimingMiddleware, add_timing, instrument_engine, request_timings
+from db.redis import InstrumentedRedis
+
+
+def test_server_timing_header_sums_categories():
+    """Проверяет, что время операций суммируется по категориям и отдаётся в заголовке Server-Timing."""
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get('/login/')
+    async def login():
+        add_timing('redis', 0.0002)
+        add_timing('redis', 0.0002)
+        add_timing('hash', 0.08)
+        return {}
+
+    header = TestClient(app).get('/login/').headers['server-timing']
+
+    assert header.startswith('redis;dur=0.4, hash;dur=80.0, total;dur=')
+    assert request_timings.get() is None
+
+
+def test_engine_queries_are_timed_only_inside_request():
+    """Проверяет, что SQL-запросы учитываются в категории db, а вне замера время никуда не пишется."""
+    engine = create_engine('sqlite://')
+    instrument_engine(engine)
+
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        timings = {}
+        token = request_timings.set(timings)
+        try:
+            conn.execute(text('SELECT 1'))
+        finally:
+            request_timings.reset(token)
+
+    assert list(timings) == ['db']
+    assert timings['db'] > 0
+
+
+async def test_shared_redis_client_commands_are_timed():
+    """Проверяет, что команды и конвейеры общего клиента Redis учитываются в метрике и в категории redis."""
+    client = InstrumentedRedis(connection_pool=aioredis.FakeRedis(server=FakeServer()).connection_pool)
+    before = REGISTRY.get_sample_value('auth_redis_call_duration_seconds_count', {'operation': 'SET'}) or 0
+    timings = {}
+    token = request_timings.set(timings)
+    try:
+        await client.set('key', 'value')
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.get('key')
+            pipe.incr('counter')
+            assert await pipe.execute() == [b'value', 1]
+    finally:
+        request_timings.reset(token)
+
+    assert list(timings) == ['redis']
+    assert REGISTRY.get_sample_value('auth_redis_call_duration_seconds_count', {'operation': 'SET'}) == before + 1
+    assert REGISTRY.get_sample_value('auth_redis_call_duration_seconds_count', {'operation': 'PIPELINE'}) >= 1
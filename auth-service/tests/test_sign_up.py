@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from core.config import Name
+from core.exceptions import AlreadyExistsException
+from schemas.entity import UserCreate
+from services.role_catalog import CachedRole, RoleSnapshot
+from services.user import BaseAuth
+
+
+class UniqueViolation(Exception):
+    def __init__(self, constraint_name: str):
+        self.constraint_name = constraint_name
+
+
+class FakeSession:
+    def __init__(self, violated: str | None = None):
+        self.violated = violated
+        self.added = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.info = {}
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        self.commits += 1
+        if self.violated:
+            orig = Exception('duplicate key value violates unique constraint')
+            orig.__cause__ = UniqueViolation(self.violated)
+            raise IntegrityError('INSERT INTO users', {}, orig)
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def role(monkeypatch):
+    role = CachedRole(id=uuid.uuid4(), lvl=0, name_role='standart', description=None, max_year=2000)
+
+    async def get(redis, force=False):
+        return RoleSnapshot(by_id={role.id: role}, by_lvl={role.lvl: role})
+
+    async def hash_password(password):
+        return f'hash:{password}'
+
+    monkeypatch.setattr('services.user.role_catalog.get', get)
+    monkeypatch.setattr('services.user.password_hasher.hash', hash_password)
+    return role
+
+
+def make_user() -> UserCreate:
+    return UserCreate(login='login', password='password', first_name='first', last_name='last', email='a@b.c')
+
+
+async def test_sign_up_inserts_user_without_pre_checks(role):
+    """Проверяет, что регистрация не делает запросов на чтение и создаёт пользователя с ролью из кэша."""
+    session = FakeSession()
+    await BaseAuth(session=session, auth=None, redis=None, manager_history=None).sign_up(make_user())
+
+    assert session.commits == 1
+    assert session.added[0].role_id == role.id
+    assert session.added[0].password == 'hash:password'
+
+
+@pytest.mark.parametrize('constraint, name', [('users_login_key', Name.LOGIN), ('users_email_key', Name.EMAIL)])
+async def test_sign_up_maps_unique_violation(role, constraint, name):
+    """Проверяет, что нарушение уникальности логина или почты возвращается как AlreadyExistsException."""
+    session = FakeSession(violated=constraint)
+    with pytest.raises(AlreadyExistsException) as err:
+        await BaseAuth(session=session, auth=None, redis=None, manager_history=None).sign_up(make_user())
+
+    assert err.value.name == name
+    assert session.rollbacks == 1
@@ -0,0 +1,34 @@
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+from services.signing_keys import public_jwk
+
+
+def generate_key_pair(algorithm: str) -> tuple[str, str]:
+    if algorithm == 'RS256':
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return private_pem, public_pem
+
+
+@pytest.mark.parametrize('algorithm', ['RS256', 'EdDSA'])
+def test_published_jwk_verifies_token(algorithm):
+    """Проверяет, что по опубликованному JWK можно проверить токен, а kid стабилен для одного ключа."""
+    private_pem, public_pem = generate_key_pair(algorithm)
+    jwk = public_jwk(public_pem, algorithm)
+    assert jwk['kid'] == public_jwk(public_pem, algorithm)['kid']
+    assert 'd' not in jwk
+
+    token = jwt.encode({'sub': 'user'}, private_pem, algorithm=algorithm, headers={'kid': jwk['kid']})
+    assert jwt.get_unverified_header(token)['kid'] == jwk['kid']
+    key = jwt.PyJWK(jwk).key
+    assert jwt.decode(token, key, algorithms=[jwk['alg']]) == {'sub': 'user'}
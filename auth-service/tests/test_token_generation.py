@@ -0,0 +1,41 @@
+from services.token_generation import TokenGenerations
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.reads = 0
+
+    async def get(self, key):
+        self.reads += 1
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+
+async def test_token_generation_bump_revokes_older_tokens():
+    """Проверяет, что после увеличения поколения старые токены отклоняются, а повторные проверки идут из кэша."""
+    redis = FakeRedis()
+    generations = TokenGenerations(cache_ttl=60, cache_size=10)
+    old_claims = {'sub': 'user', 'gen': await generations.get(redis, 'user')}
+    assert generations.is_current(old_claims, await generations.get(redis, 'user'))
+    assert redis.reads == 1
+
+    new_generation = await generations.bump(redis, 'user')
+    assert not generations.is_current(old_claims, await generations.get(redis, 'user'))
+    assert not generations.is_current({'sub': 'user'}, await generations.get(redis, 'user'))
+    assert generations.is_current({'sub': 'user', 'gen': new_generation}, await generations.get(redis, 'user'))
+    assert redis.reads == 1
+
+
+async def test_token_generation_other_worker_sees_bump_after_ttl():
+    """Проверяет, что другой воркер видит новое поколение после истечения срока локального кэша."""
+    redis = FakeRedis()
+    worker = TokenGenerations(cache_ttl=0, cache_size=10)
+    other_worker = TokenGenerations(cache_ttl=60, cache_size=10)
+    assert await worker.get(redis, 'user') == 0
+
+    await other_worker.bump(redis, 'user')
+    assert await worker.get(redis, 'user') == 1
@@ -0,0 +1,70 @@
+import uuid
+
+from db.user_import import read_records, prepare_batch, validate
+
+
+class FakeHasher:
+    pool_size = 2
+
+    def __init__(self):
+        self.calls = []
+
+    async def hash_many(self, passwords):
+        self.calls.append(passwords)
+        return [f'pbkdf2:sha256$salt${password}' for password in passwords]
+
+
+async def test_import_prepares_batch_and_rejects_bad_records(tmp_path):
+    """Проверяет разбор NDJSON, отклонение некорректных записей без паролей и хеширование частями по числу процессов."""
+    path = tmp_path / 'users.ndjson'
+    path.write_text('\n'.join([
+        '{"login": "skipped", "email": "s@s.s", "password": "password"}',
+        '{"login": "a", "email": "a@a.a", "password": "secret1"}',
+        '{"login": "b", "email": "b@b.b", "password_hash": "pbkdf2:sha256:600000$salt$hash"}',
+        '{"login": "c", "email": "c@c.c", "password_hash": "$2b$12$bcrypt"}',
+        'not json',
+        '{"login": "d", "email": "d@d.d", "password": "secret2"}',
+        '{"login": "e", "email": "e@e.e", "password": "secret3"}',
+        '{"email": "f@f.f", "password": "secret4"}',
+    ]))
+    records = list(read_records(path, 'ndjson', skip=1))
+    hasher = FakeHasher()
+    role_id = uuid.uuid4()
+
+    batch = await prepare_batch(records, role_id, hasher)
+
+    assert batch.last_number == 8
+    assert [row[2] for row in batch.rows] == ['a', 'b', 'd', 'e']
+    assert [row[4] for row in batch.rows] == [
+        'pbkdf2:sha256$salt$secret1', 'pbkdf2:sha256:600000$salt$hash',
+        'pbkdf2:sha256$salt$secret2', 'pbkdf2:sha256$salt$secret3'
+    ]
+    assert all(row[8] == role_id for row in batch.rows)
+    assert hasher.calls == [['secret1', 'secret2'], ['secret3']]
+    assert batch.rejected == [
+        {'record': 4, 'reason': 'unsupported password hash', 'data': {'login': 'c', 'email': 'c@c.c'}},
+        {'record': 5, 'reason': 'invalid json', 'data': {}},
+        {'record': 8, 'reason': 'login is required', 'data': {'email': 'f@f.f'}},
+    ]
+
+
+def test_import_reads_csv(tmp_path):
+    """Проверяет потоковое чтение CSV с пропуском уже загруженных записей."""
+    path = tmp_path / 'users.csv'
+    path.write_text('login,email,first_name,last_name,password\na,a@a.a,A,A,secret1\nb,b@b.b,B,B,secret2\n')
+
+    records = list(read_records(path, 'csv', skip=1))
+
+    assert [(record.number, record.data['login'], record.data['password']) for record in records] == [
+        (2, 'b', 'secret2')
+    ]
+
+
+def test_validate_rejects_oversized_hash_and_nul():
+    """Проверяет отклонение слишком длинного хеша пароля и символа NUL в строковых полях."""
+    base = {'login': 'a', 'email': 'a@a.a', 'password': 'secret'}
+
+    assert validate(base) is None
+    assert validate({**base, 'password_hash': 'pbkdf2:' + 'x' * 249}) == 'password_hash is longer than 255 characters'
+    assert validate({**base, 'first_name': 'A\x00'}) == 'first_name contains a NUL character'
+    assert validate({**base, 'password': 'sec\x00ret'}) == 'password contains a NUL character'
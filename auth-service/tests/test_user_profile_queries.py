@@ -0,0 +1,135 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+from fakeredis import FakeServer, aioredis
+from sqlalchemy.dialects import postgresql
+
+from services.profile_cache import ProfileCache
+from services.role_catalog import CachedRole, RoleSnapshot
+from services.user import BaseAuth, UserManage
+
+user_id = uuid.uuid4()
+ROW = {
+    'id': user_id, 'login': 'login', 'first_name': 'first', 'last_name': 'last', 'email': 'a@b.c',
+    'role_id': uuid.uuid4(), 'lvl': 0, 'name_role': 'standart', 'password': 'hash'
+}
+
+
+class FakeRow:
+    def __init__(self, columns):
+        self.data = {column.key: ROW[column.key] for column in columns}
+
+    def __getattr__(self, name):
+        return self.data[name]
+
+    def _asdict(self):
+        return dict(self.data)
+
+
+class FakeResult:
+    rowcount = 1
+
+    def __init__(self, query):
+        self.query = query
+
+    def first(self):
+        return FakeRow(self.query.selected_columns)
+
+
+class CountingSession:
+    def __init__(self):
+        self.queries = []
+        self.info = {}
+
+    async def execute(self, query):
+        self.queries.append(str(query.compile(dialect=postgresql.dialect())))
+        await asyncio.sleep(0)
+        return FakeResult(query)
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    async def info_from_access_token(*args, **kwargs):
+        return {'sub': str(user_id)}
+
+    async def get_catalog(redis, force=False):
+        roles = [
+            CachedRole(id=ROW['role_id'], lvl=0, name_role='standart', description=None, max_year=2000),
+            CachedRole(id=uuid.uuid4(), lvl=1, name_role='gold', description=None, max_year=2000),
+        ]
+        return RoleSnapshot(by_id={role.id: role for role in roles}, by_lvl={role.lvl: role for role in roles})
+
+    @asynccontextmanager
+    async def session_factory():
+        yield session
+
+    monkeypatch.setattr('services.user.BaseAuth.get_info_from_access_token', info_from_access_token)
+    monkeypatch.setattr('services.user.role_catalog.get', get_catalog)
+    session = CountingSession()
+    cache = ProfileCache(session_factory, ttl=60)
+    monkeypatch.setattr('services.user.profile_cache', cache)
+    redis = aioredis.FakeRedis(server=FakeServer())
+    manager_auth = BaseAuth(session=session, auth=None, redis=redis, manager_history=None)
+    return UserManage(manager_auth=manager_auth, manager_role=None, manager_history=None), session
+
+
+async def test_user_profile_is_one_joined_select(manager):
+    """Проверяет, что профиль читается одним SELECT с JOIN ролей без пароля, а повторное чтение идёт из кэша."""
+    user_manage, session = manager
+
+    profile = await user_manage.get_user_data('google')
+    cached = await user_manage.get_user_data('google')
+
+    assert profile == cached
+    assert profile.name_role == '0:standart'
+    assert len(session.queries) == 1
+    assert 'LEFT OUTER JOIN roles' in session.queries[0]
+    assert 'users.password' not in session.queries[0]
+
+
+async def test_concurrent_profile_misses_are_coalesced(manager):
+    """Проверяет, что одновременные промахи кэша по одному пользователю дают один запрос в базу."""
+    user_manage, session = manager
+
+    profiles = await asyncio.gather(*(user_manage.get_user_data('google') for _ in range(50)))
+
+    assert len(session.queries) == 1
+    assert all(profile == profiles[0] for profile in profiles)
+
+
+async def test_changed_level_invalidates_cached_profile(manager):
+    """Проверяет, что после смены уровня подписки профиль перечитывается из базы."""
+    user_manage, session = manager
+
+    await user_manage.get_user_data('google')
+    await user_manage.change_level('google', level_up=True)
+    await user_manage.get_user_data('google')
+
+    assert [query.split()[0] for query in session.queries] == ['SELECT', 'SELECT', 'UPDATE', 'SELECT']
+
+
+async def test_change_level_is_one_select_and_one_update(manager):
+    """Проверяет, что смена уровня подписки выполняется одним SELECT и одним UPDATE без загрузки объекта ORM."""
+    user_manage, session = manager
+
+    await user_manage.change_level('google', level_up=True)
+
+    assert [query.split()[0] for query in session.queries] == ['SELECT', 'UPDATE']
+
+
+async def test_profile_without_role_is_cached(manager, monkeypatch):
+    """Проверяет, что профиль пользователя без роли (role_id NULL) кэшируется и читается без ошибки."""
+    user_manage, session = manager
+    monkeypatch.setitem(ROW, 'role_id', None)
+
+    profile = await user_manage.get_user_data('google')
+    cached = await user_manage.get_user_data('google')
+
+    assert profile == cached
+    assert profile.name_role == 'None:None'
+    assert len(session.queries) == 1